@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+Compare how many concurrent clients the WSGI and ASGI deployments sustain.
+
+Start the same app twice with the same number of workers, e.g.
+
+    gunicorn restaurant_api.wsgi -w 4 -b 127.0.0.1:8001
+    gunicorn restaurant_api.asgi:application -k uvicorn.workers.UvicornWorker -w 4 -b 127.0.0.1:8002
+
+then point one target at each:
+
+    python benchmark_async.py \\
+        --target wsgi=http://127.0.0.1:8001/api/menu-items/ \\
+        --target asgi=http://127.0.0.1:8002/api/async/menu-items/
+
+Each concurrency level opens that many clients at once, each sending
+--requests requests in a row. --slow-client sends the request headers in
+two parts that many seconds apart, like a client on a bad mobile link: a
+sync worker is stuck reading the request all that time, an async worker
+serves other clients meanwhile. Uses the standard library only.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def fetch(url, slow_client=0.0, timeout=30.0):
+    """GET `url` over a fresh connection; return the status code (0 on failure)"""
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, parts.port or 80), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return 0
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\n'.encode())
+        if slow_client:
+            await writer.drain()
+            await asyncio.sleep(slow_client)
+        writer.write(
+            f'Host: {parts.netloc}\r\nAccept: application/json\r\nConnection: close\r\n\r\n'.encode()
+        )
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        status_line = response.split(b'\r\n', 1)[0].split()
+        return int(status_line[1]) if len(status_line) > 1 else 0
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return 0
+    finally:
+        writer.close()
+
+
+async def client(url, requests, slow_client, latencies, failures):
+    for _ in range(requests):
+        start = time.perf_counter()
+        status = await fetch(url, slow_client)
+        if status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            failures.append(status)
+
+
+async def run_level(url, concurrency, requests, slow_client):
+    latencies, failures = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(url, requests, slow_client, latencies, failures) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    return latencies, failures, elapsed
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                        help='deployment to benchmark, repeatable')
+    parser.add_argument('--concurrency', default='10,50,100,200,400',
+                        help='comma-separated concurrent client counts (default: %(default)s)')
+    parser.add_argument('--requests', type=int, default=10,
+                        help='requests per client at each level (default: %(default)s)')
+    parser.add_argument('--slow-client', type=float, default=0.0, metavar='SECONDS',
+                        help='pause inside each request, emulating slow links (default: none)')
+    args = parser.parse_args()
+
+    targets = [target.split('=', 1) for target in args.target]
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    print(f"{'target':<8} {'clients':>7} {'ok':>7} {'failed':>7} {'req/s':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, url in targets:
+        # Warm up connections, caches and lazily built indexes
+        await run_level(url, 1, 3, 0.0)
+        for concurrency in levels:
+            latencies, failures, elapsed = await run_level(
+                url, concurrency, args.requests, args.slow_client
+            )
+            print(
+                f'{name:<8} {concurrency:>7} {len(latencies):>7} {len(failures):>7} '
+                f'{len(latencies) / elapsed:>9.1f} '
+                f'{statistics.median(latencies) * 1000 if latencies else float("nan"):>9.1f} '
+                f'{percentile(latencies, 0.95) * 1000:>9.1f} '
+                f'{max(latencies, default=float("nan")) * 1000:>9.1f}'
+            )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
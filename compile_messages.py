@@ -1,100 +1,230 @@
 #!/usr/bin/env python
-"""Compile .po files to .mo files without GNU gettext"""
-import struct
-import array
+"""
+Compile .po files to .mo files without GNU gettext
+
+The .mo files match what msgfmt writes: messages sorted for binary search,
+plus the hash table GNU gettext looks messages up in directly; contexts
+(msgctxt) and plural forms are kept and fuzzy or untranslated entries left
+out. A locale is only recompiled when its .po file changed since the last
+run, first judged by modification time and then by the SHA-256 kept next
+to it in .django.po.sha256, so a checkout touching unchanged files costs
+a hash. The locales are compiled in parallel.
+
+    python compile_messages.py [--force] [--jobs N] [--locale-dir locale]
+"""
+import argparse
+import hashlib
 import os
+import re
+import struct
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+MO_MAGIC = 0x950412de
+HEADER_SIZE = 7 * 4
+
+# Separators of gettext keys: context from message, singular from plural
+CONTEXT_SEPARATOR = '\x04'
+PLURAL_SEPARATOR = '\x00'
+
+ESCAPES = {
+    'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v',
+    '"': '"', '\\': '\\',
+}
+ESCAPE_RE = re.compile(r'\\(.)')
+
+
+class POError(ValueError):
+    pass
+
+
+def unquote(text, path, number):
+    """The value of a quoted .po string, with its escapes decoded"""
+    if len(text) < 2 or text[0] != '"' or text[-1] != '"':
+        raise POError(f'{path}:{number}: expected a quoted string')
+
+    def unescape(match):
+        try:
+            return ESCAPES[match.group(1)]
+        except KeyError:
+            raise POError(f'{path}:{number}: unknown escape \\{match.group(1)}')
+
+    return ESCAPE_RE.sub(unescape, text[1:-1])
+
+
+def parse_po(content, path='<string>'):
+    """{gettext key: translation} of the translated, non-fuzzy entries of a .po file"""
+    catalog = {}
+    entry = {}
+    field = None
+
+    def flush():
+        nonlocal entry, field
+        if 'msgid' in entry:
+            add_entry(catalog, entry)
+        entry, field = {}, None
+
+    for number, line in enumerate(content.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            # Comments open the next entry; obsolete (#~) entries are skipped with them
+            if 'msgstr' in entry:
+                flush()
+            if line.startswith('#,') and 'fuzzy' in line[2:].replace(',', ' ').split():
+                entry['fuzzy'] = True
+            field = None
+            continue
+
+        if line.startswith('"'):
+            if field is None:
+                raise POError(f'{path}:{number}: string outside an entry')
+            key, index = field
+            if index is None:
+                entry[key] += unquote(line, path, number)
+            else:
+                entry[key][index] += unquote(line, path, number)
+            continue
+
+        keyword, _, value = line.partition(' ')
+        value = unquote(value.strip(), path, number)
+        if keyword in ('msgctxt', 'msgid') and 'msgstr' in entry:
+            flush()
+        if keyword in ('msgctxt', 'msgid', 'msgid_plural'):
+            entry[keyword] = value
+            field = (keyword, None)
+        elif keyword == 'msgstr' or (keyword.startswith('msgstr[') and keyword.endswith(']')):
+            index = 0 if keyword == 'msgstr' else int(keyword[7:-1])
+            entry.setdefault('msgstr', {})[index] = value
+            field = ('msgstr', index)
+        else:
+            raise POError(f'{path}:{number}: unknown keyword {keyword}')
+    flush()
+    return catalog
+
+
+def add_entry(catalog, entry):
+    if 'msgstr' not in entry:
+        raise POError(f"msgid {entry['msgid']!r} has no msgstr")
+    msgid = entry['msgid']
+    translations = [entry['msgstr'][index] for index in sorted(entry['msgstr'])]
+    # msgfmt leaves out fuzzy entries (but the header) and untranslated ones
+    if (entry.get('fuzzy') and msgid) or not all(translations):
+        return
+    key = msgid
+    if 'msgid_plural' in entry:
+        key += PLURAL_SEPARATOR + entry['msgid_plural']
+    if 'msgctxt' in entry:
+        key = entry['msgctxt'] + CONTEXT_SEPARATOR + key
+    catalog[key] = PLURAL_SEPARATOR.join(translations)
+
+
+def hash_string(data):
+    """GNU gettext's hashpjw of a key, up to its first NUL"""
+    value = 0
+    for byte in data.split(b'\0', 1)[0]:
+        value = (value << 4) + byte
+        high = value & 0xF0000000
+        if high:
+            value ^= high >> 24
+            value ^= high
+    return value
+
+
+def hash_table_size(count):
+    """The smallest prime at least 4/3 of `count`, and above 2, as msgfmt sizes it"""
+    size = max(count * 4 // 3, 3)
+    while any(size % divisor == 0 for divisor in range(2, int(size ** 0.5) + 1)):
+        size += 1
+    return size
+
+
+def build_mo(catalog):
+    """The bytes of a .mo file for a {key: translation} catalog, built in one buffer"""
+    entries = sorted((key.encode('utf-8'), value.encode('utf-8')) for key, value in catalog.items())
+    count = len(entries)
+    size = hash_table_size(count)
+    originals_offset = HEADER_SIZE
+    translations_offset = originals_offset + 8 * count
+    hash_offset = translations_offset + 8 * count
+
+    buffer = bytearray(hash_offset + 4 * size)
+    struct.pack_into(
+        '<7I', buffer, 0,
+        MO_MAGIC, 0, count, originals_offset, translations_offset, size, hash_offset,
+    )
+    hash_table = [0] * size
+    for index, (key, _) in enumerate(entries):
+        struct.pack_into('<II', buffer, originals_offset + 8 * index, len(key), len(buffer))
+        buffer += key + b'\0'
+        # Open addressing with double hashing, as libintl probes it
+        value = hash_string(key)
+        slot = value % size
+        step = 1 + value % (size - 2)
+        while hash_table[slot]:
+            slot = slot - (size - step) if slot >= size - step else slot + step
+        hash_table[slot] = index + 1
+    for index, (_, value) in enumerate(entries):
+        struct.pack_into('<II', buffer, translations_offset + 8 * index, len(value), len(buffer))
+        buffer += value + b'\0'
+    struct.pack_into(f'<{size}I', buffer, hash_offset, *hash_table)
+    return bytes(buffer)
+
+
 def compile_po_to_mo(po_path, mo_path):
     """Compile a .po file to a .mo file"""
-    messages = {}
-    
     with open(po_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Parse .po file
-    current_msgid = None
-    current_msgstr = None
-    
-    lines = content.split('\n')
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        if line.startswith('msgid "'):
-            current_msgid = line[7:-1]
-            # Check for multiline
-            while i + 1 < len(lines) and lines[i + 1].strip().startswith('"'):
-                i += 1
-                current_msgid += lines[i].strip()[1:-1]
-        elif line.startswith('msgstr "'):
-            current_msgstr = line[8:-1]
-            # Check for multiline
-            while i + 1 < len(lines) and lines[i + 1].strip().startswith('"'):
-                i += 1
-                current_msgstr += lines[i].strip()[1:-1]
-            
-            if current_msgid and current_msgstr:
-                messages[current_msgid] = current_msgstr
-            current_msgid = None
-            current_msgstr = None
-        
-        i += 1
-    
-    # Generate .mo file
-    keys = sorted(messages.keys())
-    offsets = []
-    ids = b''
-    strs = b''
-    
-    for key in keys:
-        # Offset for msgid
-        offsets.append((len(ids), len(key.encode('utf-8')), len(strs), len(messages[key].encode('utf-8'))))
-        ids += key.encode('utf-8') + b'\x00'
-        strs += messages[key].encode('utf-8') + b'\x00'
-    
-    # Generate the hash table (empty for simplicity)
-    keystart = 7 * 4 + 16 * len(keys)
-    valuestart = keystart + len(ids)
-    
-    output = []
-    # Magic number
-    output.append(struct.pack('I', 0x950412de))
-    # Version
-    output.append(struct.pack('I', 0))
-    # Number of strings
-    output.append(struct.pack('I', len(keys)))
-    # Offset of table with original strings
-    output.append(struct.pack('I', 7 * 4))
-    # Offset of table with translation strings
-    output.append(struct.pack('I', 7 * 4 + len(keys) * 8))
-    # Size of hashing table
-    output.append(struct.pack('I', 0))
-    # Offset of hashing table
-    output.append(struct.pack('I', 0))
-    
-    # Original string table
-    for o in offsets:
-        output.append(struct.pack('II', o[1], keystart + o[0]))
-    
-    # Translation string table
-    for o in offsets:
-        output.append(struct.pack('II', o[3], valuestart + o[2]))
-    
-    # Strings
-    output.append(ids)
-    output.append(strs)
-    
-    with open(mo_path, 'wb') as f:
-        f.write(b''.join(output))
-    
-    print(f"Compiled: {po_path} -> {mo_path}")
+        catalog = parse_po(f.read(), po_path)
+
+    # Written aside and renamed, so a running server never reads half a file
+    temporary = f'{mo_path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(build_mo(catalog))
+    os.replace(temporary, mo_path)
+
+
+def stamp_path(po_path):
+    return po_path.with_name(f'.{po_path.name}.sha256')
+
+
+def compile_locale(po_path, force=False):
+    """Compile one .po file unless it is unchanged; return a line to print"""
+    mo_path = po_path.with_suffix('.mo')
+    if not force and mo_path.exists():
+        if mo_path.stat().st_mtime >= po_path.stat().st_mtime:
+            return f"Up to date: {po_path}"
+        digest = hashlib.sha256(po_path.read_bytes()).hexdigest()
+        stamp = stamp_path(po_path)
+        if stamp.exists() and stamp.read_text().strip() == digest:
+            # Touched without changes (e.g. by a checkout)
+            os.utime(mo_path)
+            return f"Up to date: {po_path}"
+    else:
+        digest = hashlib.sha256(po_path.read_bytes()).hexdigest()
+    compile_po_to_mo(str(po_path), str(mo_path))
+    stamp_path(po_path).write_text(digest + '\n')
+    return f"Compiled: {po_path} -> {mo_path}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--force', action='store_true', help='Recompile unchanged locales too')
+    parser.add_argument('--jobs', type=int, default=None, help='Locales compiled at once (default: one per CPU)')
+    parser.add_argument('--locale-dir', default='locale', help='Directory holding <lang>/LC_MESSAGES/django.po')
+    args = parser.parse_args()
+
+    po_files = sorted(Path(args.locale_dir).glob('*/LC_MESSAGES/django.po'))
+    if not po_files:
+        return
+    with ProcessPoolExecutor(max_workers=min(args.jobs or os.cpu_count() or 1, len(po_files))) as executor:
+        futures = {po_file: executor.submit(compile_locale, po_file, args.force) for po_file in po_files}
+        for po_file, future in futures.items():
+            try:
+                print(future.result())
+            except Exception as e:
+                print(f"Error compiling {po_file}: {e}")
+
 
 if __name__ == '__main__':
-    locale_dir = Path('locale')
-    for po_file in locale_dir.glob('*/LC_MESSAGES/django.po'):
-        mo_file = po_file.with_suffix('.mo')
-        try:
-            compile_po_to_mo(str(po_file), str(mo_file))
-        except Exception as e:
-            print(f"Error compiling {po_file}: {e}")
+    main()
@@ -1,19 +1,36 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.contenttypes.admin import GenericTabularInline
 from django.utils.html import format_html
-from django.db import models
 from .models import (
     Category, MenuItem, Ingredient, MenuItemIngredient,
-    Customization, Review, RestaurantInfo, Branch
+    Customization, Review, RestaurantInfo, Branch, Order, OrderLine, Translation
 )
 
 
+class TranslationInline(GenericTabularInline):
+    model = Translation
+    fields = ['field', 'language', 'text']
+    extra = 0
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        if db_field.name == 'field':
+            # Only the fields the parent model translates
+            kwargs['widget'] = forms.Select(choices=[
+                (name, self.parent_model._meta.get_field(name).verbose_name.capitalize())
+                for name in self.parent_model.translated_fields
+            ])
+        return super().formfield_for_dbfield(db_field, request, **kwargs)
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'order', 'is_active', 'item_count', 'image_preview', 'created_at']
-    list_editable = ['order', 'is_active']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['name', 'order', 'kitchen_station', 'is_active', 'item_count', 'image_preview', 'created_at']
+    list_editable = ['order', 'kitchen_station', 'is_active']
+    list_filter = ['is_active', 'kitchen_station', 'created_at']
     search_fields = ['name', 'description']
     ordering = ['order', 'name']
+    inlines = [TranslationInline]
     
     fieldsets = (
         ('Basic Information', {
@@ -22,6 +39,9 @@ class CategoryAdmin(admin.ModelAdmin):
         ('Display Settings', {
             'fields': ('order', 'is_active')
         }),
+        ('Kitchen', {
+            'fields': ('kitchen_station',)
+        }),
     )
 
     def item_count(self, obj):
@@ -55,7 +75,7 @@ class MenuItemAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     autocomplete_fields = ['category']
     filter_horizontal = []
-    inlines = [MenuItemIngredientInline]
+    inlines = [MenuItemIngredientInline, TranslationInline]
     readonly_fields = ['rating_display', 'review_count']
     
     fieldsets = (
@@ -101,17 +121,15 @@ class MenuItemAdmin(admin.ModelAdmin):
     dietary_info.short_description = 'Dietary'
     
     def rating_display(self, obj):
-        approved_reviews = obj.reviews.filter(is_approved=True)
-        if approved_reviews.exists():
-            avg_rating = approved_reviews.aggregate(models.Avg('rating'))['rating__avg']
-            count = approved_reviews.count()
+        if obj.rating_count:
+            avg_rating = obj.rating_avg
             stars = '★' * int(round(avg_rating)) + '☆' * (5 - int(round(avg_rating)))
-            return format_html('<span style="color: #ffc107;">{} ({})</span>', stars, count)
+            return format_html('<span style="color: #ffc107;">{} ({})</span>', stars, obj.rating_count)
         return "No reviews"
     rating_display.short_description = 'Rating'
     
     def review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        return obj.rating_count
     review_count.short_description = 'Reviews'
 
 
@@ -121,6 +139,7 @@ class IngredientAdmin(admin.ModelAdmin):
     list_filter = ['is_allergen', 'organic', 'seasonal', 'created_at']
     search_fields = ['name', 'description', 'origin', 'supplier']
     list_editable = ['is_allergen', 'organic', 'seasonal']
+    inlines = [TranslationInline]
     
     fieldsets = (
         ('Basic Information', {
@@ -211,12 +230,12 @@ class ReviewAdmin(admin.ModelAdmin):
     comment_preview.short_description = 'Comment'
     
     def approve_reviews(self, request, queryset):
-        queryset.update(is_approved=True)
+        queryset.set_approved(True)
         self.message_user(request, f"{queryset.count()} reviews approved successfully.")
     approve_reviews.short_description = "Approve selected reviews"
     
     def reject_reviews(self, request, queryset):
-        queryset.update(is_approved=False)
+        queryset.set_approved(False)
         self.message_user(request, f"{queryset.count()} reviews rejected successfully.")
     reject_reviews.short_description = "Reject selected reviews"
 
@@ -255,7 +274,7 @@ class BranchAdmin(admin.ModelAdmin):
     image_preview.short_description = 'Preview'
     
     def review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        return obj.rating_count
     review_count.short_description = 'Reviews'
 
 
@@ -284,3 +303,43 @@ class RestaurantInfoAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # Don't allow deletion
         return False
+
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    can_delete = False
+    fields = ['name', 'unit_price', 'customizations', 'quantity', 'line_total', 'station', 'preparation_time']
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['order_number', 'customer_name', 'order_type', 'status', 'total', 'created_at']
+    list_editable = ['status']
+    list_filter = ['status', 'order_type', 'payment_method', 'created_at']
+    search_fields = ['order_number', 'customer_name', 'email', 'phone']
+    readonly_fields = [
+        'order_number', 'currency_symbol', 'subtotal', 'tax_rate', 'tax',
+        'delivery_fee', 'total', 'created_at', 'updated_at'
+    ]
+    inlines = [OrderLineInline]
+
+    fieldsets = (
+        ('Order', {
+            'fields': ('order_number', 'status', 'order_type', 'delivery_time', 'payment_method')
+        }),
+        ('Customer', {
+            'fields': ('customer_name', 'email', 'phone', 'address', 'delivery_instructions')
+        }),
+        ('Totals', {
+            'fields': ('currency_symbol', 'subtotal', 'tax_rate', 'tax', 'delivery_fee', 'total')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
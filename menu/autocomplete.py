@@ -0,0 +1,164 @@
+"""
+In-process trigram index for typo-tolerant autocomplete.
+
+Menu item, ingredient and category names are split into padded character
+trigrams with an inverted index from trigram to entries, so a lookup only
+touches entries sharing at least one trigram with the query. The index is
+built lazily from the database once per process, patched by the model
+signals of this process, and rebuilt when the menu version shows another
+process changed the menu.
+"""
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from .cache import get_version
+from .models import Category, MenuItem, Ingredient
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 25
+
+# Minimum Dice similarity for an entry to be suggested
+MIN_SCORE = 0.3
+
+# Bonus for names that start with the query, so type-ahead prefixes win
+PREFIX_BONUS = 0.5
+
+
+def normalize(text):
+    """Lowercase and strip accents so 'Crème' and 'creme' index the same"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).strip()
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.entries = {}
+        self.postings = defaultdict(set)
+        self.version = None
+        self.lock = threading.Lock()
+
+    def add(self, key, name, payload):
+        with self.lock:
+            self._remove(key)
+            grams = trigrams(name)
+            self.entries[key] = (normalize(name), grams, payload)
+            for gram in grams:
+                self.postings[gram].add(key)
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for gram in entry[1]:
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        normalized = normalize(query)
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self.lock:
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self.postings.get(gram, ()))
+            scored = []
+            for key, common in shared.items():
+                name, grams, payload = self.entries[key]
+                score = 2 * common / (len(query_grams) + len(grams))
+                if name.startswith(normalized):
+                    score += PREFIX_BONUS
+                if score >= MIN_SCORE:
+                    scored.append((score, name, payload))
+
+        scored.sort(key=lambda match: (-match[0], match[1]))
+        return [dict(payload, score=round(score, 3)) for score, name, payload in scored[:limit]]
+
+
+# Models served by autocomplete, with the suggestion type and the rows to index
+INDEXED_MODELS = {
+    MenuItem: ('menu_item', lambda: MenuItem.objects.filter(is_available=True)),
+    Ingredient: ('ingredient', lambda: Ingredient.objects.all()),
+    Category: ('category', lambda: Category.objects.filter(is_active=True)),
+}
+
+_index = None
+_build_lock = threading.Lock()
+
+
+def is_indexed(instance):
+    if isinstance(instance, MenuItem):
+        return instance.is_available
+    if isinstance(instance, Category):
+        return instance.is_active
+    return True
+
+
+def index_instance(index, instance):
+    suggestion_type = INDEXED_MODELS[type(instance)][0]
+    key = (suggestion_type, instance.pk)
+    if is_indexed(instance):
+        index.add(key, instance.name, {'type': suggestion_type, 'id': instance.pk, 'name': instance.name})
+    else:
+        index.remove(key)
+
+
+def build_index():
+    index = TrigramIndex()
+    index.version = get_version('menu')
+    for suggestion_type, get_queryset in INDEXED_MODELS.values():
+        for instance in get_queryset().only('pk', 'name'):
+            index.add(
+                (suggestion_type, instance.pk),
+                instance.name,
+                {'type': suggestion_type, 'id': instance.pk, 'name': instance.name}
+            )
+    return index
+
+
+def get_index():
+    """Return the process index, rebuilding it if the menu changed elsewhere"""
+    global _index
+    index = _index
+    if index is None or index.version != get_version('menu'):
+        with _build_lock:
+            if _index is index:
+                _index = build_index()
+            index = _index
+    return index
+
+
+def autocomplete(query, limit=DEFAULT_LIMIT):
+    return get_index().search(query, limit)
+
+
+def update_index(instance, deleted=False):
+    """Patch the process index after a local save/delete, if it is built"""
+    index = _index
+    if index is None:
+        return
+    if deleted:
+        index.remove((INDEXED_MODELS[type(instance)][0], instance.pk))
+    else:
+        index_instance(index, instance)
+    # This change bumped the menu version by one; any larger gap means another
+    # process changed the menu too and the next lookup has to rebuild
+    current_version = get_version('menu')
+    if index.version is not None and current_version == index.version + 1:
+        index.version = current_version
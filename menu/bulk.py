@@ -0,0 +1,181 @@
+"""
+Bulk writes for the menu management endpoints.
+
+POST /api/<resource>/bulk/ takes a list of operations:
+
+    {"op": "create", "data": {...}}
+    {"op": "update", "id": 5, "data": {...}}    (partial, like PATCH)
+    {"op": "delete", "id": 7}
+
+Every row is validated before anything is written. If any row is invalid,
+nothing is applied and the response lists the errors of each row, with an
+empty object for the valid ones. Otherwise the rows to change are loaded
+with one query and the batch is applied in one transaction: one DELETE,
+one bulk_create and one bulk_update.
+
+bulk_create and bulk_update send no model signals, so what the signals do
+for single saves is done here once per batch: updated_at is set for the
+sync feed, the cache versions are bumped, and the autocomplete index and
+the media reference counts are patched. Deletes go through
+QuerySet.delete(), which still sends post_delete, so sync tombstones are
+recorded as usual.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import autocomplete, media, signals
+from .cache import bump_versions_on_commit
+from .signals import CACHE_VERSIONS
+
+MAX_OPERATIONS = 500
+
+
+class BulkOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['create', 'update', 'delete'])
+    id = serializers.IntegerField(min_value=1, required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['op'] != 'create' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': ['This field is required.']})
+        if attrs['op'] == 'create' and 'id' in attrs:
+            raise serializers.ValidationError({'id': ['Ids are assigned on creation.']})
+        return attrs
+
+
+def validate_operations(serializer_class, operations, context):
+    """Return the (op, instance, validated_data) of every row, and the errors of every row"""
+    model = serializer_class.Meta.model
+    instances = model._default_manager.in_bulk(
+        [operation['id'] for operation in operations if 'id' in operation]
+    )
+    rows, errors, seen = [], [], set()
+    for operation in operations:
+        op, pk = operation['op'], operation.get('id')
+        instance = None
+        if pk is not None:
+            instance = instances.get(pk)
+            if instance is None:
+                errors.append({'id': ['Not found.']})
+                continue
+            if pk in seen:
+                errors.append({'id': ['Only one operation per row is allowed.']})
+                continue
+            seen.add(pk)
+
+        if op == 'delete':
+            rows.append((op, instance, None))
+            errors.append({})
+            continue
+        serializer = serializer_class(instance, data=operation['data'], partial=op == 'update', context=context)
+        if serializer.is_valid():
+            rows.append((op, instance, serializer.validated_data))
+            errors.append({})
+        else:
+            errors.append(serializer.errors)
+    return rows, errors
+
+
+def apply_operations(model, rows):
+    """Write validated rows in one transaction and return the (op, id) of each"""
+    created, updated, deleted_pks = [], [], []
+    update_fields = {'updated_at'}
+    for op, instance, data in rows:
+        if op == 'create':
+            created.append(model(**data))
+        elif op == 'update':
+            for field, value in data.items():
+                setattr(instance, field, value)
+            update_fields.update(data)
+            updated.append(instance)
+        else:
+            deleted_pks.append(instance.pk)
+
+    with transaction.atomic():
+        if deleted_pks:
+            model._default_manager.filter(pk__in=deleted_pks).delete()
+        if created:
+            model._default_manager.bulk_create(created)
+        if updated:
+            # auto_now is only applied by save()
+            now = timezone.now()
+            for instance in updated:
+                instance.updated_at = now
+            model._default_manager.bulk_update(updated, sorted(update_fields))
+
+    after_bulk_write(model, created, updated, update_fields)
+    created = iter(created)
+    return [
+        {'op': op, 'id': next(created).pk if op == 'create' else instance.pk}
+        for op, instance, data in rows
+    ]
+
+
+def bump_model_versions(model):
+    bump_versions_on_commit(CACHE_VERSIONS[model])
+
+
+def after_bulk_write(model, created, updated, update_fields):
+    """
+    What the post_save signals would have done for each of the `created`
+    and `updated` rows, the latter having had `update_fields` written
+    """
+    instances = created + updated
+    if not instances:
+        return
+    bump_model_versions(model)
+    if model in autocomplete.INDEXED_MODELS:
+        for instance in instances:
+            transaction.on_commit(lambda instance=instance: autocomplete.update_index(instance))
+    if model in media.REFERENCE_MODELS:
+        for instance in instances:
+            media.update_references(instance)
+    # Only the files written: the signals skip existing renditions, but not cheaply
+    new_fields = {field.name for field in model._meta.concrete_fields}
+    for fields, rows in ((new_fields, created), (update_fields, updated)):
+        for instance in rows:
+            if 'image' in fields:
+                signals.generate_image_renditions(model, instance)
+            if 'model_3d' in fields:
+                signals.generate_model_3d_variants(model, instance)
+
+
+class BulkWriteMixin:
+    """Adds POST <resource>/bulk/ to a model viewset"""
+    bulk_max_operations = MAX_OPERATIONS
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Create, update and delete many rows at once, all or nothing
+
+        Send a list of {"op": "create"|"update"|"delete", "id", "data"};
+        updates are partial. On error nothing is written and `errors` holds
+        one entry per operation.
+        """
+        if not isinstance(request.data, list):
+            return Response({'detail': 'Expected a list of operations.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.bulk_max_operations:
+            return Response(
+                {'detail': f'At most {self.bulk_max_operations} operations per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        operations = BulkOperationSerializer(data=request.data, many=True)
+        if not operations.is_valid():
+            return Response({'errors': operations.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer_class = self.get_serializer_class()
+        rows, errors = validate_operations(
+            serializer_class, operations.validated_data, self.get_serializer_context()
+        )
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            results = apply_operations(serializer_class.Meta.model, rows)
+        except IntegrityError as e:
+            # e.g. two rows of the batch creating the same unique name
+            return Response({'detail': f'Conflicting rows: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': results})
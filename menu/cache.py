@@ -0,0 +1,180 @@
+"""
+Version counters and the response cache for read-only endpoints.
+
+Cached payloads are keyed by the current version of what they were built
+from, so invalidation is a single counter increment from the model
+signals instead of deleting every derived key.
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import get_language
+
+VERSION_KEY = 'menu:version:{}'
+RESPONSE_KEY = 'menu:response:{}'
+STATS_KEY = 'menu:response-cache:{}'
+
+# Headers replayed from a cached response
+CACHED_HEADERS = ('Content-Type', 'Content-Language', 'Vary', 'Allow')
+
+
+def get_version(name):
+    """Return the current version number of a cached resource"""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a flushed cache never reuses an old number
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Invalidate everything cached under the current version of a resource"""
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(name)
+
+
+def bump_versions_on_commit(names):
+    """
+    Bump the `names` once the current transaction commits (at once outside
+    one): a reader running before the commit would otherwise cache the old
+    data under the new version
+    """
+    def bump():
+        for name in names:
+            bump_version(name)
+    transaction.on_commit(bump)
+
+
+def get_versions(names):
+    """Current versions of several resources with a single cache round trip"""
+    keys = {VERSION_KEY.format(name): name for name in names}
+    found = cache.get_many(list(keys))
+    return [found[key] if key in found else get_version(name) for key, name in keys.items()]
+
+
+def count_response_cache(outcome):
+    key = STATS_KEY.format(outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def response_cache_stats():
+    hits = cache.get(STATS_KEY.format('hits'), 0)
+    misses = cache.get(STATS_KEY.format('misses'), 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else None,
+    }
+
+
+def response_cache_key(request, resources):
+    """Key on path, query string, language, negotiated format and resource versions"""
+    language = getattr(request, 'LANGUAGE_CODE', None) or get_language()
+    versions = '.'.join(str(version) for version in get_versions(resources))
+    raw = '|'.join([
+        request.get_full_path(), language, request.headers.get('Accept', ''), versions
+    ])
+    return RESPONSE_KEY.format(hashlib.sha256(raw.encode()).hexdigest())
+
+
+def replay_cached_response(cached):
+    response = HttpResponse(cached['content'], status=cached['status'])
+    for header, value in cached['headers']:
+        response[header] = value
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def cache_entry(rendered, content_types):
+    """What to store for a rendered response, or None if it must not be cached"""
+    if rendered.status_code != 200 or rendered.has_header('Set-Cookie'):
+        return None
+    if not rendered.get('Content-Type', '').startswith(content_types):
+        return None
+    return {
+        'content': rendered.content,
+        'status': rendered.status_code,
+        'headers': [(h, rendered[h]) for h in CACHED_HEADERS if rendered.has_header(h)],
+    }
+
+
+def cached_response(request, resources, get_response, timeout=None, content_types=('application/json',)):
+    """
+    Return a replay of the cached response for this request, or call
+    get_response() and cache its result if it is a 200 of one of
+    `content_types` (the browsable API HTML embeds per-user data)
+    """
+    key = response_cache_key(request, resources)
+    cached = cache.get(key)
+    if cached is not None:
+        count_response_cache('hits')
+        return replay_cached_response(cached)
+
+    count_response_cache('misses')
+    response = get_response()
+    patch_vary_headers(response, ['Accept-Language'])
+    response['X-Cache'] = 'MISS'
+
+    def store(rendered):
+        entry = cache_entry(rendered, content_types)
+        if entry is not None:
+            cache.set(key, entry, timeout or settings.RESPONSE_CACHE_TIMEOUT)
+
+    if getattr(response, 'is_rendered', True):
+        store(response)
+    else:
+        response.add_post_render_callback(store)
+    return response
+
+
+async def acached_response(request, resources, get_response, timeout=None,
+                           content_types=('application/json',)):
+    """cached_response() for async views; get_response is awaited and must return a rendered response"""
+    key = await sync_to_async(response_cache_key)(request, resources)
+    cached = await cache.aget(key)
+    if cached is not None:
+        await sync_to_async(count_response_cache)('hits')
+        return replay_cached_response(cached)
+
+    await sync_to_async(count_response_cache)('misses')
+    response = await get_response()
+    patch_vary_headers(response, ['Accept-Language'])
+    response['X-Cache'] = 'MISS'
+    entry = cache_entry(response, content_types)
+    if entry is not None:
+        await cache.aset(key, entry, timeout or settings.RESPONSE_CACHE_TIMEOUT)
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Serve GETs of `cached_actions` from the response cache, invalidated
+    whenever one of `cache_resources` has its version bumped
+    """
+    cache_resources = ()
+    cached_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get('get') if request.method == 'GET' else None
+        if action not in self.cached_actions:
+            return super().dispatch(request, *args, **kwargs)
+        return cached_response(
+            request, self.cache_resources,
+            lambda: super(CachedResponseMixin, self).dispatch(request, *args, **kwargs)
+        )
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import RestaurantInfo
+
+
+def restaurant_info(request):
+    """Expose the cached RestaurantInfo singleton to every template, loaded on first use"""
+    return {'restaurant_info': SimpleLazyObject(RestaurantInfo.get_solo)}
@@ -0,0 +1,174 @@
+"""
+Publish/subscribe for order status changes.
+
+Order saves publish to a channel per order number, and the server-sent
+events stream of the tracking page subscribes to it, so tracking clients
+wait on a queue instead of polling the database. The backend is chosen
+by settings.ORDER_EVENTS_BACKEND:
+
+- InMemoryBackend only reaches subscribers in the publishing process,
+  which is enough for a single worker and for development.
+- RedisBackend publishes through Redis. Each process keeps a single
+  pattern subscription and fans messages out to its local subscribers,
+  so one Redis connection serves every client a worker is streaming to.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+CHANNEL_PREFIX = 'order-events:'
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Queue of the messages published on one channel, bound to the subscriber's event loop"""
+
+    def __init__(self, backend, channel):
+        self.backend = backend
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def deliver(self, message):
+        # Publishers run in worker threads, never touch the queue from there
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    async def close(self):
+        self.backend.unsubscribe(self)
+
+
+class InMemoryBackend:
+    """Delivers messages to the subscribers of the current process"""
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    async def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self.lock:
+            self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.channel]
+
+
+class RedisBackend(InMemoryBackend):
+    """Publishes through Redis and fans out to local subscribers from one listener per process"""
+
+    def __init__(self, url=None):
+        import redis
+
+        super().__init__()
+        self.url = url or settings.REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self.listener = None
+        self.listener_loop = None
+        self.listener_ready = None
+
+    def publish(self, channel, message):
+        self.client.publish(CHANNEL_PREFIX + channel, message)
+
+    async def subscribe(self, channel):
+        subscription = await super().subscribe(channel)
+        try:
+            await self.start_listener()
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    async def start_listener(self):
+        """Start the listener unless running, and wait for its subscription; raises its failure"""
+        loop = asyncio.get_running_loop()
+        if self.listener is None or self.listener.done() or self.listener_loop is not loop:
+            self.listener_loop = loop
+            self.listener_ready = asyncio.Event()
+            self.listener = loop.create_task(self.listen(self.listener_ready))
+            self.listener.add_done_callback(self.listener_stopped)
+        # Messages published before the pattern subscription is active would be lost
+        ready = asyncio.ensure_future(self.listener_ready.wait())
+        listener = self.listener
+        try:
+            await asyncio.wait({ready, listener}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            ready.cancel()
+        if not self.listener_ready.is_set():
+            # Failed before subscribing (or stopped): raises its exception
+            listener.result()
+            raise RuntimeError('Order event listener stopped before subscribing')
+
+    def listener_stopped(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('Order event listener failed', exc_info=task.exception())
+
+    async def listen(self, ready):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.psubscribe(CHANNEL_PREFIX + '*')
+            ready.set()
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                channel = message['channel'].decode()[len(CHANNEL_PREFIX):]
+                self.deliver(channel, message['data'].decode())
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.ORDER_EVENTS_BACKEND)()
+    return _backend
+
+
+def order_status_message(order):
+    return json.dumps({
+        'order_number': order.order_number,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'updated_at': order.updated_at.isoformat(),
+    })
+
+
+def publish_order_status(order):
+    get_backend().publish(order.order_number, order_status_message(order))
+
+
+async def subscribe_order_status(order_number):
+    return await get_backend().subscribe(order_number)
@@ -0,0 +1,596 @@
+"""
+Reading, packing and simplifying glTF 2.0 models, in pure Python.
+
+Every supported upload is turned into one document plus one binary
+buffer, the two parts of a binary glTF (GLB) file:
+
+- .glb files are read as they are,
+- .gltf files must embed their buffers and images as data: URIs, since a
+  single upload can't carry the separate files they would point at,
+- .obj files are triangulated into indexed positions, and normals and
+  texture coordinates when every face has them (.mtl materials are
+  separate files too, so the model gets glTF's default material).
+
+simplify() makes the lower-detail copy by vertex clustering: the vertices
+falling in the same cell of a grid laid over each primitive are merged into
+their average and the triangles collapsing in the process dropped, with
+coarser grids until the model fits the vertex budget. It keeps materials
+and textures and drops skins, morph targets and animations; models whose
+geometry it can't read (compressed or non-triangle meshes) get no copy.
+"""
+import base64
+import copy
+import json
+import os
+import struct
+import sys
+from array import array
+from urllib.parse import unquote_to_bytes
+
+from django.core.exceptions import ValidationError
+
+GLB_MAGIC = b'glTF'
+JSON_CHUNK = 0x4E4F534A
+BIN_CHUNK = 0x004E4942
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+FLOAT = 5126
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+
+UINT32 = 'I' if array('I').itemsize == 4 else 'L'
+
+# array typecode of each accessor componentType
+TYPECODES = {
+    5120: 'b',
+    5121: 'B',
+    5122: 'h',
+    UNSIGNED_SHORT: 'H',
+    UNSIGNED_INT: UINT32,
+    FLOAT: 'f',
+}
+COMPONENT_TYPES = {'f': FLOAT, 'H': UNSIGNED_SHORT, UINT32: UNSIGNED_INT}
+
+# Components per element of each accessor type
+TYPE_SIZES = {
+    'SCALAR': 1,
+    'VEC2': 2,
+    'VEC3': 3,
+    'VEC4': 4,
+    'MAT2': 4,
+    'MAT3': 9,
+    'MAT4': 16,
+}
+
+# Vertex attributes simplify() averages; the others are dropped
+SIMPLIFIED_ATTRIBUTES = ('NORMAL', 'TEXCOORD_0', 'TEXCOORD_1', 'COLOR_0')
+
+# Grid cells along the longest side of each primitive, finest first
+CLUSTER_RESOLUTIONS = (256, 192, 128, 96, 64, 48, 32, 24, 16, 12, 8, 6, 4, 2)
+
+ASSET = {'version': '2.0', 'generator': 'restaurant_api'}
+
+# Uploads are read whole into memory to be checked and converted
+MAX_MODEL_SIZE = 64 * 2 ** 20
+
+
+class InvalidModel(ValueError):
+    """The file is not a 3D model this module can read"""
+
+
+def parse_json(data):
+    try:
+        gltf = json.loads(data)
+    except (UnicodeDecodeError, ValueError):
+        raise InvalidModel('The glTF JSON is not valid')
+    asset = gltf.get('asset') if isinstance(gltf, dict) else None
+    if not isinstance(asset, dict) or not str(asset.get('version', '')).startswith('2.'):
+        raise InvalidModel('Only glTF 2.0 models are supported')
+    return gltf
+
+
+def read_glb(data):
+    """(document, binary chunk or None) of a GLB file"""
+    if len(data) < 20:
+        raise InvalidModel('The file is too short to be a GLB')
+    magic, version, length = struct.unpack_from('<4sII', data)
+    if magic != GLB_MAGIC:
+        raise InvalidModel('The file is not a binary glTF (GLB)')
+    if version != 2:
+        raise InvalidModel(f'glTF version {version} is not supported, only 2')
+    if length != len(data):
+        raise InvalidModel('The GLB length does not match the file size')
+
+    chunks = []
+    offset = 12
+    while offset < length:
+        if offset + 8 > length:
+            raise InvalidModel('The GLB ends in the middle of a chunk header')
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        start, offset = offset + 8, offset + 8 + chunk_length
+        if offset > length:
+            raise InvalidModel('A GLB chunk runs past the end of the file')
+        chunks.append((chunk_type, data[start:offset]))
+    if not chunks or chunks[0][0] != JSON_CHUNK:
+        raise InvalidModel('The GLB has no JSON chunk')
+    binary = chunks[1][1] if len(chunks) > 1 and chunks[1][0] == BIN_CHUNK else None
+    return parse_json(chunks[0][1]), binary
+
+
+def decode_data_uri(uri):
+    """(MIME type, bytes) of a data: URI"""
+    if not isinstance(uri, str) or not uri.startswith('data:'):
+        raise InvalidModel(
+            f'The model refers to the separate file {uri!r}; upload a .glb, or a .gltf with embedded data'
+        )
+    header, _, payload = uri[5:].partition(',')
+    try:
+        data = base64.b64decode(payload) if header.endswith(';base64') else unquote_to_bytes(payload)
+    except ValueError:
+        raise InvalidModel('A data: URI of the model is not valid base64')
+    return header.split(';')[0] or 'application/octet-stream', data
+
+
+def align(binary):
+    """Pad `binary` to the 4-byte boundary glTF requires between buffer views"""
+    binary += b'\0' * (-len(binary) % 4)
+
+
+def pack_buffers(gltf, glb_binary=None):
+    """
+    Merge every buffer of `gltf` into one, as the binary chunk of a GLB, and
+    move the data: URI images into it; return that buffer
+    """
+    binary = bytearray()
+    offsets = []
+    for index, buffer in enumerate(gltf.get('buffers', [])):
+        if 'uri' in buffer:
+            data = decode_data_uri(buffer['uri'])[1]
+        elif index == 0 and glb_binary is not None:
+            data = glb_binary
+        else:
+            raise InvalidModel(f'Buffer {index} of the model has no data')
+        byte_length = buffer['byteLength']
+        if len(data) < byte_length:
+            raise InvalidModel(f'Buffer {index} of the model is shorter than its byteLength')
+        align(binary)
+        offsets.append(len(binary))
+        binary += data[:byte_length]
+
+    views = gltf.setdefault('bufferViews', [])
+    for view in views:
+        if not 0 <= view['buffer'] < len(offsets):
+            raise InvalidModel('A bufferView of the model refers to a missing buffer')
+        view['byteOffset'] = view.get('byteOffset', 0) + offsets[view['buffer']]
+        view['buffer'] = 0
+    for image in gltf.get('images', []):
+        if 'uri' in image:
+            mime_type, data = decode_data_uri(image.pop('uri'))
+            align(binary)
+            views.append({'buffer': 0, 'byteOffset': len(binary), 'byteLength': len(data)})
+            binary += data
+            image['bufferView'] = len(views) - 1
+            image.setdefault('mimeType', mime_type)
+    return bytes(binary)
+
+
+def element_layout(gltf, accessor):
+    """(array typecode, components per element, element bytes, stride) of an accessor"""
+    typecode = TYPECODES[accessor['componentType']]
+    width = TYPE_SIZES[accessor['type']]
+    element = array(typecode).itemsize * width
+    view = gltf['bufferViews'][accessor['bufferView']]
+    return typecode, width, element, view.get('byteStride') or element
+
+
+def check_index(items, index, what):
+    if not isinstance(index, int) or not 0 <= index < len(items):
+        raise InvalidModel(f'The model refers to a missing {what}')
+    return items[index]
+
+
+def check_document(gltf, binary):
+    """Check the buffer views and accessors stay within the buffer and every primitive has positions"""
+    views = gltf.get('bufferViews', [])
+    for view in views:
+        if view.get('byteOffset', 0) + view['byteLength'] > len(binary):
+            raise InvalidModel('A bufferView of the model lies outside its buffer')
+    accessors = gltf.get('accessors', [])
+    for accessor in accessors:
+        if accessor.get('componentType') not in TYPECODES or accessor.get('type') not in TYPE_SIZES:
+            raise InvalidModel('An accessor of the model has an unknown type')
+        if 'bufferView' not in accessor:
+            continue
+        view = check_index(views, accessor['bufferView'], 'bufferView')
+        _, _, element, stride = element_layout(gltf, accessor)
+        count = accessor['count']
+        if count and accessor.get('byteOffset', 0) + stride * (count - 1) + element > view['byteLength']:
+            raise InvalidModel('An accessor of the model reads past its bufferView')
+    for image in gltf.get('images', []):
+        if 'bufferView' in image:
+            check_index(views, image['bufferView'], 'bufferView')
+    meshes = gltf.get('meshes', [])
+    if not meshes:
+        raise InvalidModel('The model has no meshes')
+    for mesh in meshes:
+        if not mesh.get('primitives'):
+            raise InvalidModel('A mesh of the model has no primitives')
+        for primitive in mesh['primitives']:
+            for index in primitive['attributes'].values():
+                check_index(accessors, index, 'accessor')
+            if 'POSITION' not in primitive['attributes']:
+                raise InvalidModel('A mesh of the model has no vertex positions')
+            if 'indices' in primitive:
+                check_index(accessors, primitive['indices'], 'accessor')
+
+
+def read_model(data, extension):
+    """(document, binary buffer) of a .glb, .gltf or .obj file's bytes, checked; raises InvalidModel"""
+    try:
+        if extension == '.glb':
+            gltf, glb_binary = read_glb(data)
+            binary = pack_buffers(gltf, glb_binary)
+        elif extension == '.gltf':
+            gltf = parse_json(data)
+            binary = pack_buffers(gltf)
+        elif extension == '.obj':
+            gltf, binary = read_obj(data)
+        else:
+            raise InvalidModel(
+                f"{extension or 'Files without an extension'} files are not supported; "
+                "upload a .glb, .gltf or .obj file"
+            )
+        check_document(gltf, binary)
+    except InvalidModel:
+        raise
+    except (KeyError, IndexError, TypeError, AttributeError, ValueError):
+        raise InvalidModel('The structure of the glTF model is not valid')
+    return gltf, binary
+
+
+def to_glb(gltf, binary):
+    """GLB file of a document and its binary buffer"""
+    gltf = dict(gltf)
+    if binary:
+        gltf['buffers'] = [{'byteLength': len(binary)}]
+    else:
+        gltf.pop('buffers', None)
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode()
+    chunks = [(JSON_CHUNK, json_chunk + b' ' * (-len(json_chunk) % 4))]
+    if binary:
+        chunks.append((BIN_CHUNK, binary + b'\0' * (-len(binary) % 4)))
+    body = b''.join(struct.pack('<II', len(chunk), chunk_type) + chunk for chunk_type, chunk in chunks)
+    return struct.pack('<4sII', GLB_MAGIC, 2, 12 + len(body)) + body
+
+
+def count_geometry(gltf):
+    """(vertices, triangles) of every mesh primitive in the document"""
+    accessors = gltf.get('accessors', [])
+    vertices = triangles = 0
+    for mesh in gltf.get('meshes', []):
+        for primitive in mesh['primitives']:
+            count = accessors[primitive['attributes']['POSITION']]['count']
+            vertices += count
+            if 'indices' in primitive:
+                count = accessors[primitive['indices']]['count']
+            mode = primitive.get('mode', TRIANGLES)
+            if mode == TRIANGLES:
+                triangles += count // 3
+            elif mode in (5, 6):
+                # Triangle strips and fans
+                triangles += max(count - 2, 0)
+    return vertices, triangles
+
+
+def read_accessor(gltf, binary, index):
+    """The components of an accessor as a flat array, or None if they are compressed or sparse"""
+    accessor = gltf['accessors'][index]
+    if 'bufferView' not in accessor or 'sparse' in accessor:
+        return None
+    typecode, width, element, stride = element_layout(gltf, accessor)
+    start = gltf['bufferViews'][accessor['bufferView']].get('byteOffset', 0) + accessor.get('byteOffset', 0)
+    count = accessor['count']
+    values = array(typecode)
+    if stride == element:
+        values.frombytes(binary[start:start + element * count])
+    else:
+        for offset in range(start, start + stride * count, stride):
+            values.frombytes(binary[offset:offset + element])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class GlbWriter:
+    """Builds the accessors and buffer views of a document into a new binary buffer"""
+
+    def __init__(self, gltf):
+        self.gltf = gltf
+        self.binary = bytearray()
+        gltf['bufferViews'] = []
+        gltf['accessors'] = []
+
+    def view(self, data, target=None):
+        align(self.binary)
+        view = {'buffer': 0, 'byteOffset': len(self.binary), 'byteLength': len(data)}
+        if target:
+            view['target'] = target
+        self.binary += data
+        self.gltf['bufferViews'].append(view)
+        return len(self.gltf['bufferViews']) - 1
+
+    def accessor(self, values, accessor_type, bounds=False, target=ARRAY_BUFFER):
+        width = TYPE_SIZES[accessor_type]
+        if sys.byteorder == 'big':
+            values = array(values.typecode, values)
+            values.byteswap()
+        accessor = {
+            'bufferView': self.view(values.tobytes(), target),
+            'componentType': COMPONENT_TYPES[values.typecode],
+            'count': len(values) // width,
+            'type': accessor_type,
+        }
+        if bounds:
+            # Required on POSITION
+            accessor['min'] = [min(values[k::width]) for k in range(width)]
+            accessor['max'] = [max(values[k::width]) for k in range(width)]
+        self.gltf['accessors'].append(accessor)
+        return len(self.gltf['accessors']) - 1
+
+    def indices(self, indices, vertex_count):
+        # 65535 is the primitive restart value, never a valid 16 bit index
+        typecode = 'H' if vertex_count < 65535 else UINT32
+        return self.accessor(array(typecode, indices), 'SCALAR', target=ELEMENT_ARRAY_BUFFER)
+
+    def primitive(self, positions, indices, attributes=()):
+        """Attributes and indices of a primitive written from flat arrays"""
+        vertex_count = len(positions) // 3
+        written = {'POSITION': self.accessor(positions, 'VEC3', bounds=True)}
+        for name, (values, accessor_type) in dict(attributes).items():
+            written[name] = self.accessor(values, accessor_type)
+        return {'attributes': written, 'indices': self.indices(indices, vertex_count), 'mode': TRIANGLES}
+
+
+def obj_index(text, count):
+    """0-based index of a 1-based or negative (relative) OBJ index"""
+    index = int(text)
+    return index - 1 if index > 0 else count + index
+
+
+def read_obj(data):
+    """(document, binary buffer) of a Wavefront OBJ file's bytes"""
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        text = data.decode('latin-1')
+
+    positions, uvs, normals, faces = [], [], [], []
+    for number, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            if parts[0] == 'v':
+                positions.append((float(parts[1]), float(parts[2]), float(parts[3])))
+            elif parts[0] == 'vt':
+                # OBJ counts v from the bottom of the texture, glTF from the top
+                uvs.append((float(parts[1]), 1.0 - float(parts[2]) if len(parts) > 2 else 1.0))
+            elif parts[0] == 'vn':
+                normals.append((float(parts[1]), float(parts[2]), float(parts[3])))
+            elif parts[0] == 'f':
+                face = []
+                for corner in parts[1:]:
+                    v, vt, vn = (corner.split('/') + ['', ''])[:3]
+                    face.append((
+                        obj_index(v, len(positions)),
+                        obj_index(vt, len(uvs)) if vt else None,
+                        obj_index(vn, len(normals)) if vn else None,
+                    ))
+                if len(face) < 3:
+                    raise ValueError
+                faces.append(face)
+        except (ValueError, IndexError):
+            raise InvalidModel(f'Line {number} of the OBJ file is not valid')
+    if not faces:
+        raise InvalidModel('The OBJ file has no faces')
+
+    corners = [corner for face in faces for corner in face]
+    has_uvs = all(vt is not None for _, vt, _ in corners)
+    has_normals = all(vn is not None for _, _, vn in corners)
+    for v, vt, vn in corners:
+        if not 0 <= v < len(positions) or (has_uvs and not 0 <= vt < len(uvs)) or (
+            has_normals and not 0 <= vn < len(normals)
+        ):
+            raise InvalidModel('A face of the OBJ file refers to a missing vertex')
+
+    # One glTF vertex per distinct (position, uv, normal) corner
+    vertices = {}
+    out_positions, out_uvs, out_normals = array('f'), array('f'), array('f')
+    indices = array(UINT32)
+    for face in faces:
+        keys = [(v, vt if has_uvs else None, vn if has_normals else None) for v, vt, vn in face]
+        for key in keys:
+            if key not in vertices:
+                vertices[key] = len(vertices)
+                out_positions.extend(positions[key[0]])
+                if has_uvs:
+                    out_uvs.extend(uvs[key[1]])
+                if has_normals:
+                    out_normals.extend(normals[key[2]])
+        # Polygons as triangle fans
+        for i in range(1, len(keys) - 1):
+            indices.extend((vertices[keys[0]], vertices[keys[i]], vertices[keys[i + 1]]))
+
+    gltf = {
+        'asset': dict(ASSET),
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+    }
+    writer = GlbWriter(gltf)
+    attributes = {}
+    if has_normals:
+        attributes['NORMAL'] = (out_normals, 'VEC3')
+    if has_uvs:
+        attributes['TEXCOORD_0'] = (out_uvs, 'VEC2')
+    gltf['meshes'] = [{'primitives': [writer.primitive(out_positions, indices, attributes)]}]
+    return gltf, bytes(writer.binary)
+
+
+def cluster(positions, indices, attributes, cell):
+    """
+    (positions, indices, attributes) of a triangle mesh with the vertices in
+    each `cell`-sized cube merged into their average
+    """
+    xs, ys, zs = positions[0::3], positions[1::3], positions[2::3]
+    min_x, min_y, min_z = min(xs), min(ys), min(zs)
+    cells = {}
+    cell_of = [
+        cells.setdefault((int((x - min_x) / cell), int((y - min_y) / cell), int((z - min_z) / cell)), len(cells))
+        for x, y, z in zip(xs, ys, zs)
+    ]
+
+    # Triangles whose corners are still distinct, numbering the cells they use
+    used = {}
+    triangles = array(UINT32)
+    seen = set()
+    for i in range(0, len(indices) - 2, 3):
+        a, b, c = cell_of[indices[i]], cell_of[indices[i + 1]], cell_of[indices[i + 2]]
+        if a == b or b == c or a == c:
+            continue
+        # Rotated to start at the lowest cell, which keeps the winding
+        triangle = min((a, b, c), (b, c, a), (c, a, b))
+        if triangle in seen:
+            continue
+        seen.add(triangle)
+        triangles.extend(used.setdefault(corner, len(used)) for corner in triangle)
+
+    vertex_of = [used.get(c) for c in cell_of]
+    counts = [0] * len(used)
+    for vertex in vertex_of:
+        if vertex is not None:
+            counts[vertex] += 1
+
+    def average(values, width):
+        sums = [0.0] * (len(used) * width)
+        for source, vertex in enumerate(vertex_of):
+            if vertex is not None:
+                for k in range(width):
+                    sums[vertex * width + k] += values[source * width + k]
+        return array('f', (total / counts[i // width] for i, total in enumerate(sums)))
+
+    averaged = {}
+    for name, (values, accessor_type) in attributes.items():
+        width = TYPE_SIZES[accessor_type]
+        result = average(values, width)
+        if name == 'NORMAL':
+            for i in range(0, len(result), 3):
+                length = (result[i] ** 2 + result[i + 1] ** 2 + result[i + 2] ** 2) ** 0.5 or 1.0
+                result[i], result[i + 1], result[i + 2] = result[i] / length, result[i + 1] / length, result[i + 2] / length
+        averaged[name] = (result, accessor_type)
+    return average(positions, 3), triangles, averaged
+
+
+def simplify(gltf, binary, max_vertices):
+    """
+    (document, binary buffer) of a copy of the model with about
+    `max_vertices` vertices at most, or None if its geometry can't be read
+    """
+    if gltf.get('extensionsRequired'):
+        # Compressed or quantized geometry
+        return None
+    accessors = gltf['accessors']
+    geometry = []
+    for mesh in gltf['meshes']:
+        for primitive in mesh['primitives']:
+            position = accessors[primitive['attributes']['POSITION']]
+            if primitive.get('mode', TRIANGLES) != TRIANGLES or position['componentType'] != FLOAT:
+                return None
+            positions = read_accessor(gltf, binary, primitive['attributes']['POSITION'])
+            if positions is None or not positions:
+                return None
+            vertex_count = len(positions) // 3
+            if 'indices' in primitive:
+                indices = read_accessor(gltf, binary, primitive['indices'])
+                if indices is None or (indices and max(indices) >= vertex_count):
+                    return None
+            else:
+                indices = array(UINT32, range(vertex_count))
+            attributes = {}
+            for name in SIMPLIFIED_ATTRIBUTES:
+                index = primitive['attributes'].get(name)
+                if index is not None and accessors[index]['componentType'] == FLOAT:
+                    values = read_accessor(gltf, binary, index)
+                    if values is not None:
+                        attributes[name] = (values, accessors[index]['type'])
+            extent = max(max(positions[k::3]) - min(positions[k::3]) for k in range(3)) or 1.0
+            geometry.append((positions, indices, attributes, extent))
+
+    def attempt(resolution):
+        result = [
+            cluster(positions, indices, attributes, extent / resolution)
+            for positions, indices, attributes, extent in geometry
+        ]
+        # None when a primitive vanishes at this resolution
+        return result if all(indices for _, indices, _ in result) else None
+
+    # Binary search for the finest resolution fitting the budget; vertex
+    # counts only grow with the resolution, so each pass halves the range
+    fitting = coarsest = None
+    low, high = 0, len(CLUSTER_RESOLUTIONS) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        result = attempt(CLUSTER_RESOLUTIONS[middle])
+        if result is None:
+            high = middle - 1
+        elif sum(len(positions) // 3 for positions, _, _ in result) > max_vertices:
+            coarsest = result
+            low = middle + 1
+        else:
+            fitting = result
+            high = middle - 1
+    # Over the budget when even the coarsest grid is
+    simplified = fitting or coarsest
+    if simplified is None:
+        return None
+
+    preview = copy.deepcopy({key: value for key, value in gltf.items() if key not in ('animations', 'skins')})
+    writer = GlbWriter(preview)
+    for image in preview.get('images', []):
+        if 'bufferView' in image:
+            view = gltf['bufferViews'][image['bufferView']]
+            start = view.get('byteOffset', 0)
+            image['bufferView'] = writer.view(binary[start:start + view['byteLength']])
+    for node in preview.get('nodes', []):
+        node.pop('skin', None)
+        node.pop('weights', None)
+    primitives = iter(simplified)
+    for mesh in preview['meshes']:
+        mesh.pop('weights', None)
+        for primitive in mesh['primitives']:
+            material = primitive.get('material')
+            primitive.clear()
+            primitive.update(writer.primitive(*next(primitives)))
+            if material is not None:
+                primitive['material'] = material
+    return preview, bytes(writer.binary)
+
+
+def validate_model_file(file):
+    """Model field validator: reject uploads read_model() can't make a GLB of"""
+    if getattr(file, '_committed', False):
+        # Already stored, so checked when it was uploaded
+        return
+    extension = os.path.splitext(file.name)[1].lower()
+    if file.size > MAX_MODEL_SIZE:
+        raise ValidationError(
+            f'3D models are limited to {MAX_MODEL_SIZE // 2 ** 20} MB', code='model_too_large'
+        )
+    data = b''.join(file.chunks())
+    file.seek(0)
+    try:
+        read_model(data, extension)
+    except InvalidModel as e:
+        raise ValidationError(str(e), code='invalid_model')
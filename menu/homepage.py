@@ -0,0 +1,75 @@
+"""
+Precomputed homepage context.
+
+The featured items and latest reviews shown on the landing page are
+materialized into plain data once and kept in the cache under the versions
+of everything they were built from, so a homepage hit costs a single cache
+read until one of those models changes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import get_versions
+from .images import RenditionRegistry
+from .models import MenuItem, Review
+
+HOMEPAGE_KEY = 'menu:homepage:{}'
+
+# Versions bumped by the signals of the models the homepage is built from,
+# and by new renditions of its pictures
+HOMEPAGE_CONTEXT_RESOURCES = ('menu', 'ratings', 'reviews', 'branches', 'renditions')
+
+# A whole page render also embeds the restaurant info from the context processor
+HOMEPAGE_RESOURCES = HOMEPAGE_CONTEXT_RESOURCES + ('restaurant_info',)
+
+FEATURED_ITEMS = 3
+LATEST_REVIEWS = 6
+
+
+def build_homepage_context():
+    items = list(MenuItem.objects.filter(is_featured=True, is_available=True)[:FEATURED_ITEMS])
+    renditions = RenditionRegistry.load(item.image for item in items)
+    featured_items = [
+        {
+            'id': item.pk,
+            'name': item.name,
+            'description': item.description,
+            'price': item.price,
+            'image_url': item.image.url if item.image else None,
+            'picture': renditions.picture(item.image),
+            'has_video': bool(item.video),
+            'rating_avg': item.rating_avg,
+            'rating_count': item.rating_count,
+        }
+        for item in items
+    ]
+    renditions.queue_missing()
+    reviews = [
+        {
+            'customer_name': review.customer_name,
+            'rating': review.rating,
+            'comment': review.comment,
+            'category': review.category,
+            'created_at': review.created_at,
+            'menu_item_name': review.menu_item.name if review.menu_item else None,
+            'branch_name': review.branch.name if review.branch else None,
+        }
+        for review in Review.objects.filter(is_approved=True)
+        .select_related('menu_item', 'branch')
+        .order_by('-created_at')[:LATEST_REVIEWS]
+    ]
+    return {
+        'featured_items': featured_items,
+        'reviews': reviews,
+    }
+
+
+def get_homepage_context():
+    """Return the homepage context, rebuilding it after any relevant change"""
+    versions = '.'.join(str(version) for version in get_versions(HOMEPAGE_CONTEXT_RESOURCES))
+    key = HOMEPAGE_KEY.format(versions)
+    context = cache.get(key)
+    if context is None:
+        context = build_homepage_context()
+        cache.set(key, context, settings.RESPONSE_CACHE_TIMEOUT)
+    return context
@@ -0,0 +1,311 @@
+"""
+Resized copies of uploaded images.
+
+Renditions are WebP or JPEG copies of a stored image at one of
+RENDITION_WIDTHS, scaled down (never up) to that width, turned upright and
+saved without their EXIF block, which carries camera data and sometimes
+the GPS position of the phone that took the picture. They are written next
+to the media files under renditions/ and registered as ImageRendition rows
+keyed by (source, width, format), so pages and serializers find them with
+one query instead of touching the storage.
+
+The named sizes are made as soon as an image is uploaded or saved; the
+other widths, only offered in srcset and through ?image_size=, are made
+the first time a RenditionRegistry is asked for them. Until a variant
+exists the nearest existing one, or the original, stands in.
+
+Generating them is slow next to a request, so it runs after the upload or
+save has committed, on a thread pool of settings.IMAGE_PIPELINE_WORKERS
+threads (Pillow releases the GIL while decoding, resizing and encoding).
+With no workers configured it runs inline, which the tests rely on. New
+renditions bump the 'renditions' version, which only the cached pages
+showing pictures are keyed by. A source that can't be converted is marked
+as failed for FAILED_TIMEOUT, so the requests showing it don't queue it
+again each time.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+from .cache import bump_version
+from .models import ImageRendition
+
+# Target width in pixels of each named size, made on upload
+NAMED_WIDTHS = {
+    'thumbnail': 160,
+    'card': 480,
+    'hero': 1280,
+}
+
+# Every width a rendition can be made at, as offered in srcset
+RENDITION_WIDTHS = (160, 320, 480, 640, 960, 1280)
+
+# Preferred format first; JPEG is the fallback for clients without WebP
+RENDITION_FORMATS = ('webp', 'jpeg')
+
+EAGER_VARIANTS = tuple(
+    (width, image_format) for width in sorted(NAMED_WIDTHS.values()) for image_format in RENDITION_FORMATS
+)
+
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+# What a broken, missing or oversized image raises while being decoded
+UNREADABLE_IMAGE_ERRORS = (OSError, Image.DecompressionBombError)
+
+FAILED_KEY = 'renditions:failed:{}'
+
+# Seconds a source that failed to convert is left alone
+FAILED_TIMEOUT = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# (source, width, format) queued on the pool and not made yet
+_pending = set()
+
+
+def failed_key(source):
+    return FAILED_KEY.format(hashlib.sha256(source.encode()).hexdigest())
+
+
+def mark_failed(source):
+    cache.set(failed_key(source), True, FAILED_TIMEOUT)
+
+
+def rendition_name(source, width, image_format):
+    """Storage name of a rendition, e.g. renditions/menu_items/margherita-480w.webp"""
+    stem = os.path.splitext(source)[0]
+    return f'renditions/{stem}-{width}w.{image_format}'
+
+
+def open_upright(source):
+    """The stored image `source`, decoded and rotated as its EXIF orientation says"""
+    with default_storage.open(source) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    return image
+
+
+def encode(image, width, image_format):
+    """`image` scaled down to at most `width` pixels wide and encoded, without metadata"""
+    resized = image.copy()
+    resized.thumbnail((width, width * 10), Image.LANCZOS)
+    if image_format == 'jpeg' and resized.mode != 'RGB':
+        # JPEG has no alpha: flatten transparent PNGs onto white
+        background = Image.new('RGB', resized.size, 'white')
+        rgba = resized.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        resized = background
+    elif resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA' if 'A' in resized.getbands() else 'RGB')
+
+    buffer = BytesIO()
+    # Only the colour profile is carried over; EXIF and XMP are dropped
+    resized.save(buffer, icc_profile=image.info.get('icc_profile'), **SAVE_OPTIONS[image_format])
+    return resized.size, buffer.getvalue()
+
+
+def rendition_width(size):
+    """
+    The width to serve for a requested size: a named size, or pixels rounded
+    up to the next rendition width; None if it is neither
+    """
+    if size in NAMED_WIDTHS:
+        return NAMED_WIDTHS[size]
+    try:
+        pixels = int(size)
+    except (TypeError, ValueError):
+        return None
+    if pixels < 1:
+        return None
+    return next((width for width in RENDITION_WIDTHS if width >= pixels), RENDITION_WIDTHS[-1])
+
+
+def generate_renditions(source, variants=EAGER_VARIANTS):
+    """Create the (width, format) `variants` of the stored image `source` it lacks and return them"""
+    existing = set(ImageRendition.objects.filter(source=source).values_list('width', 'format'))
+    wanted = [variant for variant in variants if variant not in existing]
+    if not wanted:
+        return []
+
+    image = open_upright(source)
+    renditions = []
+    for width, image_format in wanted:
+        (actual_width, height), data = encode(image, width, image_format)
+        name = default_storage.save(rendition_name(source, width, image_format), ContentFile(data))
+        renditions.append(ImageRendition(
+            source=source, width=width, format=image_format, file=name,
+            actual_width=actual_width, height=height, file_size=len(data),
+        ))
+    ImageRendition.objects.bulk_create(renditions, ignore_conflicts=True)
+    # Cached pages embed rendition URLs
+    bump_version('renditions')
+    return renditions
+
+
+def run_in_worker(source, variants):
+    try:
+        return generate_renditions(source, variants)
+    except Exception:
+        # Nobody reads the Future
+        logger.exception('Renditions of %s failed', source)
+        mark_failed(source)
+        return []
+    finally:
+        # Worker threads keep their own connections; don't leave them open between jobs
+        close_old_connections()
+        with _executor_lock:
+            _pending.difference_update((source, width, image_format) for width, image_format in variants)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PIPELINE_WORKERS, thread_name_prefix='renditions'
+            )
+        return _executor
+
+
+def schedule_renditions(source, variants=EAGER_VARIANTS):
+    """
+    Generate the `variants` of `source` on the pipeline's threads, unless
+    they are already queued; returns the Future (None if there was nothing
+    to queue, or `source` failed lately), or the renditions themselves when
+    running inline
+    """
+    if cache.get(failed_key(source)):
+        return None
+    if not settings.IMAGE_PIPELINE_WORKERS:
+        try:
+            return generate_renditions(source, variants)
+        except UNREADABLE_IMAGE_ERRORS:
+            # Not worth failing the request over; the original is served instead
+            mark_failed(source)
+            return []
+    executor = get_executor()
+    with _executor_lock:
+        variants = [
+            (width, image_format) for width, image_format in variants
+            if (source, width, image_format) not in _pending
+        ]
+        if not variants:
+            return None
+        _pending.update((source, width, image_format) for width, image_format in variants)
+    return executor.submit(run_in_worker, source, variants)
+
+
+def image_sources(images):
+    """Storage names of the set ones among image field values"""
+    return {image.name for image in images if image}
+
+
+class RenditionRegistry:
+    """
+    The renditions of a batch of images by (source, width, format), loaded
+    with one query. Variants asked for that do not exist yet are collected
+    and handed to the pipeline by queue_missing(), once the response is built.
+    """
+
+    def __init__(self, renditions=()):
+        self.by_source = {}
+        self.missing = {}
+        for rendition in renditions:
+            self.by_source.setdefault(rendition.source, {})[rendition.width, rendition.format] = rendition
+
+    @classmethod
+    def load(cls, images):
+        sources = image_sources(images)
+        return cls(ImageRendition.objects.filter(source__in=sources) if sources else ())
+
+    @classmethod
+    async def aload(cls, images):
+        """load() with the async ORM"""
+        sources = image_sources(images)
+        if not sources:
+            return cls()
+        return cls([rendition async for rendition in ImageRendition.objects.filter(source__in=sources)])
+
+    def variants(self, source, image_format):
+        """Existing renditions of `source` in `image_format`, narrowest first"""
+        renditions = self.by_source.get(source, {})
+        return sorted(
+            (rendition for (width, rendition_format), rendition in renditions.items() if rendition_format == image_format),
+            key=lambda rendition: rendition.width
+        )
+
+    def want(self, source, widths, image_format):
+        """Note the variants of `source` that are missing, skipping widths past the original's"""
+        existing = self.variants(source, image_format)
+        # A rendition narrower than its width has the original's width
+        full_width = next(
+            (rendition.actual_width for rendition in existing if rendition.actual_width < rendition.width), None
+        )
+        for width in widths:
+            if full_width is not None and width > full_width:
+                continue
+            if not any(rendition.width == width for rendition in existing):
+                self.missing.setdefault(source, set()).add((width, image_format))
+
+    def get(self, image, width, image_format=RENDITION_FORMATS[0]):
+        """The narrowest rendition at least `width` wide, else the widest one; None if there is none"""
+        if not image:
+            return None
+        self.want(image.name, [width], image_format)
+        existing = self.variants(image.name, image_format)
+        for rendition in existing:
+            if rendition.width >= width:
+                return rendition
+        return existing[-1] if existing else None
+
+    def url(self, image, width, image_format=RENDITION_FORMATS[0]):
+        """URL of get(), or of the original image until a rendition exists"""
+        if not image:
+            return None
+        rendition = self.get(image, width, image_format)
+        return rendition.file.url if rendition else image.url
+
+    def srcset(self, image, image_format=RENDITION_FORMATS[0], build_url=None):
+        """srcset value listing the renditions of `image` in `image_format`, '' if there are none"""
+        if not image:
+            return ''
+        self.want(image.name, RENDITION_WIDTHS, image_format)
+        candidates, seen = [], set()
+        for rendition in self.variants(image.name, image_format):
+            if rendition.actual_width not in seen:
+                seen.add(rendition.actual_width)
+                url = rendition.file.url
+                candidates.append(f'{build_url(url) if build_url else url} {rendition.actual_width}w')
+        return ', '.join(candidates)
+
+    def picture(self, image):
+        """Plain data for the picture template tag, which can be cached"""
+        if not image:
+            return None
+        return {
+            'src': self.url(image, NAMED_WIDTHS['card'], 'jpeg'),
+            'srcset': {image_format: self.srcset(image, image_format) for image_format in RENDITION_FORMATS},
+        }
+
+    def queue_missing(self):
+        """Hand the variants asked for but missing to the pipeline"""
+        missing, self.missing = self.missing, {}
+        for source, variants in missing.items():
+            schedule_renditions(source, sorted(variants))
@@ -0,0 +1,161 @@
+"""
+Kitchen queue scheduling.
+
+Open orders are planned one after the other, orders already in
+preparation first and then oldest first, over the kitchen stations that
+each prepare settings.KITCHEN_STATION_CAPACITY dishes at a time. Every
+station is a heap of (free_at, slot): the dishes of an order take the
+earliest free slots, longest first, which gives the time its last dish is
+done. The dishes of each slot are then pushed back to end exactly then,
+so the pizzas, pasta and salads of one order come out together instead of
+the first ones going cold while the last are still baking.
+
+The plan feeds the kitchen screens and the times shown to customers. It
+is cached under a version bumped by every committed order change, and
+rebuilt at least every SCHEDULE_TIMEOUT seconds as the clock moves on.
+"""
+import heapq
+from datetime import timedelta
+from math import ceil
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache import get_version
+from .models import Category, Order
+
+SCHEDULE_KEY = 'menu:kitchen:{}'
+SCHEDULE_TIMEOUT = 30
+
+OPEN_STATUSES = ('confirmed', 'preparing')
+
+
+def station_heaps(now):
+    capacity = settings.KITCHEN_STATION_CAPACITY
+    return {
+        station: [(now, slot) for slot in range(max(1, capacity.get(station, 1)))]
+        for station, label in Category.KITCHEN_STATIONS
+    }
+
+
+def order_dishes(order, now):
+    """(station, minutes left, line) of every dish still to prepare for an order, longest first"""
+    # An order in preparation is taken to have started when its status last changed
+    elapsed = (now - order.updated_at).total_seconds() / 60 if order.status == 'preparing' else 0
+    dishes = []
+    for line in order.lines.all():
+        minutes = line.preparation_time - elapsed
+        if minutes > 0:
+            dishes.extend([(line.station, minutes, line)] * line.quantity)
+    dishes.sort(key=lambda dish: -dish[1])
+    return dishes
+
+
+def schedule_order(heaps, dishes, now):
+    """
+    Place the dishes of one order on the station heaps and return its ready
+    time with the planned (line, station, start, finish) of every dish
+    """
+    chains = {}
+    for station, minutes, line in dishes:
+        free_at, slot = heapq.heappop(heaps[station])
+        finish = free_at + timedelta(minutes=minutes)
+        chains.setdefault((station, slot), []).append((line, station, free_at, finish))
+        heapq.heappush(heaps[station], (finish, slot))
+    if not chains:
+        return now, []
+
+    ready_at = max(chain[-1][3] for chain in chains.values())
+    planned = []
+    for chain in chains.values():
+        # Start the dishes of the slot late enough for its last one to finish at ready_at
+        shift = ready_at - chain[-1][3]
+        planned.extend((line, station, start + shift, finish + shift) for line, station, start, finish in chain)
+    for station in {station for station, slot in chains}:
+        heaps[station] = [
+            (ready_at if (station, slot) in chains else free_at, slot) for free_at, slot in heaps[station]
+        ]
+        heapq.heapify(heaps[station])
+    return ready_at, planned
+
+
+def build_schedule(now=None):
+    """Plan every open order, as plain data that can be cached"""
+    now = now or timezone.now()
+    orders = sorted(
+        Order.objects.filter(status__in=OPEN_STATUSES).prefetch_related('lines'),
+        key=lambda order: (order.status != 'preparing', order.created_at, order.pk)
+    )
+    heaps = station_heaps(now)
+    schedule = {'generated_at': now, 'orders': {}, 'stations': {station: [] for station in heaps}}
+
+    for order in orders:
+        ready_at, planned = schedule_order(heaps, order_dishes(order, now), now)
+        schedule['orders'][order.order_number] = {
+            'order_number': order.order_number,
+            'status': order.status,
+            'order_type': order.order_type,
+            'created_at': order.created_at,
+            'ready_at': ready_at,
+        }
+        # One ticket per line and start time, for the dishes started together
+        tickets = {}
+        for line, station, start, finish in planned:
+            ticket = tickets.setdefault((line.pk, start), {
+                'order_number': order.order_number,
+                'station': station,
+                'name': line.name,
+                'customizations': [customization['name'] for customization in line.customizations],
+                'quantity': 0,
+                'start_at': start,
+                'ready_at': finish,
+            })
+            ticket['quantity'] += 1
+        for ticket in tickets.values():
+            schedule['stations'][ticket['station']].append(ticket)
+
+    for tickets in schedule['stations'].values():
+        tickets.sort(key=lambda ticket: ticket['start_at'])
+    return schedule
+
+
+def get_schedule(refresh=False):
+    key = SCHEDULE_KEY.format(get_version('kitchen'))
+    schedule = None if refresh else cache.get(key)
+    if schedule is None:
+        schedule = build_schedule()
+        cache.set(key, schedule, SCHEDULE_TIMEOUT)
+    return schedule
+
+
+def estimated_arrival(order, schedule=None):
+    """
+    When an order should be ready for pickup, or at the door for a delivery;
+    None once it is delivered or cancelled
+    """
+    now = timezone.now()
+    travel = timedelta(minutes=settings.DELIVERY_MINUTES if order.order_type == 'delivery' else 0)
+    if order.status in OPEN_STATUSES:
+        planned = (schedule or get_schedule())['orders'].get(order.order_number)
+        if planned is None:
+            # Placed after the cached plan was made, and the version bump is still pending
+            planned = get_schedule(refresh=True)['orders'].get(order.order_number)
+        ready_at = planned['ready_at'] if planned else now
+        return max(ready_at, now) + travel
+    if order.status == 'ready':
+        return now + travel
+    if order.status == 'out_for_delivery':
+        return max(order.updated_at + travel, now)
+    return None
+
+
+def estimated_time(order, schedule=None):
+    """The estimate shown to customers, e.g. 'About 25 minutes'"""
+    arrival = estimated_arrival(order, schedule)
+    if arrival is None:
+        return ''
+    minutes = ceil((arrival - timezone.now()).total_seconds() / 60)
+    if minutes <= 1:
+        return 'Ready now' if order.order_type == 'pickup' else 'Any minute now'
+    return f'About {minutes} minutes'
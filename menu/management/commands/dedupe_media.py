@@ -0,0 +1,143 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+from menu import media
+from menu.bulk import bump_model_versions
+from menu.models import ImageRendition, MediaFile, ModelVariant
+from menu.signals import CACHE_VERSIONS
+
+
+def walk(path):
+    """Names of every stored file under `path`"""
+    try:
+        directories, files = default_storage.listdir(path)
+    except FileNotFoundError:
+        return
+    for directory in directories:
+        yield from walk(f'{path}{directory}/')
+    for file in files:
+        yield f'{path}{file}'
+
+
+def move_copies(model, kind_fields, others, canonical):
+    """
+    Point the renditions (or model variants) of the files `others` at
+    `canonical`; those of a kind it has already are deleted, with their
+    files once no row uses them
+    """
+    taken = set(model.objects.filter(source=canonical).values_list(*kind_fields))
+    dropped = []
+    for copy in model.objects.filter(source__in=others).order_by('source', 'pk'):
+        kind = tuple(getattr(copy, field) for field in kind_fields)
+        if kind in taken:
+            dropped.append(copy)
+        else:
+            taken.add(kind)
+            model.objects.filter(pk=copy.pk).update(source=canonical)
+    model.objects.filter(pk__in=[copy.pk for copy in dropped]).delete()
+    names = {copy.file.name for copy in dropped}
+    for name in names - set(model.objects.filter(file__in=names).values_list('file', flat=True)):
+        default_storage.delete(name)
+
+
+def detect_format(name):
+    try:
+        with default_storage.open(name) as file:
+            return Image.open(file).format
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Store every category, menu item and ingredient image once under its content hash, '
+        'point the rows and renditions using duplicates at that copy and recount the media references'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the duplicates',
+        )
+        parser.add_argument(
+            '--delete-orphans',
+            action='store_true',
+            help='Also delete the stored files no row uses',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        # Only the images MediaFile.ref_count counts; videos, 3D models and
+        # the other uploads keep their names
+        prefixes = media.reference_prefixes()
+        groups = {}
+        for name in sorted({name for prefix in prefixes for name in walk(prefix)}):
+            with default_storage.open(name) as file:
+                groups.setdefault(media.content_hash(file), []).append(name)
+
+        fields = media.file_fields()
+        duplicates = saved_bytes = 0
+        repointed = set()
+        for sha256, names in groups.items():
+            names.sort()
+            existing = MediaFile.objects.filter(sha256=sha256).first()
+            if existing is not None and existing.file.name in names:
+                canonical = existing.file.name
+            else:
+                canonical = media.content_name(sha256, media.extension_for(detect_format(names[0]), names[0]))
+            size = default_storage.size(names[0])
+            duplicates += len(names) - 1
+            saved_bytes += size * (len(names) - 1)
+            if dry_run:
+                if len(names) > 1:
+                    self.stdout.write(f"{', '.join(names)} -> {canonical}")
+                continue
+
+            if canonical not in names:
+                with default_storage.open(names[0]) as file:
+                    default_storage.save(canonical, file)
+            MediaFile.objects.update_or_create(sha256=sha256, defaults={
+                'file': canonical,
+                'size': size,
+                'uploaded_at': existing.uploaded_at if existing else default_storage.get_modified_time(names[0]),
+            })
+
+            others = [name for name in names if name != canonical]
+            if not others:
+                continue
+            for model, field in fields:
+                rows = model._default_manager.filter(**{f'{field}__in': others})
+                changes = {field: canonical}
+                if any(model_field.name == 'updated_at' for model_field in model._meta.fields):
+                    # Re-sent by the sync feed with the new URL
+                    changes['updated_at'] = timezone.now()
+                if rows.update(**changes):
+                    repointed.add(model)
+            move_copies(ImageRendition, ('width', 'format'), others, canonical)
+            # No post_save fires on the repointed rows to convert the moved file again
+            move_copies(ModelVariant, ('kind',), others, canonical)
+            for name in others:
+                default_storage.delete(name)
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ {duplicates} duplicate files in {len(groups)} distinct ones, {saved_bytes} bytes to save"
+            ))
+            return
+
+        for model in repointed:
+            if model in CACHE_VERSIONS:
+                bump_model_versions(model)
+        recounted = media.recount_references()
+        collected = 0
+        if options['delete_orphans']:
+            for name in MediaFile.objects.filter(ref_count=0).values_list('file', flat=True):
+                if name.startswith(tuple(prefixes)):
+                    collected += media.collect_orphan(name)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Removed {duplicates} duplicate files ({saved_bytes} bytes), "
+            f"recounted {len(recounted)} references, deleted {collected} unused files"
+        ))
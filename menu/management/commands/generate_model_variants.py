@@ -0,0 +1,52 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from menu import gltf
+from menu.model_variants import generate_model_variants
+from menu.models import MenuItem, ModelVariant
+
+
+class Command(BaseCommand):
+    help = 'Convert the 3D models of menu items into their full and preview GLB variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Convert models that already have variants again',
+        )
+        parser.add_argument(
+            '--item',
+            type=int,
+            action='append',
+            dest='items',
+            help='Only this menu item id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        items = MenuItem.objects.exclude(model_3d='').exclude(model_3d=None)
+        if options['items']:
+            items = items.filter(pk__in=options['items'])
+        sources = set(items.values_list('model_3d', flat=True))
+
+        done = failed = 0
+        for source in sorted(sources):
+            if options['overwrite']:
+                variants = ModelVariant.objects.filter(source=source)
+                for name in set(variants.values_list('file', flat=True)):
+                    default_storage.delete(name)
+                variants.delete()
+            try:
+                variants = generate_model_variants(source)
+            except (OSError, gltf.InvalidModel) as e:
+                failed += 1
+                self.stderr.write(f'✗ {source}: {e}')
+                continue
+            if variants:
+                done += 1
+                self.stdout.write(f'✓ {source}: ' + ', '.join(
+                    f'{variant.kind} {variant.vertex_count} vertices, {variant.file_size} bytes'
+                    for variant in variants
+                ))
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Converted {done} 3D models, {failed} failed'))
@@ -0,0 +1,108 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from menu.models import MenuItem
+
+# Poster: one frame a second in (past fade-ins), at most 1280 px wide
+POSTER_ARGS = ['-ss', '1', '-frames:v', '1', '-vf', "scale='min(1280,iw)':-2", '-q:v', '3']
+
+# Preview: at most 480 px high H.264 at a capped bitrate, with the index at
+# the start of the file so playback and seeking start before the download ends
+PREVIEW_ARGS = [
+    '-vf', "scale=-2:'min(480,ih)'",
+    '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28', '-maxrate', '800k', '-bufsize', '1600k',
+    '-c:a', 'aac', '-b:a', '96k',
+    '-movflags', '+faststart',
+]
+
+
+@contextmanager
+def local_path(name):
+    """A local path to the stored file `name`, copied to a temporary file for remote storages"""
+    try:
+        yield default_storage.path(name)
+        return
+    except NotImplementedError:
+        pass
+    suffix = os.path.splitext(name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as copy, default_storage.open(name) as file:
+        shutil.copyfileobj(file, copy)
+        copy.flush()
+        yield copy.name
+
+
+class Command(BaseCommand):
+    help = 'Generate video posters and lower-bitrate previews with ffmpeg for menu items missing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Regenerate posters and previews that already exist',
+        )
+        parser.add_argument(
+            '--item',
+            type=int,
+            action='append',
+            dest='items',
+            help='Only this menu item id (repeatable)',
+        )
+
+    def ffmpeg(self, source, args, output):
+        result = subprocess.run(
+            [self.binary, '-nostdin', '-loglevel', 'error', '-y', '-i', source, *args, output],
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip() or f'ffmpeg exited with {result.returncode}')
+
+    def handle(self, *args, **options):
+        self.binary = shutil.which(settings.FFMPEG_BINARY)
+        if self.binary is None:
+            raise CommandError(f'{settings.FFMPEG_BINARY} not found; install ffmpeg or set FFMPEG_BINARY')
+
+        items = MenuItem.objects.exclude(video='').exclude(video=None)
+        if options['items']:
+            items = items.filter(pk__in=options['items'])
+        if not options['overwrite']:
+            items = items.filter(
+                Q(video_thumbnail='') | Q(video_thumbnail=None) | Q(video_preview='') | Q(video_preview=None)
+            )
+
+        done = failed = 0
+        for item in items:
+            stem = os.path.splitext(os.path.basename(item.video.name))[0]
+            fields = []
+            try:
+                with local_path(item.video.name) as source, tempfile.TemporaryDirectory() as workdir:
+                    if options['overwrite'] or not item.video_thumbnail:
+                        poster = os.path.join(workdir, f'{stem}-poster.jpg')
+                        self.ffmpeg(source, POSTER_ARGS, poster)
+                        with open(poster, 'rb') as file:
+                            item.video_thumbnail.save(os.path.basename(poster), File(file), save=False)
+                        fields.append('video_thumbnail')
+                    if options['overwrite'] or not item.video_preview:
+                        preview = os.path.join(workdir, f'{stem}-preview.mp4')
+                        self.ffmpeg(source, PREVIEW_ARGS, preview)
+                        with open(preview, 'rb') as file:
+                            item.video_preview.save(os.path.basename(preview), File(file), save=False)
+                        fields.append('video_preview')
+            except (CommandError, OSError) as e:
+                failed += 1
+                self.stderr.write(f'✗ {item.name}: {e}')
+                continue
+            # A regular save, so caches, the sync feed and renditions follow
+            item.save(update_fields=fields + ['updated_at'])
+            done += 1
+            self.stdout.write(f"✓ {item.name}: {', '.join(fields)}")
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Processed {done} menu items, {failed} failed'))
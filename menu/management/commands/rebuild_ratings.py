@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from menu.models import MenuItem, Branch
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored rating aggregates of menu items and branches from approved reviews'
+
+    def handle(self, *args, **options):
+        for model in (MenuItem, Branch):
+            updated = model.rebuild_rating_aggregates()
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ Rebuilt ratings for {updated} {model._meta.verbose_name_plural}"
+            ))
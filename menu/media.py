@@ -0,0 +1,158 @@
+"""
+Content-addressed storage for uploaded images.
+
+An upload is hashed chunk by chunk as it is read from Django's upload
+buffer and stored as uploads/<2 hex>/<sha256><ext>, with a MediaFile row
+as the lookup table: the same photo uploaded again gets the URL of the
+copy already stored instead of a new file.
+
+MediaFile.ref_count counts the category, menu item and ingredient images
+pointing at each file. The model signals keep it up to date from the image
+a row was loaded with, and once an image is replaced or its row deleted,
+a file no longer used anywhere is deleted with its renditions after the
+transaction commits. Files uploaded within ORPHAN_GRACE are kept even
+then, as a client may have just received their URL without saving it on
+a row yet; the dedupe_media command collects those later.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Category, ImageRendition, Ingredient, MediaFile, MenuItem, ModelVariant
+
+UPLOAD_PREFIX = 'uploads'
+
+ORPHAN_GRACE = timedelta(minutes=10)
+
+# Image fields counted in MediaFile.ref_count
+REFERENCE_MODELS = (Category, MenuItem, Ingredient)
+
+# Extensions of the image formats Pillow identifies, so equal content gets one name
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+    'GIF': '.gif',
+}
+
+
+def content_hash(file):
+    """sha256 hex digest of a Django File, read chunk by chunk"""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_name(sha256, extension):
+    """Storage name of a content-addressed file, e.g. uploads/3f/3f9c...e1.jpg"""
+    return f'{UPLOAD_PREFIX}/{sha256[:2]}/{sha256}{extension.lower()}'
+
+
+def store_file(file, extension):
+    """
+    Store `file` under its content hash unless that content is stored
+    already; return its MediaFile and whether the file was written
+    """
+    sha256 = content_hash(file)
+    existing = MediaFile.objects.filter(sha256=sha256).first()
+    name = existing.file.name if existing else content_name(sha256, extension)
+    stored = default_storage.exists(name)
+    if not stored:
+        file.seek(0)
+        saved = default_storage.save(name, file)
+        if saved != name:
+            # A concurrent upload of the same content got there first
+            default_storage.delete(saved)
+    media_file, _ = MediaFile.objects.update_or_create(
+        sha256=sha256, defaults={'file': name, 'size': file.size, 'uploaded_at': timezone.now()}
+    )
+    return media_file, not stored
+
+
+def file_fields():
+    """(model, field name) of every file field in the app, but the renditions' and model variants'"""
+    return [
+        (model, field.name)
+        for model in apps.get_app_config('menu').get_models()
+        if model not in (ImageRendition, ModelVariant, MediaFile)
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField)
+    ]
+
+
+def reference_prefixes():
+    """Storage directories of the images counted in MediaFile.ref_count, e.g. 'menu_items/'"""
+    return [f'{UPLOAD_PREFIX}/'] + [model._meta.get_field('image').upload_to for model in REFERENCE_MODELS]
+
+
+def is_referenced(name):
+    """Whether any file field, counted or not, still points at `name`"""
+    return any(model._default_manager.filter(**{field: name}).exists() for model, field in file_fields())
+
+
+def collect_orphan(name):
+    """Delete the stored file `name` with its renditions if it is registered and unused; return whether it was"""
+    with transaction.atomic():
+        media_file = MediaFile.objects.select_for_update().filter(
+            file=name, ref_count=0, uploaded_at__lt=timezone.now() - ORPHAN_GRACE
+        ).first()
+        if media_file is None or is_referenced(name):
+            return False
+        renditions = list(ImageRendition.objects.filter(source=name).values_list('file', flat=True))
+        ImageRendition.objects.filter(source=name).delete()
+        media_file.delete()
+    for stored_name in [name] + renditions:
+        default_storage.delete(stored_name)
+    return True
+
+
+def retain(name):
+    if name:
+        MediaFile.objects.filter(file=name).update(ref_count=F('ref_count') + 1)
+
+
+def release(name):
+    if name and MediaFile.objects.filter(file=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1):
+        transaction.on_commit(lambda: collect_orphan(name))
+
+
+def update_references(instance, deleted=False):
+    """Move a reference from the image `instance` was loaded with to its current one"""
+    loaded = getattr(instance, '_loaded_image', None)
+    if loaded is models.DEFERRED:
+        # Not loaded, so not part of this save
+        return
+    current = None if deleted else instance.image.name
+    if (loaded or None) == (current or None):
+        return
+    retain(current)
+    release(loaded)
+    instance._loaded_image = current
+
+
+def recount_references():
+    """Recompute every MediaFile.ref_count from the image fields; return the rows changed"""
+    counts = {}
+    for model in REFERENCE_MODELS:
+        for name in model._default_manager.exclude(image='').exclude(image=None).values_list('image', flat=True):
+            counts[name] = counts.get(name, 0) + 1
+    changed = []
+    for media_file in MediaFile.objects.all():
+        count = counts.get(media_file.file.name, 0)
+        if media_file.ref_count != count:
+            media_file.ref_count = count
+            changed.append(media_file)
+    MediaFile.objects.bulk_update(changed, ['ref_count'], batch_size=500)
+    return changed
+
+
+def extension_for(image_format, filename):
+    """File extension for an image of a format identified by Pillow, else the uploaded name's"""
+    return FORMAT_EXTENSIONS.get(image_format) or os.path.splitext(filename)[1].lower()
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Review = apps.get_model('menu', 'Review')
+    for model_name, field in (('MenuItem', 'menu_item'), ('Branch', 'branch')):
+        model = apps.get_model('menu', model_name)
+        totals = (
+            Review.objects.filter(is_approved=True, **{f'{field}__isnull': False})
+            .order_by().values(field).annotate(total=Sum('rating'), count=Count('pk'))
+        )
+        for row in totals:
+            model.objects.filter(pk=row[field]).update(
+                rating_sum=row['total'],
+                rating_count=row['count'],
+                rating_avg=row['total'] / row['count'],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0003_branch_review_category_alter_review_menu_item_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='rating_avg',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_avg',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
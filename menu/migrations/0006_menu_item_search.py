@@ -0,0 +1,85 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:20
+
+from django.db import migrations
+
+# Keep in sync with menu.search.SEARCH_CONFIGS
+POSTGRES_SEARCH_CONFIGS = ['english', 'german', 'french', 'italian', 'spanish', 'arabic', 'simple']
+
+SQLITE_FTS_TABLE = 'menu_menuitem_fts'
+
+SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5(
+        name, description, category_name,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )""",
+    f"""INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, description, category_name)
+        SELECT item.id, item.name, item.description, category.name
+        FROM menu_menuitem AS item JOIN menu_category AS category ON category.id = item.category_id""",
+    f"""CREATE TRIGGER {SQLITE_FTS_TABLE}_ai AFTER INSERT ON menu_menuitem BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, description, category_name)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM menu_category WHERE id = new.category_id));
+    END""",
+    f"""CREATE TRIGGER {SQLITE_FTS_TABLE}_au AFTER UPDATE OF name, description, category_id ON menu_menuitem BEGIN
+        UPDATE {SQLITE_FTS_TABLE}
+        SET name = new.name, description = new.description,
+            category_name = (SELECT name FROM menu_category WHERE id = new.category_id)
+        WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER {SQLITE_FTS_TABLE}_ad AFTER DELETE ON menu_menuitem BEGIN
+        DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER {SQLITE_FTS_TABLE}_category_au AFTER UPDATE OF name ON menu_category BEGIN
+        UPDATE {SQLITE_FTS_TABLE} SET category_name = new.name
+        WHERE rowid IN (SELECT id FROM menu_menuitem WHERE category_id = new.id);
+    END""",
+]
+
+SQLITE_DROP = [
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_category_au',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_au',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ai',
+    f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}',
+]
+
+
+def sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for config in POSTGRES_SEARCH_CONFIGS:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS menu_menuitem_search_{config} ON menu_menuitem "
+                f"USING GIN (to_tsvector('{config}'::regconfig, "
+                f"COALESCE(name, '') || ' ' || COALESCE(description, '')))"
+            )
+    elif vendor == 'sqlite' and sqlite_has_fts5(schema_editor):
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for config in POSTGRES_SEARCH_CONFIGS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS menu_menuitem_search_{config}')
+    elif vendor == 'sqlite':
+        for statement in SQLITE_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0005_sync_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:05
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# SQLite adds the column by rebuilding menu_category, which the full-text
+# search triggers of 0006 reference, so they are dropped meanwhile
+search_migration = import_module('menu.migrations.0006_menu_item_search')
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in search_migration.SQLITE_DROP:
+            if 'TRIGGER' in statement:
+                schema_editor.execute(statement)
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite' and search_migration.sqlite_has_fts5(schema_editor):
+        for statement in search_migration.SQLITE_CREATE:
+            if 'CREATE TRIGGER' in statement:
+                schema_editor.execute(statement)
+
+
+def assign_kitchen_stations(apps, schema_editor):
+    # Best guess from the category names; everything else stays on the cold station
+    Category = apps.get_model('menu', 'Category')
+    for keyword, station in (('pizza', 'oven'), ('pasta', 'pasta')):
+        Category.objects.filter(name__icontains=keyword).update(kitchen_station=station)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0008_orders'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, create_search_triggers),
+        migrations.AddField(
+            model_name='category',
+            name='kitchen_station',
+            field=models.CharField(choices=[('oven', 'Oven'), ('pasta', 'Pasta'), ('cold', 'Cold')], default='cold', help_text='Kitchen station that prepares the items of this category', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='orderline',
+            name='preparation_time',
+            field=models.PositiveIntegerField(default=10, help_text='Preparation time of one dish in minutes'),
+        ),
+        migrations.AddField(
+            model_name='orderline',
+            name='station',
+            field=models.CharField(choices=[('oven', 'Oven'), ('pasta', 'Pasta'), ('cold', 'Cold')], default='cold', max_length=10),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+        migrations.RunPython(assign_kitchen_stations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:40
+
+from django.db import migrations
+
+# Keep in sync with menu.reorder.ORDER_GAP
+ORDER_GAP = 1024
+
+
+def spread_orders(apps, schema_editor):
+    """Space the current display orders ORDER_GAP apart, keeping the sequence"""
+    Category = apps.get_model('menu', 'Category')
+    MenuItem = apps.get_model('menu', 'MenuItem')
+
+    categories = list(Category.objects.order_by('order', 'name', 'pk'))
+    for position, category in enumerate(categories, start=1):
+        category.order = position * ORDER_GAP
+    Category.objects.bulk_update(categories, ['order'])
+
+    items = list(MenuItem.objects.order_by('category_id', 'order', 'name', 'pk'))
+    position, category_id = 0, None
+    for item in items:
+        position = position + 1 if item.category_id == category_id else 1
+        category_id = item.category_id
+        item.order = position * ORDER_GAP
+    MenuItem.objects.bulk_update(items, ['order'], batch_size=500)
+
+
+def compact_orders(apps, schema_editor):
+    for model_name in ('Category', 'MenuItem'):
+        model = apps.get_model('menu', model_name)
+        rows = list(model.objects.all())
+        for row in rows:
+            row.order //= ORDER_GAP
+        model.objects.bulk_update(rows, ['order'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0009_kitchen_stations'),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_orders, compact_orders),
+    ]
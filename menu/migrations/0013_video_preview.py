@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0012_media_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='video_preview',
+            field=models.FileField(blank=True, help_text='Lower-bitrate copy of the video for mobile', null=True, upload_to='menu_videos/previews/'),
+        ),
+    ]
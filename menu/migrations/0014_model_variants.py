@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:10
+
+from django.db import migrations, models
+import menu.gltf
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0013_video_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Storage name of the uploaded model', max_length=255)),
+                ('kind', models.CharField(choices=[('preview', 'Preview'), ('full', 'Full')], max_length=7)),
+                ('file', models.FileField(max_length=255, upload_to='')),
+                ('vertex_count', models.PositiveIntegerField()),
+                ('triangle_count', models.PositiveIntegerField()),
+                ('file_size', models.PositiveIntegerField(help_text='Size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['source', 'kind'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='menuitem',
+            name='model_3d',
+            field=models.FileField(blank=True, help_text='3D model file (.glb, .gltf, .obj)', null=True, upload_to='menu_3d/', validators=[menu.gltf.validate_model_file]),
+        ),
+        migrations.AddConstraint(
+            model_name='modelvariant',
+            constraint=models.UniqueConstraint(fields=('source', 'kind'), name='unique_model_variant'),
+        ),
+    ]
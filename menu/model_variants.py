@@ -0,0 +1,140 @@
+"""
+Binary glTF variants of uploaded 3D models.
+
+Once a menu item is saved with a model_3d, the upload is converted into
+two GLB files registered as ModelVariant rows keyed by its storage name:
+
+- full: the whole model in one compact GLB (minified JSON, one binary
+  buffer with the geometry and textures),
+- preview: a copy simplified to about PREVIEW_VERTICES vertices, small
+  enough for the app to show at once while the full model downloads; the
+  full file stands in for models already that small or that gltf.simplify()
+  can't read.
+
+The conversion runs on the image pipeline's threads
+(settings.IMAGE_PIPELINE_WORKERS, inline with none), and the
+generate_model_variants command converts the models saved before. A
+model that fails to convert is marked as failed for FAILED_TIMEOUT, so
+later saves of its item don't queue it again.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+from . import gltf, images
+from .models import ModelVariant
+
+PREVIEW_VERTICES = 5000
+
+FAILED_KEY = 'model-variants:failed:{}'
+
+# Seconds a model that failed to convert is left alone
+FAILED_TIMEOUT = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+_pending_lock = threading.Lock()
+
+# Sources queued on the pool and not converted yet
+_pending = set()
+
+
+def failed_key(source):
+    return FAILED_KEY.format(hashlib.sha256(source.encode()).hexdigest())
+
+
+def mark_failed(source):
+    cache.set(failed_key(source), True, FAILED_TIMEOUT)
+
+
+def variant_name(source, kind):
+    """Storage name of a variant, e.g. renditions/menu_3d/pizza-preview.glb"""
+    stem = os.path.splitext(source)[0]
+    return f'renditions/{stem}-{kind}.glb'
+
+
+def save_variant(source, kind, document, binary):
+    data = gltf.to_glb(document, binary)
+    vertices, triangles = gltf.count_geometry(document)
+    name = default_storage.save(variant_name(source, kind), ContentFile(data))
+    return ModelVariant(
+        source=source, kind=kind, file=name,
+        vertex_count=vertices, triangle_count=triangles, file_size=len(data),
+    )
+
+
+def generate_model_variants(source):
+    """Convert the stored model `source` into its full and preview GLB unless done already; return the new variants"""
+    if ModelVariant.objects.filter(source=source).exists():
+        return []
+    with default_storage.open(source) as file:
+        data = file.read()
+    document, binary = gltf.read_model(data, os.path.splitext(source)[1].lower())
+
+    full = save_variant(source, 'full', document, binary)
+    simplified = None
+    if full.vertex_count > PREVIEW_VERTICES:
+        simplified = gltf.simplify(document, binary, PREVIEW_VERTICES)
+    if simplified is not None:
+        preview = save_variant(source, 'preview', *simplified)
+    else:
+        preview = ModelVariant(
+            source=source, kind='preview', file=full.file.name,
+            vertex_count=full.vertex_count, triangle_count=full.triangle_count, file_size=full.file_size,
+        )
+    variants = [preview, full]
+    # Only the menu item detail, which isn't cached, shows the variants
+    ModelVariant.objects.bulk_create(variants, ignore_conflicts=True)
+    return variants
+
+
+def run_in_worker(source):
+    try:
+        return generate_model_variants(source)
+    except Exception:
+        # Nobody reads the Future
+        logger.exception('3D model variants of %s failed', source)
+        mark_failed(source)
+        return []
+    finally:
+        close_old_connections()
+        with _pending_lock:
+            _pending.discard(source)
+
+
+def schedule_model_variants(source):
+    """
+    Convert `source` on the image pipeline's threads unless it is already
+    queued or failed lately; returns the Future (None if it wasn't queued),
+    or the variants themselves when running inline
+    """
+    if cache.get(failed_key(source)):
+        return None
+    if not settings.IMAGE_PIPELINE_WORKERS:
+        try:
+            return generate_model_variants(source)
+        except (OSError, gltf.InvalidModel):
+            # Not worth failing the save over; the uploaded file is served instead
+            mark_failed(source)
+            return []
+    with _pending_lock:
+        if source in _pending:
+            return None
+        _pending.add(source)
+    return images.get_executor().submit(run_in_worker, source)
+
+
+def variants_for(source):
+    """{kind: ModelVariant} of a stored model, empty until it is converted"""
+    return {variant.kind: variant for variant in ModelVariant.objects.filter(source=source)}
+
+
+async def avariants_for(source):
+    return {variant.kind: variant async for variant in ModelVariant.objects.filter(source=source)}
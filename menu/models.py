@@ -1,16 +1,94 @@
-from django.db import models
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Avg, Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
+from .cache import bump_versions_on_commit, get_version
+from .gltf import validate_model_file
 
-class Category(models.Model):
+
+class RatingAggregateModel(models.Model):
+    """Stored aggregates of approved reviews, maintained incrementally by the Review signals"""
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def apply_rating_delta(cls, pk, rating_delta, count_delta):
+        """Shift the stored aggregates of a single row in one UPDATE"""
+        if pk is None or (not rating_delta and not count_delta):
+            return
+        new_sum = F('rating_sum') + rating_delta
+        new_count = F('rating_count') + count_delta
+        cls.objects.filter(pk=pk).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_avg=Case(
+                When(rating_count__lte=-count_delta, then=Value(None)),
+                default=Cast(new_sum, models.FloatField()) / new_count,
+                output_field=models.FloatField(),
+            ),
+        )
+
+    @classmethod
+    def rebuild_rating_aggregates(cls):
+        """Recompute the stored aggregates of every row from the reviews table"""
+        relation = cls.reviews.field
+        approved = relation.model.objects.filter(
+            is_approved=True, **{relation.name: OuterRef('pk')}
+        ).order_by().values(relation.name)
+        return cls.objects.update(
+            rating_sum=Coalesce(Subquery(approved.annotate(total=Sum('rating')).values('total')), 0),
+            rating_count=Coalesce(Subquery(approved.annotate(total=Count('pk')).values('total')), 0),
+            rating_avg=Subquery(approved.annotate(average=Avg('rating')).values('average')),
+        )
+
+
+class LoadedImageMixin:
+    """Remembers the image a row was loaded with, for the media reference counts"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored name, or DEFERRED when the field was not loaded
+        instance._loaded_image = instance.__dict__.get('image', models.DEFERRED)
+        return instance
+
+
+class Category(LoadedImageMixin, models.Model):
     """Menu category (e.g., Appetizers, Main Courses, Desserts, Drinks)"""
+    KITCHEN_STATIONS = [
+        ('oven', 'Oven'),
+        ('pasta', 'Pasta'),
+        ('cold', 'Cold'),
+    ]
+
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
     order = models.IntegerField(default=0, help_text="Display order")
+    kitchen_station = models.CharField(
+        max_length=10, choices=KITCHEN_STATIONS, default='cold',
+        help_text="Kitchen station that prepares the items of this category"
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    translations = GenericRelation('Translation')
+
+    # Fields Translation rows may hold other languages of
+    translated_fields = ('name', 'description')
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -20,7 +98,7 @@ class Category(models.Model):
         return self.name
 
 
-class MenuItem(models.Model):
+class MenuItem(LoadedImageMixin, RatingAggregateModel):
     """Individual menu item"""
     SPICE_LEVELS = [
         ('none', 'Not Spicy'),
@@ -38,8 +116,12 @@ class MenuItem(models.Model):
     
     # Media fields for enhanced visualization
     video = models.FileField(upload_to='menu_videos/', blank=True, null=True, help_text="Video of the dish being prepared or presented")
-    model_3d = models.FileField(upload_to='menu_3d/', blank=True, null=True, help_text="3D model file (.glb, .gltf, .obj)")
+    model_3d = models.FileField(
+        upload_to='menu_3d/', blank=True, null=True, validators=[validate_model_file],
+        help_text="3D model file (.glb, .gltf, .obj)"
+    )
     video_thumbnail = models.ImageField(upload_to='menu_thumbnails/', blank=True, null=True, help_text="Thumbnail for video")
+    video_preview = models.FileField(upload_to='menu_videos/previews/', blank=True, null=True, help_text="Lower-bitrate copy of the video for mobile")
     
     # Additional details
     spice_level = models.CharField(max_length=20, choices=SPICE_LEVELS, default='none')
@@ -59,9 +141,16 @@ class MenuItem(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    translations = GenericRelation('Translation')
+
+    translated_fields = ('name', 'description')
 
     class Meta:
         ordering = ['category', 'order', 'name']
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='menuitem_created_id_idx'),
+        ]
         verbose_name = "Menu Item"
         verbose_name_plural = "Menu Items"
 
@@ -69,7 +158,7 @@ class MenuItem(models.Model):
         return f"{self.name} - {self.category.name}"
 
 
-class Ingredient(models.Model):
+class Ingredient(LoadedImageMixin, models.Model):
     """Ingredients for menu items"""
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
@@ -84,6 +173,10 @@ class Ingredient(models.Model):
     image = models.ImageField(upload_to='ingredients/', blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    translations = GenericRelation('Translation')
+
+    translated_fields = ('name', 'description')
 
     class Meta:
         ordering = ['name']
@@ -129,6 +222,7 @@ class Customization(models.Model):
     menu_items = models.ManyToManyField(MenuItem, related_name='customizations', blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['customization_type', 'name']
@@ -137,6 +231,53 @@ class Customization(models.Model):
         return f"{self.name} ({self.get_customization_type_display()})"
 
 
+# Review fields that decide how a review contributes to the stored rating aggregates
+RATING_STATE_FIELDS = ('is_approved', 'rating', 'menu_item_id', 'branch_id')
+
+
+def apply_review_rating_changes(changes):
+    """
+    Apply (rating_state, sign) pairs to the MenuItem/Branch aggregates,
+    merging the deltas so each affected row is updated at most once
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for state, sign in changes:
+        if not state or not state['is_approved']:
+            continue
+        for model, pk in ((MenuItem, state['menu_item_id']), (Branch, state['branch_id'])):
+            if pk is not None:
+                delta = deltas[(model, pk)]
+                delta[0] += sign * state['rating']
+                delta[1] += sign
+    changed = False
+    for (model, pk), (rating_delta, count_delta) in deltas.items():
+        if rating_delta or count_delta:
+            model.apply_rating_delta(pk, rating_delta, count_delta)
+            changed = True
+    if changed:
+        bump_versions_on_commit(['ratings'])
+
+
+class ReviewQuerySet(models.QuerySet):
+    def set_approved(self, approved):
+        """Bulk approve/reject while keeping the stored rating aggregates in sync"""
+        with transaction.atomic():
+            # Locked, so a concurrent call waits and then no longer sees them as changing
+            states = list(
+                self.exclude(is_approved=approved).select_for_update().values('pk', *RATING_STATE_FIELDS)
+            )
+            updated = self.model._default_manager.filter(
+                pk__in=[state['pk'] for state in states]
+            ).update(is_approved=approved)
+            sign = 1 if approved else -1
+            apply_review_rating_changes(
+                (dict(state, is_approved=True), sign) for state in states
+            )
+        if updated:
+            bump_versions_on_commit(['reviews'])
+        return updated
+
+
 class Review(models.Model):
     """Customer reviews with categories: branch, service, product, other"""
     REVIEW_CATEGORIES = [
@@ -155,8 +296,28 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_approved = models.BooleanField(default=False, help_text="Approve review to display publicly")
 
+    objects = ReviewQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination seeks on (created_at, id), per item/branch for their reviews actions
+            models.Index(fields=['is_approved', '-created_at', '-id'], name='review_approved_created_idx'),
+            models.Index(fields=['menu_item', '-created_at', '-id'], name='review_item_created_idx'),
+            models.Index(fields=['branch', '-created_at', '-id'], name='review_branch_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._rating_state = instance.get_rating_state()
+        return instance
+
+    def get_rating_state(self):
+        """Snapshot of the fields feeding the rating aggregates (None if any is deferred)"""
+        if any(field not in self.__dict__ for field in RATING_STATE_FIELDS):
+            return None
+        return {field: self.__dict__[field] for field in RATING_STATE_FIELDS}
 
     def __str__(self):
         if self.category == 'product' and self.menu_item:
@@ -166,7 +327,7 @@ class Review(models.Model):
         return f"{self.customer_name} - {self.get_category_display()} ({self.rating}★)"
 
 
-class Branch(models.Model):
+class Branch(RatingAggregateModel):
     """Restaurant branches/locations"""
     name = models.CharField(max_length=200)
     address = models.TextField()
@@ -194,6 +355,14 @@ class Branch(models.Model):
         return f"{self.name} - {self.city}"
 
 
+# Process-local (version, expiry, instance) copy of the RestaurantInfo singleton
+_restaurant_info_cache = None
+
+# Seconds the process copy is trusted while the version stays the same, in
+# case a change slipped past the version (e.g. a queryset update)
+RESTAURANT_INFO_CACHE_TTL = 300
+
+
 class RestaurantInfo(models.Model):
     """Restaurant information (singleton model)"""
     name = models.CharField(max_length=200)
@@ -229,3 +398,223 @@ class RestaurantInfo(models.Model):
         if not self.pk and RestaurantInfo.objects.exists():
             raise ValueError("Only one RestaurantInfo instance is allowed")
         return super().save(*args, **kwargs)
+
+    @classmethod
+    def get_solo(cls):
+        """
+        Return the restaurant info (None if not configured yet). The instance
+        is shared by the whole process and must be treated as read-only; it is
+        reloaded once any worker bumps the 'restaurant_info' version, and at
+        least every RESTAURANT_INFO_CACHE_TTL seconds.
+        """
+        global _restaurant_info_cache
+        version = get_version('restaurant_info')
+        now = time.monotonic()
+        cached = _restaurant_info_cache
+        if cached is not None and cached[0] == version and cached[1] > now:
+            return cached[2]
+        instance = cls.objects.first()
+        _restaurant_info_cache = (version, now + RESTAURANT_INFO_CACHE_TTL, instance)
+        return instance
+
+
+class SyncTombstone(models.Model):
+    """Record of a deleted object, served by the sync change feed"""
+    object_type = models.CharField(max_length=30, help_text="Sync type name, e.g. 'menu_item'")
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [models.Index(fields=['deleted_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.object_type} #{self.object_id} deleted at {self.deleted_at}"
+
+
+class Translation(models.Model):
+    """Text of a category, menu item or ingredient field in a language other than LANGUAGE_CODE"""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    field = models.CharField(max_length=50, help_text="Translated field, e.g. 'name'")
+    language = models.CharField(max_length=10, choices=settings.LANGUAGES)
+    text = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['content_type', 'object_id', 'field', 'language']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_type', 'object_id', 'field', 'language'], name='unique_translation'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type.model} #{self.object_id} {self.field} ({self.language})"
+
+    def clean(self):
+        errors = {}
+        if self.language == settings.LANGUAGE_CODE:
+            errors['language'] = f"{self.language} is the language of the fields themselves."
+        if self.content_type_id is not None:
+            model = self.content_type.model_class()
+            translated_fields = getattr(model, 'translated_fields', ())
+            if self.field not in translated_fields:
+                errors['field'] = (
+                    f"Translatable fields of {model._meta.verbose_name}: {', '.join(translated_fields) or 'none'}."
+                )
+        if errors:
+            raise ValidationError(errors)
+
+
+class ImageRendition(models.Model):
+    """Resized copy of an uploaded image, without its metadata"""
+    FORMATS = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+
+    source = models.CharField(max_length=255, help_text="Storage name of the original image")
+    width = models.PositiveIntegerField(help_text="Width the rendition was made for")
+    format = models.CharField(max_length=4, choices=FORMATS)
+    file = models.FileField(max_length=255)
+    actual_width = models.PositiveIntegerField(help_text="Smaller than width when the original is narrower")
+    height = models.PositiveIntegerField()
+    file_size = models.PositiveIntegerField(help_text="Size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['source', 'width', 'format']
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'width', 'format'], name='unique_image_rendition'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.width}w {self.format})"
+
+
+class ModelVariant(models.Model):
+    """Binary glTF copy of an uploaded 3D model, whole or simplified"""
+    KINDS = [
+        ('preview', 'Preview'),
+        ('full', 'Full'),
+    ]
+
+    source = models.CharField(max_length=255, help_text="Storage name of the uploaded model")
+    kind = models.CharField(max_length=7, choices=KINDS)
+    file = models.FileField(max_length=255)
+    vertex_count = models.PositiveIntegerField()
+    triangle_count = models.PositiveIntegerField()
+    file_size = models.PositiveIntegerField(help_text="Size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['source', 'kind']
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'kind'], name='unique_model_variant'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.kind})"
+
+
+class MediaFile(models.Model):
+    """Uploaded file stored once, under the hash of its content"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(help_text="Size in bytes")
+    ref_count = models.PositiveIntegerField(
+        default=0, help_text="Category, menu item and ingredient images using the file"
+    )
+    uploaded_at = models.DateTimeField(default=timezone.now, help_text="Last upload of this content")
+
+    class Meta:
+        ordering = ['-uploaded_at']
+
+    def __str__(self):
+        return self.file.name
+
+
+class Order(models.Model):
+    """Customer order with the prices, tax rate and fees it was placed at"""
+    ORDER_TYPES = [
+        ('delivery', 'Delivery'),
+        ('pickup', 'Pickup'),
+    ]
+    STATUS_CHOICES = [
+        ('confirmed', 'Confirmed'),
+        ('preparing', 'Preparing'),
+        ('ready', 'Ready'),
+        ('out_for_delivery', 'Out for delivery'),
+        ('delivered', 'Delivered'),
+        ('cancelled', 'Cancelled'),
+    ]
+    PAYMENT_METHODS = [
+        ('card', 'Credit/Debit Card'),
+        ('paypal', 'PayPal'),
+        ('cash', 'Cash on Delivery'),
+    ]
+
+    order_number = models.CharField(max_length=20, unique=True, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='confirmed')
+    order_type = models.CharField(max_length=10, choices=ORDER_TYPES, default='delivery')
+
+    # Customer
+    customer_name = models.CharField(max_length=200)
+    email = models.EmailField()
+    phone = models.CharField(max_length=20)
+    address = models.TextField(blank=True)
+    delivery_instructions = models.TextField(blank=True)
+    delivery_time = models.CharField(max_length=20, blank=True, help_text="Requested time, e.g. 'asap' or '30min'")
+    payment_method = models.CharField(max_length=10, choices=PAYMENT_METHODS, default='cash')
+
+    # Snapshots taken when the order was placed
+    currency_symbol = models.CharField(max_length=5, default='€')
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0, help_text="Tax rate in percentage")
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    tax = models.DecimalField(max_digits=10, decimal_places=2)
+    delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', '-created_at'], name='order_status_created_idx')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as loaded, so saves only publish actual transitions
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def __str__(self):
+        return self.order_number
+
+
+# Minutes per dish for menu items without a preparation time
+DEFAULT_PREPARATION_TIME = 10
+
+
+class OrderLine(models.Model):
+    """Ordered menu item with its price, customizations and kitchen data at order time"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_lines')
+    name = models.CharField(max_length=200)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Menu item price plus customization modifiers")
+    customizations = models.JSONField(default=list, blank=True, help_text="[{id, name, price_modifier}] at order time")
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    line_total = models.DecimalField(max_digits=10, decimal_places=2)
+    station = models.CharField(max_length=10, choices=Category.KITCHEN_STATIONS, default='cold')
+    preparation_time = models.PositiveIntegerField(
+        default=DEFAULT_PREPARATION_TIME, help_text="Preparation time of one dish in minutes"
+    )
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.quantity} x {self.name}"
@@ -0,0 +1,170 @@
+"""
+Order pricing and placement.
+
+Carts are priced against the current menu, never against the prices the
+client sends: all cart lines are checked with one bulk query for their
+menu items (plus one for the customizations those items offer), which
+also snapshots the kitchen station and preparation time each line is
+scheduled with. The order is then written in a single transaction with
+one INSERT for the order and one bulk INSERT for its lines.
+"""
+import secrets
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .models import (
+    Customization, MenuItem, Order, OrderLine, RestaurantInfo, DEFAULT_PREPARATION_TIME
+)
+
+CENT = Decimal('0.01')
+
+DELIVERY_FEE = Decimal('2.99')
+FREE_DELIVERY_OVER = Decimal('20.00')
+
+MAX_ORDER_LINES = 50
+
+# Tracking steps shown for each order type, as (status, label, icon)
+TRACKING_STEPS = {
+    'delivery': [
+        ('confirmed', 'Order Confirmed', 'utensils'),
+        ('preparing', 'Preparing', 'fire'),
+        ('out_for_delivery', 'On the way', 'truck'),
+        ('delivered', 'Delivered', 'check-circle'),
+    ],
+    'pickup': [
+        ('confirmed', 'Order Confirmed', 'utensils'),
+        ('preparing', 'Preparing', 'fire'),
+        ('ready', 'Ready for pickup', 'shopping-bag'),
+        ('delivered', 'Picked up', 'check-circle'),
+    ],
+}
+
+# Unambiguous characters only, as customers read order numbers out on the phone
+ORDER_NUMBER_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+ORDER_NUMBER_LENGTH = 10
+
+
+def generate_order_number():
+    """Random rather than sequential, so concurrent checkouts never contend on a counter"""
+    return 'ORD' + ''.join(secrets.choice(ORDER_NUMBER_ALPHABET) for _ in range(ORDER_NUMBER_LENGTH))
+
+
+def price_cart(items):
+    """
+    Price validated cart items ({'id', 'quantity', 'customizations', 'price'})
+    at the current menu prices and return unsaved OrderLines. Raises a
+    ValidationError with one error dict per cart item if any is invalid.
+    """
+    menu_items = MenuItem.objects.filter(
+        pk__in={item['id'] for item in items}, is_available=True
+    ).select_related('category').only(
+        'pk', 'name', 'price', 'preparation_time', 'category__kitchen_station'
+    ).prefetch_related(
+        Prefetch(
+            'customizations',
+            queryset=Customization.objects.filter(is_active=True).only('pk', 'name', 'price_modifier')
+        )
+    )
+    menu_items = {menu_item.pk: menu_item for menu_item in menu_items}
+
+    lines, errors = [], []
+    for item in items:
+        menu_item = menu_items.get(item['id'])
+        if menu_item is None:
+            errors.append({'id': ['This menu item is not available.']})
+            continue
+        offered = {customization.pk: customization for customization in menu_item.customizations.all()}
+        chosen_ids = list(dict.fromkeys(item['customizations']))
+        unknown = [pk for pk in chosen_ids if pk not in offered]
+        if unknown:
+            errors.append({'customizations': [f'Not available for {menu_item.name}: {unknown}']})
+            continue
+        if item.get('price') is not None and item['price'] != menu_item.price:
+            errors.append({'price': [f'The price of {menu_item.name} is now {menu_item.price}.']})
+            continue
+
+        chosen = [offered[pk] for pk in chosen_ids]
+        unit_price = max(menu_item.price + sum(c.price_modifier for c in chosen), Decimal('0'))
+        errors.append({})
+        lines.append(OrderLine(
+            menu_item=menu_item,
+            name=menu_item.name,
+            unit_price=unit_price,
+            customizations=[
+                {'id': c.pk, 'name': c.name, 'price_modifier': str(c.price_modifier)} for c in chosen
+            ],
+            quantity=item['quantity'],
+            line_total=unit_price * item['quantity'],
+            station=menu_item.category.kitchen_station,
+            preparation_time=menu_item.preparation_time or DEFAULT_PREPARATION_TIME,
+        ))
+
+    if any(errors):
+        raise serializers.ValidationError({'items': errors})
+    return lines
+
+
+def calculate_totals(subtotal, order_type, tax_rate):
+    tax = (subtotal * tax_rate / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    if order_type == 'delivery' and subtotal <= FREE_DELIVERY_OVER:
+        delivery_fee = DELIVERY_FEE
+    else:
+        delivery_fee = Decimal('0.00')
+    return {
+        'subtotal': subtotal,
+        'tax': tax,
+        'delivery_fee': delivery_fee,
+        'total': subtotal + tax + delivery_fee,
+    }
+
+
+def place_order(lines, **customer):
+    """Create the order for priced `lines` with the current tax rate and currency"""
+    restaurant_info = RestaurantInfo.get_solo()
+    tax_rate = restaurant_info.tax_rate if restaurant_info else Decimal('0')
+    totals = calculate_totals(
+        sum((line.line_total for line in lines), Decimal('0.00')),
+        customer.get('order_type', 'delivery'),
+        tax_rate,
+    )
+
+    with transaction.atomic():
+        for attempt in range(3):
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(
+                        order_number=generate_order_number(),
+                        currency_symbol=restaurant_info.currency_symbol if restaurant_info else '€',
+                        tax_rate=tax_rate,
+                        **totals,
+                        **customer,
+                    )
+                break
+            except IntegrityError:
+                # Order number collision; anything else will fail again on the last attempt
+                if attempt == 2:
+                    raise
+        for line in lines:
+            line.order = order
+        OrderLine.objects.bulk_create(lines)
+    return order
+
+
+def tracking_steps(order):
+    """Return the tracking steps of an order and the 1-based index of the current one"""
+    steps = TRACKING_STEPS[order.order_type]
+    statuses = [status for status, label, icon in steps]
+    current = statuses.index(order.status) + 1 if order.status in statuses else 1
+    return [
+        {
+            'status': status,
+            'name': label,
+            'icon': icon,
+            'completed': position < current or order.status == 'delivered',
+            'time': order.created_at if status == 'confirmed' else None,
+        }
+        for position, (status, label, icon) in enumerate(steps, start=1)
+    ], current
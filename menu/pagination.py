@@ -0,0 +1,187 @@
+"""
+Pagination classes.
+
+Page-number pagination stays the default for backwards compatibility.
+Clients opt into keyset pagination by sending ?cursor= (empty for the
+first page): it seeks on (created_at, id) through a composite index
+instead of counting rows and skipping OFFSET rows, so deep pages cost the
+same as the first one. Cursor pages always come in that fixed order: the
+view's ordering is replaced, and an ?ordering= that asks for another one
+is rejected rather than ignored.
+
+apaginate_queryset() does the same for the async views, with the page
+fetched through the async ORM.
+"""
+import base64
+from datetime import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Forward-only pagination on a (timestamp, id) key"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            pass
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, instance):
+        timestamp_field = self.ordering[0].lstrip('-')
+        raw = f'{getattr(instance, timestamp_field).isoformat()}|{instance.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            timestamp, pk = raw.split('|')
+            return datetime.fromisoformat(timestamp), int(pk)
+        except (TypeError, UnicodeDecodeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    def check_ordering(self, request):
+        """Reject an ?ordering= the fixed keyset order can't honour"""
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM)
+        if not ordering:
+            return
+        fields = [field.strip() for field in ordering.split(',')]
+        if fields != list(self.ordering[:len(fields)]):
+            raise ValidationError({
+                api_settings.ORDERING_PARAM: f'Cursor pages are ordered by {",".join(self.ordering)}.'
+            })
+
+    def get_page_queryset(self, queryset, request):
+        """The rows of the requested page plus one, to tell whether there is a next page"""
+        self.check_ordering(request)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        timestamp_field = self.ordering[0].lstrip('-')
+        descending = self.ordering[0].startswith('-')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            timestamp, pk = self.decode_cursor(cursor)
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{timestamp_field}__{lookup}': timestamp}) |
+                Q(**{timestamp_field: timestamp, f'pk__{lookup}': pk})
+            )
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+def wants_keyset_pagination(request):
+    return KeysetPagination.cursor_query_param in request.query_params
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """Page numbers by default, keyset pagination when the request has ?cursor="""
+
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if wants_keyset_pagination(request):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+async def apaginate_queryset(paginator, queryset, request):
+    """
+    Async paginator.paginate_queryset() for KeysetPagination and the page
+    number paginators: the COUNT and the page are fetched with the async ORM,
+    and paginator.get_paginated_response() works as after the sync call
+    """
+    if isinstance(paginator, PageNumberOrKeysetPagination):
+        paginator.keyset = None
+        if wants_keyset_pagination(request):
+            paginator.keyset = paginator.keyset_pagination_class()
+            paginator = paginator.keyset
+    if isinstance(paginator, KeysetPagination):
+        return paginator.set_page([row async for row in paginator.get_page_queryset(queryset, request)])
+
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    # Set before anything reads num_pages, which would COUNT synchronously
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        number = django_paginator.validate_number(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+    bottom = (number - 1) * page_size
+    top = bottom + page_size
+    if top + django_paginator.orphans >= django_paginator.count:
+        top = django_paginator.count
+    rows = [row async for row in queryset[bottom:top]]
+    paginator.page = django_paginator._get_page(rows, number, django_paginator)
+    if django_paginator.num_pages > 1 and paginator.template is not None:
+        paginator.display_page_controls = True
+    paginator.request = request
+    return rows
+
+
+def paginate_optional_keyset(request, queryset, serializer_class, context=None):
+    """
+    For actions that return plain lists: keyset-paginated response when the
+    client sent ?cursor=, otherwise the full list as before
+    """
+    if not wants_keyset_pagination(request):
+        return Response(serializer_class(queryset, many=True, context=context).data)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    return paginator.get_paginated_response(serializer_class(page, many=True, context=context).data)
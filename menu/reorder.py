@@ -0,0 +1,166 @@
+"""
+Gap-based display order for categories and menu items.
+
+`order` values are spaced ORDER_GAP apart. To apply a new sequence, the
+longest run of rows whose current values already increase along it keeps
+its values, and only the other rows get new ones, spread between their
+kept neighbours. Moving a row between two others therefore writes just
+that row; a scope (all categories, or the items of one category) is only
+renumbered when two neighbours have no integer left between them. Either
+way the changed rows are written with a single bulk_update.
+"""
+import bisect
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .bulk import bump_model_versions
+
+ORDER_GAP = 1024
+
+
+class ReorderSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+class MoveSerializer(serializers.Serializer):
+    before = serializers.IntegerField(required=False)
+    after = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if len(attrs) != 1:
+            raise serializers.ValidationError('Send either "before" or "after".')
+        return attrs
+
+
+def longest_increasing_run(values):
+    """Indexes of a longest strictly increasing subsequence of `values`"""
+    tails, tail_indexes, previous = [], [], []
+    for index, value in enumerate(values):
+        position = bisect.bisect_left(tails, value)
+        if position == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[position] = value
+            tail_indexes[position] = index
+        previous.append(tail_indexes[position - 1] if position else None)
+
+    run = set()
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        run.add(index)
+        index = previous[index]
+    return run
+
+
+def spread(low, high, count):
+    """`count` increasing values strictly between low and high (None: unbounded), or None if they do not fit"""
+    if high is None:
+        start = low or 0
+        return [start + ORDER_GAP * n for n in range(1, count + 1)]
+    low = low if low is not None else 0
+    step = (high - low) // (count + 1)
+    if step < 1:
+        return None
+    return [low + step * n for n in range(1, count + 1)]
+
+
+def assign_orders(rows):
+    """Give `rows`, in their new sequence, increasing orders; return the rows that changed"""
+    kept = longest_increasing_run([row.order for row in rows])
+    orders = [row.order if index in kept else None for index, row in enumerate(rows)]
+
+    start = 0
+    while start < len(rows):
+        if orders[start] is not None:
+            start += 1
+            continue
+        end = start
+        while end < len(rows) and orders[end] is None:
+            end += 1
+        values = spread(
+            orders[start - 1] if start else None,
+            orders[end] if end < len(rows) else None,
+            end - start
+        )
+        if values is None:
+            # No room left between the neighbours: renumber the whole scope
+            orders = [ORDER_GAP * n for n in range(1, len(rows) + 1)]
+            break
+        orders[start:end] = values
+        start = end
+
+    changed = []
+    for row, order in zip(rows, orders):
+        if row.order != order:
+            row.order = order
+            changed.append(row)
+    return changed
+
+
+def current_sequence(queryset):
+    """Rows of a scope in display order, locked until the end of the transaction"""
+    return list(
+        queryset.select_for_update().only('pk', 'order', 'name').order_by('order', 'name', 'pk')
+    )
+
+
+def save_sequence(model, rows):
+    changed = assign_orders(rows)
+    if changed:
+        # auto_now is only applied by save(); the sync feed needs it
+        now = timezone.now()
+        for row in changed:
+            row.updated_at = now
+        model._default_manager.bulk_update(changed, ['order', 'updated_at'])
+        bump_model_versions(model)
+    return changed
+
+
+def reorder(queryset, ids):
+    """Put the rows of a scope in the sequence of `ids`, which must list each of them once"""
+    with transaction.atomic():
+        rows = {row.pk: row for row in current_sequence(queryset)}
+        unknown = [pk for pk in ids if pk not in rows]
+        missing = [pk for pk in rows if pk not in ids]
+        if unknown or missing or len(set(ids)) != len(ids):
+            raise serializers.ValidationError({'ids': [
+                f'Send every id of the list exactly once (unknown: {unknown}, missing: {missing}).'
+            ]})
+        return save_sequence(queryset.model, [rows[pk] for pk in ids])
+
+
+def move(queryset, pk, before=None, after=None):
+    """Move row `pk` right before or after another row of its scope; return (changed rows, its new order)"""
+    with transaction.atomic():
+        rows = current_sequence(queryset)
+        moved = next(row for row in rows if row.pk == pk)
+        rows.remove(moved)
+        anchor = before if before is not None else after
+        positions = {row.pk: index for index, row in enumerate(rows)}
+        if anchor not in positions:
+            field = 'before' if before is not None else 'after'
+            raise serializers.ValidationError({field: ['Not in the same list.']})
+        rows.insert(positions[anchor] + (1 if before is None else 0), moved)
+        return save_sequence(queryset.model, rows), moved.order
+
+
+class MoveMixin:
+    """Adds POST <resource>/<id>/move/ with {"before": id} or {"after": id}"""
+
+    def get_order_scope(self, instance):
+        """Queryset of the rows `instance` is ordered among"""
+        raise NotImplementedError
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """Move this row right before or after another one, usually rewriting only this row"""
+        instance = self.get_object()
+        serializer = MoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed, order = move(self.get_order_scope(instance), instance.pk, **serializer.validated_data)
+        return Response({'id': instance.pk, 'order': order, 'updated': len(changed)})
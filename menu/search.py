@@ -0,0 +1,140 @@
+"""
+Full-text search over menu items.
+
+PostgreSQL uses per-language tsvector expressions over name and
+description, backed by the GIN indexes created in migration 0006 and
+ranked with ts_rank (name weighs more than description). SQLite uses the
+FTS5 table from the same migration, kept in sync by triggers and ranked
+with bm25; it only stems English, which is enough for local development.
+Every other backend falls back to icontains matching.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Category
+
+# PostgreSQL text search configuration for each code in settings.LANGUAGES
+SEARCH_CONFIGS = {
+    'en': 'english',
+    'de': 'german',
+    'fr': 'french',
+    'it': 'italian',
+    'es': 'spanish',
+    'ar': 'arabic',
+}
+DEFAULT_SEARCH_CONFIG = 'simple'
+
+SQLITE_FTS_TABLE = 'menu_menuitem_fts'
+
+# Upper bound on ranked ids fetched from the SQLite FTS table
+SQLITE_MAX_RESULTS = 200
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_search_config(language_code):
+    """Map a language code such as 'fr' or 'fr-ca' to its PostgreSQL config"""
+    language = (language_code or settings.LANGUAGE_CODE).split('-')[0].lower()
+    return SEARCH_CONFIGS.get(language, DEFAULT_SEARCH_CONFIG)
+
+
+def get_search_terms(query):
+    """Split a user query into plain word terms, dropping any search operators"""
+    return TERM_RE.findall(query.lower())
+
+
+class BasicSearchBackend:
+    """Case-insensitive substring matching, used when no full-text engine is available"""
+
+    def search(self, queryset, query, language_code=None):
+        terms = get_search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) |
+                Q(description__icontains=term) |
+                Q(category__name__icontains=term)
+            )
+        return queryset
+
+
+class PostgresSearchBackend:
+    """tsvector search with relevance ranking and prefix matching on every term"""
+
+    def search(self, queryset, query, language_code=None):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        terms = get_search_terms(query)
+        if not terms:
+            return queryset.none()
+        config = get_search_config(language_code)
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), search_type='raw', config=config
+        )
+        # Must match the indexed expression exactly for the GIN index to be used
+        document = SearchVector('name', 'description', config=config)
+        weighted_document = (
+            SearchVector('name', weight='A', config=config) +
+            SearchVector('description', weight='B', config=config)
+        )
+        matching_categories = Category.objects.annotate(
+            document=SearchVector('name', config=config)
+        ).filter(document=search_query).values('pk')
+
+        return queryset.annotate(
+            search_document=document,
+            search_rank=SearchRank(weighted_document, search_query),
+        ).filter(
+            Q(search_document=search_query) | Q(category__in=matching_categories)
+        ).order_by('-search_rank', 'name')
+
+
+class SQLiteFTSSearchBackend:
+    """FTS5 search ranked with bm25 (name > category > description)"""
+
+    def search(self, queryset, query, language_code=None):
+        terms = get_search_terms(query)
+        if not terms:
+            return queryset.none()
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({SQLITE_FTS_TABLE}, 10.0, 2.0, 5.0) LIMIT %s',
+                [match, SQLITE_MAX_RESULTS]
+            )
+            ranked_ids = [row[0] for row in cursor.fetchall()]
+        if not ranked_ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ranked_ids).order_by(
+            Case(
+                *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked_ids)],
+                output_field=IntegerField(),
+            )
+        )
+
+
+_sqlite_fts_available = {}
+
+
+def get_search_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        # FTS5 may be missing from the SQLite build, in which case 0006 skipped the table
+        if connection.alias not in _sqlite_fts_available:
+            _sqlite_fts_available[connection.alias] = (
+                SQLITE_FTS_TABLE in connection.introspection.table_names()
+            )
+        if _sqlite_fts_available[connection.alias]:
+            return SQLiteFTSSearchBackend()
+    return BasicSearchBackend()
+
+
+def search_menu_items(queryset, query, language_code=None):
+    """Return the menu items of `queryset` matching `query`, most relevant first"""
+    return get_search_backend().search(queryset, query, language_code)
@@ -1,13 +1,61 @@
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
 from .models import (
     Category, MenuItem, Ingredient, MenuItemIngredient,
-    Customization, Review, RestaurantInfo, Branch
+    Customization, Review, RestaurantInfo, Branch, Order, OrderLine
 )
+from .images import NAMED_WIDTHS, RenditionRegistry, rendition_width
+from .kitchen import estimated_arrival, estimated_time, get_schedule
+from .model_variants import variants_for
+from .orders import MAX_ORDER_LINES, place_order, price_cart
+from .translations import context_translations
+
+
+def rounded_rating(value):
+    """Average ratings are exposed with one decimal, or None without approved reviews"""
+    return round(value, 1) if value is not None else None
+
+
+class TranslatedListSerializer(serializers.ListSerializer):
+    """Looks up the translations of every listed row, and of the rows loaded with them, with one query"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        if getattr(self.child, 'translated_fields', None):
+            context_translations(self.context, items)
+        return super().to_representation(items)
+
+
+class TranslatedSerializer(serializers.Serializer):
+    """
+    Serves the `translated_fields` ({field: attribute path}) in the active
+    language, falling back to the text stored on the row
+    """
+    translated_fields = {}
+
+    def to_representation(self, instance):
+        translations = context_translations(self.context, [instance]) if self.translated_fields else None
+        data = super().to_representation(instance)
+        if translations is None:
+            return data
+        for name, path in self.translated_fields.items():
+            if name not in data:
+                continue
+            *owners, field = path.split('.')
+            owner = instance
+            for attribute in owners:
+                owner = getattr(owner, attribute)
+            text = translations.get(owner, field)
+            if text:
+                data[name] = text
+        return data
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TranslatedSerializer, serializers.ModelSerializer):
     item_count = serializers.SerializerMethodField()
 
+    translated_fields = {'name': 'name', 'description': 'description'}
+
     class Meta:
         model = Category
         fields = [
@@ -15,15 +63,22 @@ class CategorySerializer(serializers.ModelSerializer):
             'is_active', 'item_count', 'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = TranslatedListSerializer
 
     def get_item_count(self, obj):
+        # Prefer the count annotated by CategoryViewSet.get_queryset
+        if hasattr(obj, 'available_item_count'):
+            return obj.available_item_count
         return obj.items.filter(is_available=True).count()
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TranslatedSerializer, serializers.ModelSerializer):
+    translated_fields = {'name': 'name', 'description': 'description'}
+
     class Meta:
         model = Ingredient
         fields = ['id', 'name', 'description', 'is_allergen']
+        list_serializer_class = TranslatedListSerializer
 
 
 class MenuItemIngredientSerializer(serializers.ModelSerializer):
@@ -61,13 +116,10 @@ class BranchSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
     def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        return obj.rating_count
 
     def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return None
+        return rounded_rating(obj.rating_avg)
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -98,29 +150,103 @@ class ReviewSerializer(serializers.ModelSerializer):
         return data
 
 
-class MenuItemListSerializer(serializers.ModelSerializer):
+class RenditionListSerializer(TranslatedListSerializer):
+    """Looks up the renditions of every listed image with one query"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        # Async views load them beforehand, the ORM being off limits there
+        self.renditions = self.context.get('renditions')
+        if self.renditions is not None:
+            return super().to_representation(items)
+        self.renditions = RenditionRegistry.load(item.image for item in items)
+        representation = super().to_representation(items)
+        self.renditions.queue_missing()
+        return representation
+
+
+class ImageRenditionsSerializer(serializers.Serializer):
+    """
+    Adds image_src, the rendition fitting ?image_size= (thumbnail, card,
+    hero or a width in pixels), and image_srcset, every WebP rendition
+    """
+    image_src = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
+    rendition_fields = ('image_src', 'image_srcset')
+    default_image_size = 'card'
+
+    @property
+    def renditions(self):
+        for renditions in (getattr(self.parent, 'renditions', None), self.context.get('renditions')):
+            if renditions is not None:
+                return renditions
+        return getattr(self, '_renditions', None)
+
+    def to_representation(self, instance):
+        if self.renditions is not None or not set(self.rendition_fields) & set(self.fields):
+            return super().to_representation(instance)
+        # Serialized on its own: look up its image alone
+        self._renditions = RenditionRegistry.load([instance.image])
+        try:
+            return super().to_representation(instance)
+        finally:
+            self._renditions.queue_missing()
+            self._renditions = None
+
+    def absolute_url(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request and url else url
+
+    def get_image_width(self):
+        request = self.context.get('request')
+        size = request.query_params.get('image_size') if request else None
+        if size is None:
+            return NAMED_WIDTHS[self.default_image_size]
+        width = rendition_width(size)
+        if width is None:
+            raise serializers.ValidationError({
+                'image_size': [f"Use {', '.join(NAMED_WIDTHS)} or a width in pixels."]
+            })
+        return width
+
+    def get_image_src(self, obj):
+        """URL of the smallest rendition fitting the requested size, the original until one is made"""
+        return self.absolute_url(self.renditions.url(obj.image, self.get_image_width()))
+
+    def get_image_srcset(self, obj):
+        return self.renditions.srcset(obj.image, build_url=self.absolute_url) or None
+
+
+class MenuItemListSerializer(TranslatedSerializer, ImageRenditionsSerializer, serializers.ModelSerializer):
     """Lightweight serializer for list views"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     average_rating = serializers.SerializerMethodField()
+    image_thumbnail = serializers.SerializerMethodField()
+
+    rendition_fields = ImageRenditionsSerializer.rendition_fields + ('image_thumbnail',)
+    translated_fields = {'name': 'name', 'description': 'description', 'category_name': 'category.name'}
 
     class Meta:
         model = MenuItem
         fields = [
             'id', 'name', 'description', 'category', 'category_name',
-            'price', 'image', 'video', 'video_thumbnail', 'spice_level', 
+            'price', 'image', 'image_thumbnail', 'image_src', 'image_srcset', 'video', 'video_preview', 'video_thumbnail', 'spice_level', 
             'is_vegetarian', 'is_vegan', 'is_gluten_free', 'contains_nuts', 
             'is_available', 'is_featured', 'preparation_time', 'calories', 
             'average_rating'
         ]
+        list_serializer_class = RenditionListSerializer
 
     def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return None
+        return rounded_rating(obj.rating_avg)
+
+    def get_image_thumbnail(self, obj):
+        """URL of the smallest rendition, the original image until it is made"""
+        return self.absolute_url(self.renditions.url(obj.image, NAMED_WIDTHS['thumbnail']))
 
 
-class MenuItemDetailSerializer(serializers.ModelSerializer):
+class MenuItemDetailSerializer(TranslatedSerializer, ImageRenditionsSerializer, serializers.ModelSerializer):
     """Detailed serializer with all related data"""
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
@@ -133,12 +259,16 @@ class MenuItemDetailSerializer(serializers.ModelSerializer):
     reviews = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     review_count = serializers.SerializerMethodField()
+    model_3d_variants = serializers.SerializerMethodField()
+
+    translated_fields = {'name': 'name', 'description': 'description'}
 
     class Meta:
         model = MenuItem
         fields = [
             'id', 'name', 'description', 'category', 'category_id',
-            'price', 'image', 'video', 'video_thumbnail', 'spice_level', 
+            'price', 'image', 'image_src', 'image_srcset', 'video', 'video_preview', 'video_thumbnail',
+            'model_3d', 'model_3d_variants', 'spice_level', 
             'is_vegetarian', 'is_vegan', 'is_gluten_free', 'contains_nuts', 
             'is_available', 'is_featured', 'preparation_time', 'calories', 
             'order', 'ingredients', 'customizations', 'reviews', 
@@ -146,18 +276,76 @@ class MenuItemDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    default_image_size = 'hero'
+
+    def to_representation(self, instance):
+        # Hand the annotated count to the nested CategorySerializer
+        if hasattr(instance, 'category_item_count'):
+            instance.category.available_item_count = instance.category_item_count
+        return super().to_representation(instance)
+
     def get_reviews(self, obj):
-        approved_reviews = obj.reviews.filter(is_approved=True)[:5]
+        # Prefer the slice prefetched by MenuItemViewSet.with_detail_relations
+        if hasattr(obj, 'latest_reviews'):
+            approved_reviews = obj.latest_reviews
+        else:
+            approved_reviews = obj.reviews.filter(is_approved=True)[:5]
         return ReviewSerializer(approved_reviews, many=True).data
 
     def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return None
+        return rounded_rating(obj.rating_avg)
 
     def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        return obj.rating_count
+
+    def get_model_3d_variants(self, obj):
+        """
+        The preview and full GLB of the 3D model, for clients to show the
+        preview first; null until the upload is converted (model_3d then)
+        """
+        if not obj.model_3d:
+            return None
+        # Preloaded by the async detail view
+        variants = getattr(obj, 'model_variants', None)
+        if variants is None:
+            variants = variants_for(obj.model_3d.name)
+        if not variants:
+            return None
+        return {
+            kind: {
+                'url': self.absolute_url(variant.file.url),
+                'vertex_count': variant.vertex_count,
+                'triangle_count': variant.triangle_count,
+                'file_size': variant.file_size,
+            }
+            for kind, variant in variants.items()
+        }
+
+
+class MenuItemSyncSerializer(MenuItemListSerializer):
+    """Menu item as sent by the sync change feed"""
+    # Ratings and renditions change without touching updated_at, so they are left out of the feed
+    average_rating = None
+    image_thumbnail = None
+    image_src = None
+    image_srcset = None
+    ingredients = MenuItemIngredientSerializer(many=True, read_only=True)
+    customization_ids = serializers.PrimaryKeyRelatedField(
+        source='customizations', many=True, read_only=True
+    )
+
+    class Meta(MenuItemListSerializer.Meta):
+        fields = [
+            field for field in MenuItemListSerializer.Meta.fields
+            if field not in ('average_rating',) + MenuItemListSerializer.rendition_fields
+        ] + ['order', 'ingredients', 'customization_ids', 'updated_at']
+        list_serializer_class = serializers.ListSerializer
+
+
+class CustomizationSyncSerializer(CustomizationSerializer):
+    """Customization with the ids of the items it applies to"""
+    class Meta(CustomizationSerializer.Meta):
+        fields = CustomizationSerializer.Meta.fields + ['menu_items', 'updated_at']
 
 
 class RestaurantInfoSerializer(serializers.ModelSerializer):
@@ -169,3 +357,80 @@ class RestaurantInfoSerializer(serializers.ModelSerializer):
             'twitter_url', 'currency_symbol', 'tax_rate', 'updated_at'
         ]
         read_only_fields = ['updated_at']
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        fields = ['menu_item', 'name', 'unit_price', 'customizations', 'quantity', 'line_total']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    lines = OrderLineSerializer(many=True, read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    estimated_time = serializers.SerializerMethodField()
+    estimated_arrival = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = [
+            'order_number', 'status', 'status_display', 'order_type', 'estimated_time', 'estimated_arrival',
+            'customer_name', 'email', 'phone', 'address', 'delivery_instructions',
+            'delivery_time', 'payment_method', 'lines', 'currency_symbol', 'subtotal',
+            'tax_rate', 'tax', 'delivery_fee', 'total', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+    def get_kitchen_schedule(self):
+        # One plan for every order of a list
+        if 'kitchen_schedule' not in self.context:
+            self.context['kitchen_schedule'] = get_schedule()
+        return self.context['kitchen_schedule']
+
+    def get_estimated_time(self, obj):
+        return estimated_time(obj, self.get_kitchen_schedule())
+
+    def get_estimated_arrival(self, obj):
+        return estimated_arrival(obj, self.get_kitchen_schedule())
+
+
+class CartItemSerializer(serializers.Serializer):
+    """One cart line as stored by the frontend cart; `price` is what the customer saw"""
+    id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=50)
+    customizations = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+
+
+class OrderCreateSerializer(serializers.ModelSerializer):
+    """Place an order for `items`, or for the session cart when no items are sent"""
+    items = CartItemSerializer(many=True, required=False, write_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'order_type', 'customer_name', 'email', 'phone', 'address',
+            'delivery_instructions', 'delivery_time', 'payment_method', 'items'
+        ]
+
+    def validate(self, data):
+        items = data.get('items')
+        if items is None:
+            cart = CartItemSerializer(data=self.context['request'].session.get('cart', []), many=True)
+            if not cart.is_valid():
+                raise serializers.ValidationError({'items': cart.errors})
+            items = cart.validated_data
+        if not items:
+            raise serializers.ValidationError({'items': ["The cart is empty."]})
+        if len(items) > MAX_ORDER_LINES:
+            raise serializers.ValidationError({'items': [f"An order can have at most {MAX_ORDER_LINES} lines."]})
+        if data.get('order_type', 'delivery') == 'delivery' and not data.get('address'):
+            raise serializers.ValidationError({'address': ["An address is required for delivery orders."]})
+        data['items'] = price_cart(items)
+        return data
+
+    def create(self, validated_data):
+        return place_order(validated_data.pop('items'), **validated_data)
+
+    def to_representation(self, instance):
+        return OrderSerializer(instance, context=self.context).data
@@ -0,0 +1,191 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from . import autocomplete, events, images, media, model_variants
+from .cache import bump_version, bump_versions_on_commit
+from .models import (
+    Category, MenuItem, Ingredient, MenuItemIngredient, Customization,
+    Review, Branch, RestaurantInfo, SyncTombstone, Order, Translation,
+    RATING_STATE_FIELDS, apply_review_rating_changes
+)
+from .sync import SYNC_TYPE_NAMES
+
+# Cache versions bumped by a save/delete of each model: 'menu' covers the
+# whole public menu (snapshot, menu pages), the others one cached resource
+CACHE_VERSIONS = {
+    Category: ('menu', 'categories'),
+    MenuItem: ('menu', 'categories'),
+    Ingredient: ('menu', 'ingredients'),
+    MenuItemIngredient: ('menu',),
+    Customization: ('menu', 'customizations'),
+    Review: ('reviews',),
+    Branch: ('branches',),
+    RestaurantInfo: ('restaurant_info',),
+}
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating_state(sender, instance, raw=False, **kwargs):
+    """Keep the state the review had in the database before this save"""
+    if raw:
+        return
+    if instance._state.adding:
+        instance._previous_rating_state = None
+    elif getattr(instance, '_rating_state', None) is not None:
+        instance._previous_rating_state = instance._rating_state
+    else:
+        instance._previous_rating_state = (
+            Review.objects.filter(pk=instance.pk).values(*RATING_STATE_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_ratings_on_review_save(sender, instance, raw=False, **kwargs):
+    """Move the review's contribution from its previous state to its current one"""
+    if raw:
+        return
+    current_state = instance.get_rating_state()
+    apply_review_rating_changes([
+        (getattr(instance, '_previous_rating_state', None), -1),
+        (current_state, 1),
+    ])
+    instance._rating_state = current_state
+
+
+@receiver(post_delete, sender=Review)
+def update_ratings_on_review_delete(sender, instance, **kwargs):
+    """Remove a deleted review's contribution"""
+    state = getattr(instance, '_rating_state', None) or instance.get_rating_state()
+    apply_review_rating_changes([(state, -1)])
+
+
+def bump_cache_versions(sender, **kwargs):
+    """Invalidate exactly the cached data built from the changed model, once committed"""
+    bump_versions_on_commit(CACHE_VERSIONS[sender])
+
+
+for cached_model in CACHE_VERSIONS:
+    post_save.connect(bump_cache_versions, sender=cached_model)
+    post_delete.connect(bump_cache_versions, sender=cached_model)
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+def bump_translated_cache_versions(sender, instance, **kwargs):
+    """A translation is part of the cached data of the row it translates"""
+    model = ContentType.objects.get_for_id(instance.content_type_id).model_class()
+    bump_versions_on_commit(CACHE_VERSIONS.get(model, ()))
+
+
+@receiver(post_save, sender=Translation)
+@receiver(post_delete, sender=Translation)
+def touch_translated_object(sender, instance, raw=False, **kwargs):
+    """Touch the translated row so the sync feed re-sends it in the new text"""
+    if not raw:
+        model = ContentType.objects.get_for_id(instance.content_type_id).model_class()
+        model._default_manager.filter(pk=instance.object_id).update(updated_at=timezone.now())
+
+
+# Connected after bump_cache_versions so the index, patched on commit too,
+# sees the new menu version
+@receiver(post_save, sender=MenuItem)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Category)
+def update_autocomplete_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: autocomplete.update_index(instance))
+
+
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Category)
+def update_autocomplete_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete.update_index(instance, deleted=True))
+
+
+def touch_updated_at(instance, related_model, related_pks):
+    now = timezone.now()
+    type(instance).objects.filter(pk=instance.pk).update(updated_at=now)
+    related_model.objects.filter(pk__in=related_pks).update(updated_at=now)
+
+
+@receiver(m2m_changed, sender=Customization.menu_items.through)
+def on_customization_links_changed(sender, instance, action, model, pk_set, **kwargs):
+    """Touch both sides of a changed link so the sync feed re-sends them"""
+    if action == 'pre_clear':
+        # The cleared ids are no longer known once post_clear fires
+        related = instance.customizations if model is Customization else instance.menu_items
+        touch_updated_at(instance, model, list(related.values_list('pk', flat=True)))
+    elif action in ('post_add', 'post_remove'):
+        touch_updated_at(instance, model, pk_set)
+    if action.startswith('post_'):
+        bump_versions_on_commit(['menu'])
+
+
+@receiver([post_save, post_delete], sender=MenuItemIngredient)
+def touch_menu_item_on_ingredient_link(sender, instance, **kwargs):
+    """Item payloads embed their ingredients, so a link change updates the item"""
+    MenuItem.objects.filter(pk=instance.menu_item_id).update(updated_at=timezone.now())
+
+
+def record_sync_tombstone(sender, instance, **kwargs):
+    SyncTombstone.objects.create(object_type=SYNC_TYPE_NAMES[sender], object_id=instance.pk)
+
+
+for sync_model in SYNC_TYPE_NAMES:
+    post_delete.connect(record_sync_tombstone, sender=sync_model)
+
+
+@receiver(post_save, sender=Order)
+def publish_order_status(sender, instance, created, raw=False, **kwargs):
+    """Push status transitions to the clients tracking the order, once committed"""
+    if raw or created or instance.status == getattr(instance, '_loaded_status', None):
+        return
+    instance._loaded_status = instance.status
+    transaction.on_commit(lambda: events.publish_order_status(instance))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def reschedule_kitchen(sender, **kwargs):
+    """Replan the kitchen queue once the change (and a new order's lines) is committed"""
+    transaction.on_commit(lambda: bump_version('kitchen'))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Branch)
+def generate_image_renditions(sender, instance, raw=False, **kwargs):
+    """Queue the renditions of the saved image, once it is committed (existing ones are kept)"""
+    if raw or not instance.image:
+        return
+    source = instance.image.name
+    transaction.on_commit(lambda: images.schedule_renditions(source))
+
+
+@receiver(post_save, sender=MenuItem)
+def generate_model_3d_variants(sender, instance, raw=False, **kwargs):
+    """Queue the GLB variants of the saved 3D model, once it is committed (done once per upload)"""
+    if raw or not instance.model_3d:
+        return
+    source = instance.model_3d.name
+    transaction.on_commit(lambda: model_variants.schedule_model_variants(source))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_save, sender=Ingredient)
+def update_media_references_on_save(sender, instance, raw=False, **kwargs):
+    """Count the new image as used, and release the replaced one"""
+    if not raw:
+        media.update_references(instance)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_delete, sender=Ingredient)
+def update_media_references_on_delete(sender, instance, **kwargs):
+    media.update_references(instance, deleted=True)
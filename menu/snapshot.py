@@ -0,0 +1,137 @@
+"""
+Pre-serialized snapshot of the whole active menu for mobile cold starts.
+
+The snapshot is rendered once per menu version and language into compact
+JSON plus a gzip copy, and kept both in this process and in the shared
+cache so that unchanged clients can be answered with 304 without touching
+the database.
+"""
+import gzip
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .cache import get_version
+from .models import Category, MenuItem, MenuItemIngredient, Customization
+from .translations import TranslationRegistry, content_language, translatable_objects
+
+SNAPSHOT_KEY = 'menu:snapshot:{}:{}'
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+# Last snapshot built or fetched by this process, per language
+_process_snapshot = {}
+
+
+def build_menu_snapshot_data(language=None):
+    """Collect the active menu as plain data in a fixed number of queries, translated into `language`"""
+    items = MenuItem.objects.filter(is_available=True).prefetch_related(
+        Prefetch('ingredients', queryset=MenuItemIngredient.objects.select_related('ingredient')),
+        Prefetch('customizations', queryset=Customization.objects.filter(is_active=True)),
+    ).order_by('order', 'name')
+    categories = Category.objects.filter(is_active=True).prefetch_related(
+        Prefetch('items', queryset=items)
+    )
+
+    categories = list(categories)
+    if language is None:
+        text = getattr
+    else:
+        # Category, items, ingredient links, ingredients
+        text = TranslationRegistry.load(translatable_objects(categories, depth=3), language).text
+
+    customizations = {}
+    category_data = []
+    for category in categories:
+        item_data = []
+        for item in category.items.all():
+            ingredients = list(item.ingredients.all())
+            for customization in item.customizations.all():
+                customizations[customization.id] = customization
+            item_data.append({
+                'id': item.id,
+                'name': text(item, 'name'),
+                'description': text(item, 'description'),
+                'price': item.price,
+                'image': item.image.url if item.image else None,
+                'video_thumbnail': item.video_thumbnail.url if item.video_thumbnail else None,
+                'spice_level': item.spice_level,
+                'is_vegetarian': item.is_vegetarian,
+                'is_vegan': item.is_vegan,
+                'is_gluten_free': item.is_gluten_free,
+                'contains_nuts': item.contains_nuts,
+                'is_featured': item.is_featured,
+                'preparation_time': item.preparation_time,
+                'calories': item.calories,
+                'order': item.order,
+                'ingredients': [
+                    {
+                        'id': link.ingredient_id,
+                        'name': text(link.ingredient, 'name'),
+                        'quantity': link.quantity,
+                        'is_optional': link.is_optional,
+                        'is_allergen': link.ingredient.is_allergen,
+                    }
+                    for link in ingredients
+                ],
+                'allergens': [text(link.ingredient, 'name') for link in ingredients if link.ingredient.is_allergen],
+                'customization_ids': [customization.id for customization in item.customizations.all()],
+            })
+        category_data.append({
+            'id': category.id,
+            'name': text(category, 'name'),
+            'description': text(category, 'description'),
+            'image': category.image.url if category.image else None,
+            'order': category.order,
+            'items': item_data,
+        })
+
+    return {
+        'categories': category_data,
+        'customizations': [
+            {
+                'id': customization.id,
+                'name': customization.name,
+                'customization_type': customization.customization_type,
+                'price_modifier': customization.price_modifier,
+            }
+            for customization in sorted(
+                customizations.values(), key=lambda c: (c.customization_type, c.name)
+            )
+        ],
+    }
+
+
+def render_menu_snapshot(version, language=None):
+    """Serialize the menu once into the bytes served to clients"""
+    data = {'version': version}
+    data.update(build_menu_snapshot_data(language))
+    body = json.dumps(
+        data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+    return {
+        'version': version,
+        'etag': '"%s"' % hashlib.sha256(body).hexdigest()[:32],
+        'body': body,
+        'gzip_body': gzip.compress(body, compresslevel=6, mtime=0),
+    }
+
+
+def get_menu_snapshot():
+    """Return the snapshot for the current menu version and language, building it at most once"""
+    version = get_version('menu')
+    language = content_language()
+    snapshot = _process_snapshot.get(language)
+    if snapshot is not None and snapshot['version'] == version:
+        return snapshot
+
+    key = SNAPSHOT_KEY.format(version, language or settings.LANGUAGE_CODE)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = render_menu_snapshot(version, language)
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    _process_snapshot[language] = snapshot
+    return snapshot
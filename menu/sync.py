@@ -0,0 +1,153 @@
+"""
+Change feed for mobile clients.
+
+Upserts (from the models' updated_at) and deletions (from SyncTombstone)
+are merged into one stream ordered by (timestamp, stream rank, id). The
+cursor handed to clients is the position of the last change they
+received, so paging stays monotonic even when many rows share a timestamp.
+
+updated_at is set when a row is saved, not when its transaction commits,
+so a slow transaction can commit a row behind a cursor already handed out.
+The last page's cursor therefore never passes COMMIT_LAG before now: the
+changes of the last few seconds are sent again on the next sync, and
+clients apply them idempotently.
+
+Rows are serialized in the request's language. Saving or deleting a
+translation touches the row it translates, which is then sent again.
+"""
+import base64
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.db.models import Count, Prefetch, Q
+from django.utils import timezone
+
+from .models import (
+    Category, MenuItem, Ingredient, MenuItemIngredient,
+    Customization, Branch, SyncTombstone
+)
+from .serializers import (
+    CategorySerializer, MenuItemSyncSerializer, IngredientSerializer,
+    CustomizationSyncSerializer, BranchSerializer
+)
+
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+# Longest a transaction may take to commit a change without it being missed
+COMMIT_LAG = timedelta(seconds=5)
+
+SyncStream = namedtuple('SyncStream', ['name', 'model', 'timestamp_field', 'get_queryset', 'serializer_class'])
+
+# Order matters: it is the tie-breaker between streams in the cursor
+SYNC_STREAMS = [
+    SyncStream(
+        'category', Category, 'updated_at',
+        lambda: Category.objects.annotate(
+            available_item_count=Count('items', filter=Q(items__is_available=True))
+        ),
+        CategorySerializer,
+    ),
+    SyncStream(
+        'ingredient', Ingredient, 'updated_at',
+        lambda: Ingredient.objects.all(),
+        IngredientSerializer,
+    ),
+    SyncStream(
+        'customization', Customization, 'updated_at',
+        lambda: Customization.objects.prefetch_related('menu_items'),
+        CustomizationSyncSerializer,
+    ),
+    SyncStream(
+        'menu_item', MenuItem, 'updated_at',
+        lambda: MenuItem.objects.select_related('category').prefetch_related(
+            Prefetch('ingredients', queryset=MenuItemIngredient.objects.select_related('ingredient')),
+            'customizations',
+        ),
+        MenuItemSyncSerializer,
+    ),
+    SyncStream(
+        'branch', Branch, 'updated_at',
+        lambda: Branch.objects.all(),
+        BranchSerializer,
+    ),
+    SyncStream(
+        'deleted', SyncTombstone, 'deleted_at',
+        lambda: SyncTombstone.objects.all(),
+        None,
+    ),
+]
+
+SYNC_TYPE_NAMES = {stream.model: stream.name for stream in SYNC_STREAMS if stream.serializer_class}
+
+
+def encode_cursor(position):
+    timestamp, rank, pk = position
+    raw = f'{timestamp.isoformat()}|{rank}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (timestamp, rank, pk) position of a cursor, or raise ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, rank, pk = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(rank), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Invalid sync cursor') from e
+
+
+def after_position(rank, field, position):
+    """Filter for the rows of one stream that come after a cursor position"""
+    if position is None:
+        return Q()
+    timestamp, cursor_rank, pk = position
+    if rank < cursor_rank:
+        return Q(**{f'{field}__gt': timestamp})
+    if rank == cursor_rank:
+        return Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk})
+    return Q(**{f'{field}__gte': timestamp})
+
+
+def get_changes(cursor=None, limit=DEFAULT_LIMIT, context=None):
+    """
+    Return the next `limit` changes after `cursor` (or from the beginning)
+    together with the cursor to resume from
+    """
+    position = decode_cursor(cursor) if cursor else None
+
+    candidates = []
+    for rank, stream in enumerate(SYNC_STREAMS):
+        field = stream.timestamp_field
+        rows = (
+            stream.get_queryset()
+            .filter(after_position(rank, field, position))
+            .order_by(field, 'pk')[:limit + 1]
+        )
+        candidates.extend((getattr(row, field), rank, row.pk, row) for row in rows)
+    candidates.sort(key=lambda candidate: candidate[:3])
+    page = candidates[:limit]
+    has_more = len(candidates) > limit
+    next_position = page[-1][:3] if page else position
+    # Rank -1 comes before every stream: resume at the start of the lag
+    lag_position = (timezone.now() - COMMIT_LAG, -1, 0)
+    if not has_more and next_position is not None and next_position > lag_position:
+        next_position = lag_position
+
+    changes = []
+    for timestamp, rank, pk, row in page:
+        stream = SYNC_STREAMS[rank]
+        if stream.serializer_class is None:
+            changes.append({'type': row.object_type, 'id': row.object_id, 'deleted': True})
+        else:
+            changes.append({
+                'type': stream.name,
+                'id': row.pk,
+                'deleted': False,
+                'data': stream.serializer_class(row, context=context).data,
+            })
+
+    return {
+        'changes': changes,
+        'cursor': encode_cursor(next_position) if next_position else None,
+        'has_more': has_more,
+    }
@@ -0,0 +1,41 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, renditions=None, sizes='100vw', alt='', css_class='', style='', loading='lazy'):
+    """
+    <picture> offering the WebP renditions of an image, with the JPEG ones
+    as fallback, for the browser to pick the smallest that fits `sizes`.
+    `image` is an image field value looked up in `renditions` (a
+    RenditionRegistry), or the cached data of RenditionRegistry.picture().
+
+        {% picture item.image renditions sizes="(min-width: 768px) 50vw, 100vw" alt=item.name %}
+    """
+    if renditions is not None:
+        data = renditions.picture(image)
+        renditions.queue_missing()
+    else:
+        data = image
+    if not data:
+        return ''
+
+    srcset = data['srcset']
+    img = format_html('<img{}>', flatatt({
+        'src': data['src'],
+        'srcset': srcset['jpeg'] or None,
+        'sizes': sizes if srcset['jpeg'] else None,
+        'alt': alt,
+        'class': css_class or None,
+        'style': style or None,
+        'loading': loading or None,
+        'decoding': 'async',
+    }))
+    if not srcset['webp']:
+        return img
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">{}</picture>', srcset['webp'], sizes, img
+    )
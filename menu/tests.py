@@ -1,9 +1,39 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from decimal import Decimal
-from .models import Category, MenuItem, Ingredient, Review, RestaurantInfo
+from PIL import Image
+from . import bulk, gltf, images, model_variants
+from .cache import get_version
+from .management.commands.dedupe_media import move_copies
+from .model_variants import variants_for
+from .kitchen import build_schedule
+from .models import (
+    Category, MenuItem, Ingredient, MenuItemIngredient,
+    Customization, Review, RestaurantInfo, Branch, Order, SyncTombstone, ImageRendition, MediaFile,
+    ModelVariant, Translation, RESTAURANT_INFO_CACHE_TTL
+)
 
 
 class CategoryModelTest(TestCase):
@@ -61,6 +91,7 @@ class CategoryAPITest(APITestCase):
     """Test Category API endpoints"""
     
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.category = Category.objects.create(
             name="Appetizers",
@@ -173,6 +204,7 @@ class RestaurantInfoAPITest(APITestCase):
     """Test RestaurantInfo API endpoints"""
     
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.restaurant_info = RestaurantInfo.objects.create(
             name="Test Restaurant",
@@ -188,3 +220,1627 @@ class RestaurantInfoAPITest(APITestCase):
         response = self.client.get('/api/restaurant-info/current/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], "Test Restaurant")
+    
+    def test_get_solo_is_cached_until_saved(self):
+        """Test the singleton is read once per process until its version is bumped"""
+        self.assertEqual(RestaurantInfo.get_solo(), self.restaurant_info)
+        with self.assertNumQueries(0):
+            RestaurantInfo.get_solo()
+        self.restaurant_info.name = "Renamed Restaurant"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant_info.save()
+        self.assertEqual(RestaurantInfo.get_solo().name, "Renamed Restaurant")
+    
+    def test_get_solo_expires(self):
+        """Test a change that bumped no version is picked up after the TTL"""
+        RestaurantInfo.get_solo()
+        RestaurantInfo.objects.update(name="Updated Elsewhere")
+        self.assertEqual(RestaurantInfo.get_solo().name, "Test Restaurant")
+        later = time.monotonic() + RESTAURANT_INFO_CACHE_TTL + 1
+        with mock.patch('menu.models.time.monotonic', return_value=later):
+            self.assertEqual(RestaurantInfo.get_solo().name, "Updated Elsewhere")
+
+
+class RatingAggregateTest(TestCase):
+    """Test stored rating aggregates on MenuItem and Branch"""
+    
+    def setUp(self):
+        self.category = Category.objects.create(name="Pizzas", order=1)
+        self.menu_item = MenuItem.objects.create(
+            name="Diavola",
+            description="Spicy salami",
+            category=self.category,
+            price=Decimal('11.50')
+        )
+        self.branch = Branch.objects.create(name="Centro", address="Via Roma 1", city="Napoli")
+    
+    def create_review(self, rating, is_approved=True, **kwargs):
+        kwargs.setdefault('menu_item', self.menu_item)
+        return Review.objects.create(
+            category='product',
+            customer_name="Guest",
+            rating=rating,
+            is_approved=is_approved,
+            **kwargs
+        )
+    
+    def assertRating(self, obj, rating_sum, rating_count, rating_avg):
+        obj.refresh_from_db()
+        self.assertEqual(obj.rating_sum, rating_sum)
+        self.assertEqual(obj.rating_count, rating_count)
+        if rating_avg is None:
+            self.assertIsNone(obj.rating_avg)
+        else:
+            self.assertAlmostEqual(obj.rating_avg, rating_avg)
+    
+    def test_only_approved_reviews_are_counted(self):
+        """Test pending reviews do not affect the aggregates"""
+        self.create_review(5)
+        self.create_review(1, is_approved=False)
+        self.assertRating(self.menu_item, 5, 1, 5.0)
+    
+    def test_approve_and_reject_single_review(self):
+        """Test toggling approval on a saved review"""
+        review = self.create_review(4, is_approved=False)
+        review.is_approved = True
+        review.save()
+        self.assertRating(self.menu_item, 4, 1, 4.0)
+        review.is_approved = False
+        review.save()
+        self.assertRating(self.menu_item, 0, 0, None)
+    
+    def test_rating_change_and_delete(self):
+        """Test editing and deleting an approved review"""
+        first = self.create_review(5)
+        self.create_review(2)
+        first.rating = 3
+        first.save()
+        self.assertRating(self.menu_item, 5, 2, 2.5)
+        first.delete()
+        self.assertRating(self.menu_item, 2, 1, 2.0)
+    
+    def test_bulk_approval(self):
+        """Test queryset approval used by the admin actions"""
+        self.create_review(4, is_approved=False)
+        self.create_review(2, is_approved=False, menu_item=None, branch=self.branch)
+        self.assertEqual(Review.objects.set_approved(True), 2)
+        self.assertRating(self.menu_item, 4, 1, 4.0)
+        self.assertRating(self.branch, 2, 1, 2.0)
+        self.assertEqual(Review.objects.set_approved(True), 0)
+        Review.objects.filter(branch=self.branch).set_approved(False)
+        self.assertRating(self.branch, 0, 0, None)
+        self.assertRating(self.menu_item, 4, 1, 4.0)
+    
+    def test_rebuild_rating_aggregates(self):
+        """Test recomputing aggregates from the reviews table"""
+        self.create_review(5)
+        self.create_review(4)
+        MenuItem.objects.update(rating_sum=0, rating_count=0, rating_avg=None)
+        MenuItem.rebuild_rating_aggregates()
+        self.assertRating(self.menu_item, 9, 2, 4.5)
+    
+    def test_serializer_reads_stored_rating(self):
+        """Test the API exposes the stored average"""
+        self.create_review(5)
+        self.create_review(4)
+        response = APIClient().get(f'/api/menu-items/{self.menu_item.id}/')
+        self.assertEqual(response.data['average_rating'], 4.5)
+        self.assertEqual(response.data['review_count'], 2)
+
+
+class ListQueryCountTest(APITestCase):
+    """Test list endpoints run a constant number of queries"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+    
+    def create_menu(self, categories, items_per_category):
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(categories):
+                category = Category.objects.create(name=f"Category {Category.objects.count()}", order=index)
+                for item_index in range(items_per_category):
+                    menu_item = MenuItem.objects.create(
+                        name=f"Item {item_index}",
+                        description="Test",
+                        category=category,
+                        price=Decimal('9.00'),
+                        is_available=item_index % 2 == 0
+                    )
+                    Review.objects.create(
+                        category='product', menu_item=menu_item,
+                        customer_name="Guest", rating=4, is_approved=True
+                    )
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+    
+    def test_category_list_query_count(self):
+        """Test category item counts are annotated"""
+        self.create_menu(2, 3)
+        small = self.count_queries('/api/categories/')
+        self.create_menu(5, 3)
+        self.assertEqual(self.count_queries('/api/categories/'), small)
+        response = self.client.get('/api/categories/')
+        self.assertEqual(json.loads(response.content)['results'][0]['item_count'], 2)
+    
+    def test_menu_item_list_query_count(self):
+        """Test menu item ratings do not add per-row queries"""
+        self.create_menu(1, 2)
+        small_items = self.count_queries('/api/menu-items/')
+        small_reviews = self.count_queries('/api/reviews/')
+        self.create_menu(3, 5)
+        self.assertEqual(self.count_queries('/api/menu-items/'), small_items)
+        self.assertEqual(self.count_queries('/api/reviews/'), small_reviews)
+
+
+class MenuItemDetailQueryTest(APITestCase):
+    """Test the menu item detail endpoint is served from prefetched data"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Pizzas", order=1)
+        self.menu_item = MenuItem.objects.create(
+            name="Capricciosa",
+            description="Ham, mushrooms, artichokes",
+            category=self.category,
+            price=Decimal('13.00')
+        )
+        MenuItem.objects.create(
+            name="Marinara", description="Tomato, garlic", category=self.category,
+            price=Decimal('8.00'), is_available=False
+        )
+        for name in ["Ham", "Mushrooms", "Artichokes"]:
+            MenuItemIngredient.objects.create(
+                menu_item=self.menu_item,
+                ingredient=Ingredient.objects.create(name=name)
+            )
+        for name in ["Large", "Extra cheese"]:
+            Customization.objects.create(
+                name=name, customization_type='extra'
+            ).menu_items.add(self.menu_item)
+        for rating in range(1, 8):
+            Review.objects.create(
+                category='product', menu_item=self.menu_item,
+                customer_name=f"Guest {rating}", rating=min(rating, 5), is_approved=True
+            )
+    
+    def test_detail_query_count(self):
+        """Test detail uses a fixed number of queries"""
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/menu-items/{self.menu_item.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['ingredients']), 3)
+        self.assertEqual(len(response.data['customizations']), 2)
+        self.assertEqual(len(response.data['reviews']), 5)
+        self.assertEqual(response.data['category']['item_count'], 1)
+        self.assertEqual(response.data['review_count'], 7)
+
+
+class MenuSnapshotAPITest(APITestCase):
+    """Test the full menu snapshot endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Pizzas", order=1)
+        self.menu_item = MenuItem.objects.create(
+            name="Margherita",
+            description="Tomato, mozzarella, basil",
+            category=self.category,
+            price=Decimal('9.50')
+        )
+        MenuItemIngredient.objects.create(
+            menu_item=self.menu_item,
+            ingredient=Ingredient.objects.create(name="Mozzarella", is_allergen=True)
+        )
+        MenuItem.objects.create(
+            name="Hidden", description="Unavailable", category=self.category,
+            price=Decimal('1.00'), is_available=False
+        )
+    
+    def test_snapshot_content(self):
+        """Test snapshot contains active items with allergen flags"""
+        response = self.client.get('/api/menu/snapshot/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        items = data['categories'][0]['items']
+        self.assertEqual([item['name'] for item in items], ["Margherita"])
+        self.assertEqual(items[0]['allergens'], ["Mozzarella"])
+        self.assertEqual(items[0]['price'], "9.50")
+    
+    def test_not_modified_without_queries(self):
+        """Test a matching ETag returns 304 without database access"""
+        etag = self.client.get('/api/menu/snapshot/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/menu/snapshot/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_menu_change_invalidates_snapshot(self):
+        """Test saving a menu item changes the ETag"""
+        etag = self.client.get('/api/menu/snapshot/')['ETag']
+        self.menu_item.price = Decimal('10.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.save()
+        response = self.client.get('/api/menu/snapshot/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_gzip_body(self):
+        """Test gzip clients receive the precompressed body"""
+        response = self.client.get('/api/menu/snapshot/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['categories'][0]['name'], "Pizzas")
+        
+        # Each encoding has its own ETag, and q=0 refuses gzip
+        identity = self.client.get('/api/menu/snapshot/', HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertFalse(identity.has_header('Content-Encoding'))
+        self.assertEqual(response['ETag'], identity['ETag'][:-1] + '-gzip"')
+        revalidated = self.client.get(
+            '/api/menu/snapshot/', HTTP_ACCEPT_ENCODING='identity', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(revalidated.status_code, status.HTTP_200_OK)
+
+
+class SyncChangesAPITest(APITestCase):
+    """Test the delta sync change feed"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Pasta", order=1)
+        self.items = [
+            MenuItem.objects.create(
+                name=f"Pasta {index}", description="Test",
+                category=self.category, price=Decimal('10.00')
+            )
+            for index in range(5)
+        ]
+        # Older than the commit lag, so a caught-up cursor stays after them
+        self.synced_at = timezone.now() - timedelta(minutes=1)
+        Category.objects.update(updated_at=self.synced_at)
+        MenuItem.objects.update(updated_at=self.synced_at)
+    
+    def sync(self, since=None, limit=None):
+        params = {}
+        if since:
+            params['since'] = since
+        if limit:
+            params['limit'] = limit
+        response = self.client.get('/api/sync/changes/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_paging_through_full_sync(self):
+        """Test pages cover every object exactly once"""
+        seen = []
+        data = {'cursor': None, 'has_more': True}
+        while data['has_more']:
+            data = self.sync(data['cursor'], limit=2)
+            seen.extend((change['type'], change['id']) for change in data['changes'])
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(
+            sorted(seen),
+            sorted([('category', self.category.id)] + [('menu_item', item.id) for item in self.items])
+        )
+        self.assertEqual(self.sync(data['cursor'])['changes'], [])
+    
+    def test_updates_and_deletions_after_cursor(self):
+        """Test only later changes are returned, including tombstones"""
+        cursor = self.sync()['cursor']
+        self.items[0].price = Decimal('12.00')
+        self.items[0].save()
+        deleted_id = self.items[1].id
+        self.items[1].delete()
+        changes = self.sync(cursor)['changes']
+        self.assertEqual(
+            [(change['type'], change['id'], change['deleted']) for change in changes],
+            [('menu_item', self.items[0].id, False), ('menu_item', deleted_id, True)]
+        )
+        self.assertEqual(changes[0]['data']['price'], '12.00')
+    
+    def test_link_changes_touch_items(self):
+        """Test ingredient and customization links re-send the item"""
+        cursor = self.sync()['cursor']
+        MenuItemIngredient.objects.create(
+            menu_item=self.items[2], ingredient=Ingredient.objects.create(name="Garlic")
+        )
+        customization = Customization.objects.create(name="Extra parmesan", customization_type='extra')
+        customization.menu_items.add(self.items[3])
+        changes = {(change['type'], change['id']): change for change in self.sync(cursor)['changes']}
+        self.assertIn(('menu_item', self.items[2].id), changes)
+        self.assertEqual(changes[('menu_item', self.items[3].id)]['data']['customization_ids'], [customization.id])
+        self.assertEqual(changes[('customization', customization.id)]['data']['menu_items'], [self.items[3].id])
+    
+    def test_late_commit_is_not_missed(self):
+        """Test a change committed after a later one was synced is still sent"""
+        self.items[0].save()
+        cursor = self.sync()['cursor']
+        # Saved before items[0] by a transaction that committed after the sync
+        MenuItem.objects.filter(pk=self.items[1].pk).update(
+            updated_at=MenuItem.objects.get(pk=self.items[0].pk).updated_at - timedelta(milliseconds=1)
+        )
+        ids = [change['id'] for change in self.sync(cursor)['changes']]
+        self.assertIn(self.items[1].id, ids)
+        # Once older than the lag, caught-up clients get nothing again
+        with mock.patch('menu.sync.COMMIT_LAG', timedelta(0)):
+            cursor = self.sync(cursor)['cursor']
+            self.assertEqual(self.sync(cursor)['changes'], [])
+    
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get('/api/sync/changes/', {'since': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MenuSearchTest(APITestCase):
+    """Test full-text search on menu items"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        pizzas = Category.objects.create(name="Pizzas", order=1)
+        desserts = Category.objects.create(name="Desserts", order=2)
+        self.margherita = MenuItem.objects.create(
+            name="Margherita", description="Tomatoes, mozzarella and basil",
+            category=pizzas, price=Decimal('9.00')
+        )
+        self.bufala = MenuItem.objects.create(
+            name="Bufala", description="Buffalo mozzarella, margherita style",
+            category=pizzas, price=Decimal('12.00')
+        )
+        self.tiramisu = MenuItem.objects.create(
+            name="Tiramisu", description="Mascarpone and coffee",
+            category=desserts, price=Decimal('6.00')
+        )
+    
+    def search(self, query):
+        response = self.client.get('/api/menu-items/search/', {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.data]
+    
+    def test_name_matches_rank_first(self):
+        """Test name matches outrank description matches"""
+        self.assertEqual(self.search("margherita"), ["Margherita", "Bufala"])
+    
+    def test_prefix_and_stemmed_matching(self):
+        """Test type-ahead prefixes and stemmed words match"""
+        self.assertEqual(self.search("tira"), ["Tiramisu"])
+        self.assertEqual(self.search("tomato"), ["Margherita"])
+    
+    def test_multiple_terms_and_category(self):
+        """Test all terms must match, including the category name"""
+        self.assertEqual(sorted(self.search("pizzas mozz")), ["Bufala", "Margherita"])
+        self.assertEqual(self.search("dessert coffee"), ["Tiramisu"])
+    
+    def test_index_follows_updates(self):
+        """Test renamed and deleted items are reflected"""
+        self.tiramisu.name = "Panna cotta"
+        self.tiramisu.save()
+        self.assertEqual(self.search("panna"), ["Panna cotta"])
+        self.tiramisu.delete()
+        self.assertEqual(self.search("panna"), [])
+    
+    def test_operators_are_ignored(self):
+        """Test search syntax in user input is treated as text"""
+        self.assertEqual(self.search('"margherita" * -'), ["Margherita", "Bufala"])
+        self.assertEqual(self.search('"*'), [])
+
+
+class AutocompleteAPITest(APITestCase):
+    """Test typo-tolerant autocomplete"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.pizzas = Category.objects.create(name="Pizzas", order=1)
+        self.diavola = MenuItem.objects.create(
+            name="Diavola", description="Spicy salami", category=self.pizzas, price=Decimal('11.00')
+        )
+        MenuItem.objects.create(
+            name="Margherita", description="Classic", category=self.pizzas, price=Decimal('9.00')
+        )
+        Ingredient.objects.create(name="Mozzarella di bufala")
+    
+    def suggest(self, query):
+        response = self.client.get('/api/menu-items/autocomplete/', {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(suggestion['type'], suggestion['name']) for suggestion in response.data]
+    
+    def test_typos_and_prefixes(self):
+        """Test misspelled and partial names find the right entries"""
+        self.assertEqual(self.suggest("diavolla")[0], ('menu_item', "Diavola"))
+        self.assertEqual(self.suggest("margarita")[0], ('menu_item', "Margherita"))
+        self.assertEqual(self.suggest("mozar")[0], ('ingredient', "Mozzarella di bufala"))
+        self.assertEqual(self.suggest("piz")[0], ('category', "Pizzas"))
+    
+    def test_served_without_queries(self):
+        """Test lookups after the first one do not touch the database"""
+        self.suggest("diavola")
+        with self.assertNumQueries(0):
+            self.suggest("tiramisu")
+    
+    def test_index_follows_saves(self):
+        """Test saved and hidden items update the built index"""
+        self.suggest("diavola")
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(
+                name="Tiramisu", description="Dessert", category=self.pizzas, price=Decimal('6.00')
+            )
+            self.diavola.is_available = False
+            self.diavola.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest("tiramsu"), [('menu_item', "Tiramisu")])
+            self.assertNotIn(('menu_item', "Diavola"), self.suggest("diavola"))
+
+
+class KeysetPaginationTest(APITestCase):
+    """Test opt-in cursor pagination"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name="Antipasti", order=1)
+        self.menu_item = MenuItem.objects.create(
+            name="Bruschetta", description="Toasted bread", category=category, price=Decimal('5.00')
+        )
+        self.reviews = [
+            Review.objects.create(
+                category='product', menu_item=self.menu_item,
+                customer_name=f"Guest {index}", rating=5, is_approved=True
+            )
+            for index in range(7)
+        ]
+        # Shared timestamps must not lose or repeat rows
+        Review.objects.filter(pk__in=[review.pk for review in self.reviews[2:5]]).update(
+            created_at=self.reviews[2].created_at
+        )
+    
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(review['id'] for review in response.data['results'])
+            url = response.data['next']
+        return ids
+    
+    def test_review_list_cursor_pages(self):
+        """Test walking all keyset pages of the review list"""
+        ids = self.collect('/api/reviews/?cursor=&page_size=2')
+        expected = list(Review.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+    
+    def test_reviews_action_cursor_pages(self):
+        """Test the menu item reviews action pages with a cursor"""
+        ids = self.collect(f'/api/menu-items/{self.menu_item.id}/reviews/?cursor=&page_size=3')
+        self.assertEqual(sorted(ids), sorted(review.id for review in self.reviews))
+    
+    def test_page_number_mode_is_default(self):
+        """Test existing clients keep page-number responses"""
+        response = self.client.get('/api/reviews/')
+        self.assertEqual(response.data['count'], 7)
+        response = self.client.get(f'/api/menu-items/{self.menu_item.id}/reviews/')
+        self.assertEqual(len(response.data), 7)
+    
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get('/api/reviews/?cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_cursor_pages_have_a_fixed_order(self):
+        """Test a cursor with another ?ordering= is rejected, not silently ignored"""
+        response = self.client.get('/api/menu-items/?cursor=&ordering=price')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response.data)
+        response = self.client.get('/api/menu-items/?cursor=&ordering=-created_at')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/menu-items/?ordering=price').status_code, status.HTTP_200_OK)
+
+
+class ResponseCacheTest(APITestCase):
+    """Test the response cache of read-only endpoints"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Pizzas", order=1)
+        self.branch = Branch.objects.create(name="Centro", address="Via Roma 1", city="Napoli")
+    
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+    
+    def test_repeated_get_is_served_from_cache(self):
+        """Test the second identical request runs no queries"""
+        first = self.get('/api/categories/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.get('/api/categories/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+    
+    def test_key_varies_on_query_and_language(self):
+        """Test query string and Accept-Language get separate entries"""
+        self.get('/api/categories/')
+        self.assertEqual(self.get('/api/categories/?ordering=name')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/categories/', HTTP_ACCEPT_LANGUAGE='it')['X-Cache'], 'MISS')
+        self.assertEqual(self.get('/api/categories/', HTTP_ACCEPT_LANGUAGE='it')['X-Cache'], 'HIT')
+    
+    def test_signals_invalidate_affected_resources_only(self):
+        """Test a save only invalidates the resources built from that model"""
+        self.get('/api/categories/')
+        self.get('/api/branches/')
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(
+                name="Marinara", description="Tomato", category=self.category, price=Decimal('7.00')
+            )
+        response = self.get('/api/categories/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(response.content)['results'][0]['item_count'], 1)
+        self.assertEqual(self.get('/api/branches/')['X-Cache'], 'HIT')
+    
+    def test_versions_bumped_on_commit(self):
+        """Test readers inside the writer's transaction keep the old version"""
+        version = get_version('categories')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Pizze"
+            self.category.save()
+            self.assertEqual(get_version('categories'), version)
+        self.assertNotEqual(get_version('categories'), version)
+    
+    def test_rating_changes_invalidate_branches(self):
+        """Test approving a branch review refreshes the branch list"""
+        self.get('/api/branches/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(
+                category='branch', branch=self.branch, customer_name="Guest", rating=4, is_approved=True
+            )
+        response = self.get('/api/branches/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(response.content)['results'][0]['review_count'], 1)
+    
+    def test_stats_endpoint(self):
+        """Test hit/miss counters are exposed to staff"""
+        self.get('/api/ingredients/allergens/')
+        self.get('/api/ingredients/allergens/')
+        self.assertEqual(self.client.get('/api/cache/stats/').status_code, status.HTTP_403_FORBIDDEN)
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_authenticate(staff)
+        response = self.client.get('/api/cache/stats/')
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class MenuPageTest(TestCase):
+    """Test the HTML menu page"""
+    
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Pizzas", order=1)
+        self.item = MenuItem.objects.create(
+            name="Margherita", description="Classic", category=self.category, price=Decimal('9.00')
+        )
+        MenuItem.objects.create(
+            name="Seasonal", description="Sold out", category=self.category,
+            price=Decimal('12.00'), is_available=False
+        )
+        Review.objects.create(menu_item=self.item, customer_name="Guest", rating=4, is_approved=True)
+    
+    def test_lists_available_items_with_stored_ratings(self):
+        """Test unavailable items are hidden and ratings come from the item row"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/en/menu/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Margherita")
+        self.assertNotContains(response, "Seasonal")
+        self.assertContains(response, 'data-rating="4.0"')
+        self.assertFalse(any('menu_review' in query['sql'] for query in queries.captured_queries))
+    
+    def test_fragment_is_cached_until_menu_changes(self):
+        """Test a repeat render skips the menu queries until the menu version is bumped"""
+        self.client.get('/en/menu/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/en/menu/')
+        self.assertFalse(any('menu_menuitem' in query['sql'] for query in queries.captured_queries))
+        
+        self.item.name = "Margherita DOP"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save()
+        self.assertContains(self.client.get('/en/menu/'), "Margherita DOP")
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class HomePageTest(TestCase):
+    """Test the cached homepage"""
+    
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Pizzas", order=1)
+        self.item = MenuItem.objects.create(
+            name="Margherita", description="Classic", category=category,
+            price=Decimal('9.00'), is_featured=True
+        )
+        self.review = Review.objects.create(
+            category='product', menu_item=self.item, customer_name="Guest",
+            comment="Lovely crust", rating=5, is_approved=True
+        )
+    
+    def test_context_is_built_once(self):
+        """Test a repeat visit reads the homepage context from the cache"""
+        response = self.client.get('/en/')
+        self.assertContains(response, "Lovely crust")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/en/')
+        self.assertFalse(any('menu_' in query['sql'] for query in queries.captured_queries))
+    
+    def test_review_changes_refresh_context(self):
+        """Test editing or rejecting a review rebuilds the homepage"""
+        self.client.get('/en/')
+        self.review.comment = "Perfect crust"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review.save()
+        self.assertContains(self.client.get('/en/'), "Perfect crust")
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(pk=self.review.pk).set_approved(False)
+        self.assertNotContains(self.client.get('/en/'), "Perfect crust")
+    
+    @override_settings(HOMEPAGE_PAGE_CACHE=True)
+    def test_anonymous_page_cache(self):
+        """Test anonymous visitors get a cached render and staff never do"""
+        self.assertEqual(self.client.get('/en/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/en/')['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/de/')['X-Cache'], 'MISS')
+        
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get('/en/')
+        self.assertFalse(response.has_header('X-Cache'))
+        self.assertContains(response, "staff")
+
+
+class OrderAPITest(APITestCase):
+    """Test placing and looking up orders"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        RestaurantInfo.objects.create(
+            name="Napoli", description="Pizza", phone="+4912345678", email="info@napoli.com",
+            address="Via Roma 1", opening_hours="Mon-Sun", tax_rate=Decimal('10.00')
+        )
+        category = Category.objects.create(name="Pizzas", order=1)
+        self.pizza = MenuItem.objects.create(
+            name="Margherita", description="Classic", category=category, price=Decimal('9.00')
+        )
+        self.sold_out = MenuItem.objects.create(
+            name="Seasonal", description="Sold out", category=category,
+            price=Decimal('12.00'), is_available=False
+        )
+        self.burrata = Customization.objects.create(
+            name="Burrata", customization_type='extra', price_modifier=Decimal('3.50')
+        )
+        self.burrata.menu_items.add(self.pizza)
+        self.order_data = {
+            'order_type': 'delivery',
+            'customer_name': "Guest",
+            'email': "guest@example.com",
+            'phone': "+4912345678",
+            'address': "Via Toledo 10",
+            'payment_method': 'cash',
+        }
+    
+    def test_create_order_snapshots_prices(self):
+        """Test totals come from menu prices, modifiers and the tax rate"""
+        data = dict(self.order_data, items=[
+            {'id': self.pizza.pk, 'quantity': 2, 'price': '9.00', 'customizations': [self.burrata.pk]},
+        ])
+        response = self.client.post('/api/orders/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['lines'][0]['unit_price'], '12.50')
+        self.assertEqual(response.data['subtotal'], '25.00')
+        self.assertEqual(response.data['tax'], '2.50')
+        self.assertEqual(response.data['delivery_fee'], '0.00')
+        self.assertEqual(response.data['total'], '27.50')
+        
+        # Later price changes do not affect the placed order
+        self.pizza.price = Decimal('11.00')
+        self.pizza.save()
+        order = self.client.get(f"/api/orders/{response.data['order_number']}/")
+        self.assertEqual(order.data['total'], '27.50')
+    
+    def test_cart_is_validated_in_bulk(self):
+        """Test each invalid line gets its own error and nothing is written"""
+        data = dict(self.order_data, items=[
+            {'id': self.pizza.pk, 'quantity': 1, 'price': '8.00'},
+            {'id': self.sold_out.pk, 'quantity': 1},
+            {'id': self.pizza.pk, 'quantity': 1},
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('price', response.data['items'][0])
+        self.assertIn('id', response.data['items'][1])
+        self.assertEqual(response.data['items'][2], {})
+        self.assertLessEqual(len(queries), 3)
+        self.assertFalse(Order.objects.exists())
+    
+    def test_session_cart_fallback(self):
+        """Test the session cart is ordered when no items are posted"""
+        session = self.client.session
+        session['cart'] = [{'id': self.pizza.pk, 'quantity': 1}]
+        session.save()
+        response = self.client.post('/api/orders/', dict(self.order_data, order_type='pickup'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['delivery_fee'], '0.00')
+        self.assertNotIn('cart', self.client.session)
+    
+    def test_list_is_staff_only(self):
+        """Test customers can only look orders up by number"""
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_tracking_page(self):
+        """Test the confirmation and tracking pages render the stored order"""
+        data = dict(self.order_data, items=[{'id': self.pizza.pk, 'quantity': 1}])
+        order_number = self.client.post('/api/orders/', data, format='json').data['order_number']
+        self.assertContains(self.client.get(f'/en/order-confirmation/{order_number}/'), "12.89")
+        response = self.client.get(f'/en/order-tracking/{order_number}/')
+        self.assertContains(response, order_number)
+        self.assertContains(response, "Margherita")
+        self.assertEqual(self.client.get('/en/order-tracking/ORDMISSING/').status_code, 404)
+
+
+class OrderEventsTest(TestCase):
+    """Test the order status event stream"""
+    
+    def setUp(self):
+        category = Category.objects.create(name="Pizzas", order=1)
+        pizza = MenuItem.objects.create(
+            name="Margherita", description="Classic", category=category, price=Decimal('9.00')
+        )
+        response = APIClient().post('/api/orders/', {
+            'order_type': 'pickup', 'customer_name': "Guest", 'email': "guest@example.com",
+            'phone': "+4912345678", 'items': [{'id': pizza.pk, 'quantity': 1}],
+        }, format='json')
+        self.order_number = response.data['order_number']
+        self.url = f'/api/orders/{self.order_number}/events/'
+    
+    def set_status(self, order_status):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.get(order_number=self.order_number)
+            order.status = order_status
+            order.save()
+    
+    def test_wsgi_sends_current_status_once(self):
+        """Test non-streaming servers get one event and a retry hint"""
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(b'retry: ', response.content)
+        self.assertIn(b'"status": "confirmed"', response.content)
+        self.assertEqual(self.client.get('/api/orders/ORDMISSING/events/').status_code, 404)
+    
+    async def test_asgi_streams_transitions(self):
+        """Test saved status changes are pushed until the order is final"""
+        response = await self.async_client.get(self.url)
+        chunks = response.streaming_content.__aiter__()
+        first = await asyncio.wait_for(chunks.__anext__(), 5)
+        self.assertIn(b'"status": "confirmed"', first)
+        
+        await sync_to_async(self.set_status)('ready')
+        self.assertIn(b'"status": "ready"', await asyncio.wait_for(chunks.__anext__(), 5))
+        await sync_to_async(self.set_status)('delivered')
+        self.assertIn(b'"status": "delivered"', await asyncio.wait_for(chunks.__anext__(), 5))
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(chunks.__anext__(), 5)
+    
+    @override_settings(ORDER_EVENTS_MAX_AGE=0)
+    async def test_asgi_stream_ends_at_max_age(self):
+        """Test streams of open orders end with a retry hint so idle clients reconnect"""
+        response = await self.async_client.get(self.url)
+        chunks = response.streaming_content.__aiter__()
+        self.assertIn(b'"status": "confirmed"', await asyncio.wait_for(chunks.__anext__(), 5))
+        self.assertEqual(await asyncio.wait_for(chunks.__anext__(), 5), b'retry: 1000\n\n')
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(chunks.__anext__(), 5)
+
+
+class BulkWriteAPITest(APITestCase):
+    """Test bulk create/update/delete for menu management"""
+    
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Pizzas", order=1)
+        self.items = [
+            MenuItem.objects.create(
+                name=f"Pizza {i}", description="Wood-fired", category=self.category, price=Decimal('9.00')
+            )
+            for i in range(30)
+        ]
+    
+    def test_price_changes_in_one_request(self):
+        """Test many updates cost a fixed number of queries"""
+        operations = [{'op': 'update', 'id': item.pk, 'data': {'price': '10.50'}} for item in self.items]
+        before = MenuItem.objects.get(pk=self.items[0].pk).updated_at
+        self.client.get('/api/categories/')
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/menu-items/bulk/', operations, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(queries), 6)
+        self.assertEqual(len(response.data['results']), 30)
+        self.assertEqual(MenuItem.objects.filter(price=Decimal('10.50')).count(), 30)
+        # Set by hand, so the sync feed and cached responses pick the change up
+        self.assertGreater(MenuItem.objects.get(pk=self.items[0].pk).updated_at, before)
+        self.assertEqual(self.client.get('/api/categories/')['X-Cache'], 'MISS')
+    
+    def test_mixed_operations(self):
+        """Test creates, updates and deletes are applied together with their side effects"""
+        self.client.get('/api/menu-items/autocomplete/', {'q': 'pizza'})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/menu-items/bulk/', [
+                {'op': 'create', 'data': {'name': "Calzone", 'description': "Folded", 'category': self.category.pk,
+                                          'price': '12.00'}},
+                {'op': 'update', 'id': self.items[0].pk, 'data': {'name': "Marinara"}},
+                {'op': 'delete', 'id': self.items[1].pk},
+            ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        calzone = MenuItem.objects.get(name="Calzone")
+        self.assertEqual(response.data['results'][0], {'op': 'create', 'id': calzone.pk})
+        self.assertFalse(MenuItem.objects.filter(pk=self.items[1].pk).exists())
+        self.assertTrue(SyncTombstone.objects.filter(object_type='menu_item', object_id=self.items[1].pk).exists())
+        names = [s['name'] for s in self.client.get('/api/menu-items/autocomplete/', {'q': 'calzone'}).data]
+        self.assertIn("Calzone", names)
+    
+    def test_errors_are_reported_per_row(self):
+        """Test one invalid row rejects the whole batch"""
+        response = self.client.post('/api/menu-items/bulk/', [
+            {'op': 'update', 'id': self.items[0].pk, 'data': {'price': '11.00'}},
+            {'op': 'update', 'id': self.items[1].pk, 'data': {'price': 'free'}},
+            {'op': 'delete', 'id': 99999},
+            {'op': 'update', 'id': self.items[0].pk, 'data': {'price': '12.00'}},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('price', errors[1])
+        self.assertIn('id', errors[2])
+        self.assertIn('id', errors[3])
+        self.assertEqual(MenuItem.objects.get(pk=self.items[0].pk).price, Decimal('9.00'))
+        
+        response = self.client.post('/api/categories/bulk/', [{'op': 'update', 'data': {}}], format='json')
+        self.assertIn('id', response.data['errors'][0])
+    
+    @override_settings(IMAGE_PIPELINE_WORKERS=0)
+    def test_created_images_get_renditions(self):
+        """Test bulk-created rows get their renditions like saved ones"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, 'JPEG')
+        with self.settings(MEDIA_ROOT=media_root):
+            path = default_storage.save('menu_items/calzone.jpg', io.BytesIO(buffer.getvalue()))
+            with self.captureOnCommitCallbacks(execute=True):
+                bulk.apply_operations(MenuItem, [
+                    ('create', None, {'name': "Calzone", 'description': "Folded", 'category': self.category,
+                                      'price': Decimal('12.00'), 'image': path}),
+                    ('update', self.items[0], {'price': Decimal('10.00')}),
+                ])
+            self.assertEqual(ImageRendition.objects.filter(source=path).count(), 6)
+
+
+class ReorderAPITest(APITestCase):
+    """Test gap-based reordering of categories and items"""
+    
+    def setUp(self):
+        cache.clear()
+        self.pizzas = Category.objects.create(name="Pizzas", order=1024)
+        self.pasta = Category.objects.create(name="Pasta", order=2048)
+        self.items = [
+            MenuItem.objects.create(
+                name=name, description="Classic", category=self.pizzas,
+                price=Decimal('9.00'), order=(i + 1) * 1024
+            )
+            for i, name in enumerate(["Margherita", "Marinara", "Diavola", "Capricciosa"])
+        ]
+        self.penne = MenuItem.objects.create(
+            name="Penne", description="Arrabbiata", category=self.pasta, price=Decimal('8.00')
+        )
+    
+    def sequence(self):
+        return list(self.pizzas.items.order_by('order', 'name').values_list('name', flat=True))
+    
+    def test_move_writes_one_row(self):
+        """Test moving an item between two others only changes that item"""
+        last = self.items[-1]
+        response = self.client.post(f'/api/menu-items/{last.pk}/move/', {'after': self.items[0].pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['order'], 1536)
+        self.assertEqual(self.sequence(), ["Margherita", "Capricciosa", "Marinara", "Diavola"])
+    
+    def test_move_renumbers_when_out_of_room(self):
+        """Test the list is renumbered once neighbours have no gap left"""
+        MenuItem.objects.filter(pk=self.items[1].pk).update(order=1025)
+        response = self.client.post(
+            f'/api/menu-items/{self.items[3].pk}/move/', {'before': self.items[1].pk}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.sequence(), ["Margherita", "Capricciosa", "Marinara", "Diavola"])
+        self.assertEqual(
+            list(self.pizzas.items.order_by('order').values_list('order', flat=True)), [1024, 2048, 3072, 4096]
+        )
+        
+        response = self.client.post(f'/api/menu-items/{self.items[0].pk}/move/', {'after': self.penne.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_reorder_lists(self):
+        """Test whole lists are reordered with one bulk update of the changed rows"""
+        ids = [item.pk for item in reversed(self.items)]
+        response = self.client.post(f'/api/categories/{self.pizzas.pk}/items/reorder/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(self.sequence(), ["Capricciosa", "Diavola", "Marinara", "Margherita"])
+        
+        response = self.client.post('/api/categories/reorder/', {'ids': [self.pasta.pk, self.pizzas.pk]}, format='json')
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([c['name'] for c in self.client.get('/api/categories/').data['results']], ["Pasta", "Pizzas"])
+        
+        response = self.client.post('/api/categories/reorder/', {'ids': [self.pasta.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(KITCHEN_STATION_CAPACITY={'oven': 1, 'pasta': 1, 'cold': 1}, DELIVERY_MINUTES=15)
+class KitchenQueueTest(APITestCase):
+    """Test kitchen scheduling and the ready times derived from it"""
+    
+    def setUp(self):
+        cache.clear()
+        pizzas = Category.objects.create(name="Pizzas", order=1, kitchen_station='oven')
+        self.pizza = MenuItem.objects.create(
+            name="Margherita", description="Classic", category=pizzas,
+            price=Decimal('9.00'), preparation_time=10
+        )
+        salads = Category.objects.create(name="Salads", order=2, kitchen_station='cold')
+        self.salad = MenuItem.objects.create(
+            name="Caprese", description="Fresh", category=salads,
+            price=Decimal('7.00'), preparation_time=4
+        )
+    
+    def place(self, order_type='pickup'):
+        response = self.client.post('/api/orders/', {
+            'order_type': order_type, 'customer_name': "Guest", 'email': "guest@example.com",
+            'phone': "+4912345678", 'address': "Via Toledo 10",
+            'items': [{'id': self.pizza.pk, 'quantity': 2}, {'id': self.salad.pk, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Order.objects.get(order_number=response.data['order_number'])
+    
+    def test_lines_snapshot_station_and_preparation_time(self):
+        """Test order lines keep the kitchen data of their menu item"""
+        order = self.place()
+        lines = {line.name: line for line in order.lines.all()}
+        self.assertEqual((lines['Margherita'].station, lines['Margherita'].preparation_time), ('oven', 10))
+        self.assertEqual((lines['Caprese'].station, lines['Caprese'].preparation_time), ('cold', 4))
+    
+    def test_dishes_of_an_order_finish_together(self):
+        """Test the shorter dishes start late, and later orders queue behind"""
+        first, second = self.place(), self.place()
+        now = timezone.now()
+        schedule = build_schedule(now)
+        
+        # One oven: the two pizzas bake one after the other
+        self.assertEqual(schedule['orders'][first.order_number]['ready_at'], now + timedelta(minutes=20))
+        self.assertEqual(schedule['orders'][second.order_number]['ready_at'], now + timedelta(minutes=40))
+        salad = next(
+            ticket for ticket in schedule['stations']['cold'] if ticket['order_number'] == first.order_number
+        )
+        self.assertEqual(salad['start_at'], now + timedelta(minutes=16))
+        self.assertEqual(salad['ready_at'], now + timedelta(minutes=20))
+        
+        # Orders in preparation go first
+        second.status = 'preparing'
+        second.save()
+        schedule = build_schedule(now)
+        self.assertLess(
+            schedule['orders'][second.order_number]['ready_at'],
+            schedule['orders'][first.order_number]['ready_at']
+        )
+    
+    def test_order_estimates(self):
+        """Test estimates come from the queue and end with the order"""
+        self.place()
+        order = self.place(order_type='delivery')
+        response = self.client.get(f'/api/orders/{order.order_number}/')
+        # 40 minutes in the kitchen plus 15 on the road
+        self.assertEqual(response.data['estimated_time'], 'About 55 minutes')
+        self.assertIsNotNone(response.data['estimated_arrival'])
+        
+        order.status = 'delivered'
+        order.save()
+        response = self.client.get(f'/api/orders/{order.order_number}/')
+        self.assertEqual(response.data['estimated_time'], '')
+        self.assertIsNone(response.data['estimated_arrival'])
+    
+    def test_queue_is_staff_only(self):
+        """Test kitchen screens get the planned dishes per station"""
+        order = self.place()
+        self.assertEqual(self.client.get('/api/kitchen/queue/').status_code, status.HTTP_403_FORBIDDEN)
+        
+        self.client.force_authenticate(User.objects.create_user('chef', is_staff=True))
+        response = self.client.get('/api/kitchen/queue/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['orders'][0]['order_number'], order.order_number)
+        self.assertEqual(response.data['stations']['oven'][0]['name'], "Margherita")
+        self.assertEqual(sum(ticket['quantity'] for ticket in response.data['stations']['oven']), 2)
+
+
+class AsyncReadAPITest(APITestCase):
+    """Test the async read endpoints answer like their DRF counterparts"""
+    
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Pizzas", order=1)
+        for i in range(3):
+            MenuItem.objects.create(
+                name=f"Pizza {i}", description="Wood-fired", category=self.category,
+                price=Decimal('9.00') + i, is_featured=i == 0
+            )
+        Branch.objects.create(name="Centro", address="Via Roma 1", city="Napoli", phone="123")
+        RestaurantInfo.objects.create(
+            name="60 Seconds to Napoli", description="Pizza", address="Via Roma 1",
+            phone="123", email="info@example.com"
+        )
+    
+    def test_matches_sync_endpoints(self):
+        """Test every async endpoint returns the same data as the sync one"""
+        item = MenuItem.objects.first()
+        for path in [
+            'categories/', 'menu-items/', 'menu-items/?page_size=1&cursor=',
+            f'menu-items/?category={self.category.pk}&ordering=-price', f'menu-items/{item.pk}/',
+            'menu-items/featured/', 'menu-items/search/?q=pizza', 'branches/',
+            'restaurant-info/current/',
+        ]:
+            with self.subTest(path=path):
+                expected = self.client.get(f'/api/{path}')
+                response = self.client.get(f'/api/async/{path}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    json.loads(response.content.replace(b'/api/async/', b'/api/')),
+                    json.loads(expected.content)
+                )
+    
+    def test_errors(self):
+        """Test errors are reported as by the sync endpoints"""
+        self.assertEqual(self.client.get('/api/async/menu-items/999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/async/menu-items/?page=9').status_code, 404)
+        self.assertEqual(self.client.get('/api/async/menu-items/?category=999').status_code, 400)
+        self.assertEqual(self.client.get('/api/async/menu-items/search/').status_code, 400)
+        self.assertEqual(self.client.post('/api/async/categories/').status_code, 405)
+    
+    async def test_served_natively_and_cached(self):
+        """Test the cached endpoints hit the response cache under ASGI"""
+        first = await self.async_client.get('/api/async/categories/')
+        second = await self.async_client.get('/api/async/categories/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(json.loads(second.content)['results'][0]['item_count'], 3)
+
+
+@override_settings(IMAGE_PIPELINE_WORKERS=0)
+class ImagePipelineTest(APITestCase):
+    """Test uploads are stored and resized into metadata-free renditions"""
+    
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+    
+    def photo(self, name='photo.jpg'):
+        """A 400x200 JPEG whose EXIF says to rotate it upright and where it was taken"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'PhoneCam'
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+    
+    def test_upload_generates_renditions(self):
+        """Test an upload gets a WebP and a JPEG per size, upright and without EXIF"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/upload-image/', {'image': self.photo(), 'category': 'menu_item'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        path = response.data['file_path']
+        self.assertTrue(path.startswith('uploads/'))
+        
+        renditions = ImageRendition.objects.filter(source=path)
+        self.assertEqual(
+            sorted(renditions.values_list('width', 'format')),
+            [(width, image_format) for width in (160, 480, 1280) for image_format in ('jpeg', 'webp')]
+        )
+        thumbnail = renditions.get(width=160, format='jpeg')
+        self.assertEqual((thumbnail.actual_width, thumbnail.height), (160, 320))
+        # Never scaled up past the original
+        hero = renditions.get(width=1280, format='webp')
+        self.assertEqual((hero.actual_width, hero.height), (200, 400))
+        with thumbnail.file.open() as file:
+            image = Image.open(file)
+            self.assertEqual(image.size, (160, 320))
+            self.assertEqual(len(image.getexif()), 0)
+    
+    def test_rejects_non_images(self):
+        """Test a file that is not an image is refused"""
+        upload = SimpleUploadedFile('menu.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post('/api/upload-image/', {'image': upload})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_renditions_bump_only_their_version(self):
+        """Test new renditions leave the menu version alone and broken sources aren't retried"""
+        menu_version, renditions_version = get_version('menu'), get_version('renditions')
+        source = default_storage.save('menu_items/photo.jpg', self.photo())
+        self.assertEqual(len(images.schedule_renditions(source)), 6)
+        self.assertEqual(get_version('menu'), menu_version)
+        self.assertNotEqual(get_version('renditions'), renditions_version)
+        
+        broken = default_storage.save('menu_items/broken.jpg', io.BytesIO(b'not an image'))
+        self.assertEqual(images.schedule_renditions(broken), [])
+        with self.assertNumQueries(0):
+            self.assertIsNone(images.schedule_renditions(broken))
+    
+    def create_items(self):
+        category = Category.objects.create(name="Pizzas", order=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.resized = MenuItem.objects.create(
+                name="Margherita", description="Classic", category=category, price=Decimal('9.00'),
+                image=self.photo('margherita.jpg'), is_featured=True
+            )
+        self.pending = MenuItem.objects.create(
+            name="Marinara", description="Garlic", category=category, price=Decimal('8.00'),
+            image=self.photo('marinara.jpg')
+        )
+        MenuItem.objects.create(name="Calzone", description="Folded", category=category, price=Decimal('11.00'))
+    
+    def rendition_url(self, item, width, image_format='webp'):
+        return f'http://testserver/media/renditions/{item.image.name[:-4]}-{width}w.{image_format}'
+    
+    def test_list_returns_renditions(self):
+        """Test lists return renditions, the original until they exist, and make the missing ones"""
+        self.create_items()
+        response = self.client.get('/api/menu-items/')
+        items = {item['name']: item for item in response.data['results']}
+        margherita = items['Margherita']
+        self.assertEqual(margherita['image_thumbnail'], self.rendition_url(self.resized, 160))
+        self.assertEqual(margherita['image_src'], self.rendition_url(self.resized, 480))
+        # The original is 200px wide: wider renditions are listed once, at their real width
+        self.assertEqual(
+            margherita['image_srcset'],
+            f'{self.rendition_url(self.resized, 160)} 160w, {self.rendition_url(self.resized, 480)} 200w'
+        )
+        self.assertEqual(items['Marinara']['image_thumbnail'], f'http://testserver/media/{self.pending.image.name}')
+        self.assertIsNone(items['Marinara']['image_srcset'])
+        self.assertIsNone(items['Calzone']['image_thumbnail'])
+        
+        # The first response queued the renditions it lacked; now one query finds them all
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/menu-items/')
+        self.assertEqual(len([query for query in queries if 'menu_imagerendition' in query['sql']]), 1)
+        items = {item['name']: item for item in response.data['results']}
+        self.assertEqual(items['Marinara']['image_thumbnail'], self.rendition_url(self.pending, 160))
+        
+        response = self.client.get('/api/async/menu-items/')
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(list(items.values()), default=str)))
+    
+    def test_image_size(self):
+        """Test ?image_size= picks the rendition, by name or width"""
+        self.create_items()
+        url = f'/api/menu-items/{self.resized.pk}/'
+        self.assertEqual(self.client.get(url).data['image_src'], self.rendition_url(self.resized, 1280))
+        self.assertEqual(
+            self.client.get(url, {'image_size': 'thumbnail'}).data['image_src'], self.rendition_url(self.resized, 160)
+        )
+        self.assertEqual(
+            self.client.get(url, {'image_size': '300'}).data['image_src'], self.rendition_url(self.resized, 480)
+        )
+        self.assertEqual(
+            self.client.get(f'/api/async/menu-items/{self.resized.pk}/', {'image_size': '300'}).json()['image_src'],
+            self.rendition_url(self.resized, 480)
+        )
+        self.assertEqual(self.client.get(url, {'image_size': 'huge'}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_pages_offer_srcset(self):
+        """Test the menu, item and home pages offer WebP and JPEG srcsets"""
+        self.create_items()
+        webp = f'srcset="/media/renditions/{self.resized.image.name[:-4]}-160w.webp 160w'
+        jpeg = f'srcset="/media/renditions/{self.resized.image.name[:-4]}-160w.jpeg 160w'
+        response = self.client.get('/en/menu/')
+        # Items without renditions yet keep their original image until the page made them
+        self.assertContains(response, f' src="/media/{self.pending.image.name}"')
+        for url in ['/en/menu/', f'/en/menu/item/{self.resized.pk}/', '/en/']:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, webp)
+                self.assertContains(response, jpeg)
+
+
+
+@override_settings(IMAGE_PIPELINE_WORKERS=0)
+class MediaStorageTest(APITestCase):
+    """Test uploads are stored once per content and unused ones collected"""
+    
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.category = Category.objects.create(name="Pizzas", order=1)
+    
+    def image_bytes(self, color='red'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+    
+    def upload(self, color='red', name='photo.png'):
+        upload = SimpleUploadedFile(name, self.image_bytes(color), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/upload-image/', {'image': upload, 'category': 'menu_item'})
+    
+    def test_duplicate_upload_returns_stored_copy(self):
+        """Test the same image uploaded twice is stored once"""
+        first = self.upload(name='one.PNG')
+        second = self.upload(name='two.png')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertTrue(second.data['duplicate'])
+        self.assertEqual(first.data['image_url'], second.data['image_url'])
+        self.assertRegex(first.data['file_path'], r'^uploads/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(MediaFile.objects.count(), 1)
+        self.assertEqual(len(default_storage.listdir('uploads/' + first.data['file_path'][8:10])[1]), 1)
+    
+    def test_replaced_image_is_collected(self):
+        """Test an image no row uses any more is deleted with its renditions"""
+        old = self.upload('red').data['file_path']
+        new = self.upload('blue').data['file_path']
+        MediaFile.objects.update(uploaded_at=timezone.now() - timedelta(hours=1))
+        item = MenuItem.objects.create(
+            name="Margherita", description="Classic", category=self.category, price=Decimal('9.00'), image=old
+        )
+        Ingredient.objects.create(name="Basil", image=old)
+        self.assertEqual(MediaFile.objects.get(file=old).ref_count, 2)
+        
+        item = MenuItem.objects.get(pk=item.pk)
+        item.image = new
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        # Still used by the ingredient
+        self.assertEqual(MediaFile.objects.get(file=old).ref_count, 1)
+        self.assertEqual(MediaFile.objects.get(file=new).ref_count, 1)
+        self.assertTrue(default_storage.exists(old))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.get(name="Basil").delete()
+        self.assertFalse(MediaFile.objects.filter(file=old).exists())
+        self.assertFalse(default_storage.exists(old))
+        self.assertFalse(ImageRendition.objects.filter(source=old).exists())
+        self.assertTrue(default_storage.exists(new))
+    
+    def test_dedupe_media_command(self):
+        """Test the command moves files under their hash and repoints the rows"""
+        first = default_storage.save('menu_items/a.png', io.BytesIO(self.image_bytes()))
+        second = default_storage.save('categories/b.png', io.BytesIO(self.image_bytes()))
+        other = default_storage.save('ingredients/c.png', io.BytesIO(self.image_bytes('blue')))
+        MenuItem.objects.create(
+            name="Margherita", description="Classic", category=self.category, price=Decimal('9.00'), image=first
+        )
+        Category.objects.filter(pk=self.category.pk).update(image=second)
+        Ingredient.objects.create(name="Basil", image=other)
+        rendition_file = default_storage.save('renditions/categories/b-160.webp', io.BytesIO(b'webp'))
+        ImageRendition.objects.create(
+            source=second, width=160, format='webp', file=rendition_file,
+            actual_width=160, height=160, file_size=4
+        )
+        video = default_storage.save('menu_videos/clip.mp4', io.BytesIO(self.image_bytes()))
+        MenuItem.objects.filter(image=first).update(video=video)
+        
+        call_command('dedupe_media', stdout=io.StringIO())
+        names = set(MediaFile.objects.values_list('file', flat=True))
+        self.assertEqual(len(names), 2)
+        item_image = MenuItem.objects.get().image.name
+        self.assertEqual(Category.objects.get().image.name, item_image)
+        self.assertIn(item_image, names)
+        self.assertEqual(MediaFile.objects.get(file=item_image).ref_count, 2)
+        for name in (first, second, other):
+            self.assertFalse(default_storage.exists(name))
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+        # Renditions follow their image, other files are left alone
+        self.assertEqual(ImageRendition.objects.get(file=rendition_file).source, item_image)
+        self.assertTrue(default_storage.exists(rendition_file))
+        self.assertEqual(MenuItem.objects.get().video.name, video)
+        self.assertTrue(default_storage.exists(video))
+
+
+class MediaServingTest(TestCase):
+    """Test media files are served with byte ranges and revalidation"""
+    
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.content = bytes(range(256)) * 4
+        default_storage.save('menu_videos/clip.mp4', io.BytesIO(self.content))
+        self.url = '/media/menu_videos/clip.mp4'
+    
+    def body(self, response):
+        return b''.join(response.streaming_content)
+    
+    def test_full_file(self):
+        """Test a request without Range gets the whole file"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(self.body(response), self.content)
+    
+    def test_byte_ranges(self):
+        """Test single and suffix ranges get 206 with their bytes"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(self.body(response), self.content[100:200])
+        
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-24')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(self.body(response), self.content[-24:])
+        
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-')
+        self.assertEqual(self.body(response), self.content[1000:])
+        
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2048-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+        
+        # A stale If-Range gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+    
+    def test_revalidation_and_paths(self):
+        """Test a matching ETag gets 304 and paths outside MEDIA_ROOT 404"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/menu_videos/missing.mp4').status_code, 404)
+    
+    async def test_streamed_under_asgi(self):
+        """Test ASGI requests get the bytes from an async iterator"""
+        response = await self.async_client.get(self.url, headers={'Range': 'bytes=1000-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Content-Length'], '24')
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.content[1000:])
+    
+    @override_settings(FFMPEG_BINARY='missing-ffmpeg-binary')
+    def test_video_previews_need_ffmpeg(self):
+        """Test the preview command explains a missing ffmpeg"""
+        with self.assertRaisesMessage(CommandError, 'missing-ffmpeg-binary not found'):
+            call_command('generate_video_previews', stdout=io.StringIO())
+
+
+@override_settings(IMAGE_PIPELINE_WORKERS=0)
+class ModelVariantTest(APITestCase):
+    """Test 3D models are checked and converted into full and preview GLB files"""
+    
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.category = Category.objects.create(name="Pizzas", order=1)
+    
+    def grid_obj(self, size):
+        """An OBJ plane of size x size textured quads, (size + 1) ** 2 vertices"""
+        lines = []
+        for row in range(size + 1):
+            for column in range(size + 1):
+                lines.append(f'v {column} {row} {(row * column) % 3 * 0.1}')
+                lines.append(f'vt {column / size} {row / size}')
+        for row in range(size):
+            for column in range(size):
+                a = row * (size + 1) + column + 1
+                b, c, d = a + 1, a + size + 2, a + size + 1
+                lines.append(f'f {a}/{a} {b}/{b} {c}/{c} {d}/{d}')
+        return SimpleUploadedFile('pizza.obj', '\n'.join(lines).encode())
+    
+    def item(self, model_3d):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MenuItem.objects.create(
+                name="Margherita", description="Classic", category=self.category,
+                price=Decimal('9.00'), model_3d=model_3d
+            )
+    
+    def test_invalid_models_rejected(self):
+        """Test broken and unsupported files fail validation"""
+        for upload in (
+            SimpleUploadedFile('pizza.obj', b'v 1 2\nf 1 2 3\n'),
+            SimpleUploadedFile('pizza.glb', b'not a binary gltf file'),
+            SimpleUploadedFile('pizza.gltf', b'{"asset": {"version": "2.0"}, "buffers": [{"uri": "pizza.bin", "byteLength": 4}]}'),
+            SimpleUploadedFile('pizza.stl', b'solid pizza'),
+        ):
+            item = MenuItem(
+                name="Margherita", description="Classic", category=self.category,
+                price=Decimal('9.00'), model_3d=upload
+            )
+            with self.assertRaises(ValidationError) as raised:
+                item.full_clean()
+            self.assertIn('model_3d', raised.exception.message_dict)
+        MenuItem(
+            name="Margherita", description="Classic", category=self.category,
+            price=Decimal('9.00'), model_3d=self.grid_obj(2)
+        ).full_clean()
+    
+    def test_saved_model_gets_variants(self):
+        """Test a saved model is converted and its preview simplified under the vertex budget"""
+        item = self.item(self.grid_obj(80))
+        variants = {variant.kind: variant for variant in ModelVariant.objects.filter(source=item.model_3d.name)}
+        self.assertEqual(variants['full'].vertex_count, 81 * 81)
+        self.assertEqual(variants['full'].triangle_count, 2 * 80 * 80)
+        self.assertLessEqual(variants['preview'].vertex_count, 5000)
+        self.assertLess(variants['preview'].file_size, variants['full'].file_size)
+        for variant in variants.values():
+            with default_storage.open(variant.file.name) as file:
+                document, _ = gltf.read_model(file.read(), '.glb')
+            self.assertIn('TEXCOORD_0', document['meshes'][0]['primitives'][0]['attributes'])
+        
+        for url in (f'/api/menu-items/{item.pk}/', f'/api/async/menu-items/{item.pk}/'):
+            data = self.client.get(url).json()['model_3d_variants']
+            self.assertEqual(data['preview']['vertex_count'], variants['preview'].vertex_count)
+            self.assertTrue(data['full']['url'].endswith(variants['full'].file.name))
+    
+    def test_variants_follow_moved_models(self):
+        """Test dedupe_media moves the variants of a duplicate to the copy kept"""
+        kept = self.item(self.grid_obj(4)).model_3d.name
+        moved = self.item(self.grid_obj(2)).model_3d.name
+        moved_files = set(ModelVariant.objects.filter(source=moved).values_list('file', flat=True))
+        move_copies(ModelVariant, ('kind',), [moved], kept)
+        self.assertFalse(ModelVariant.objects.filter(source=moved).exists())
+        self.assertEqual(set(variants_for(kept)), {'preview', 'full'})
+        for name in moved_files:
+            self.assertFalse(default_storage.exists(name))
+        
+        # Without variants of its own, the copy kept takes over the moved ones
+        ModelVariant.objects.filter(source=kept).update(source=moved)
+        move_copies(ModelVariant, ('kind',), [moved], kept)
+        self.assertEqual(ModelVariant.objects.filter(source=kept).count(), 2)
+    
+    def test_failed_models_not_retried(self):
+        """Test a model that fails to convert is left alone on the next saves"""
+        source = default_storage.save('menu_3d/broken.glb', io.BytesIO(b'glTF' + b'\0' * 16))
+        self.assertEqual(model_variants.schedule_model_variants(source), [])
+        with self.assertNumQueries(0):
+            self.assertIsNone(model_variants.schedule_model_variants(source))
+    
+    def test_small_model_preview_is_full_model(self):
+        """Test a model already under the budget gets no separate preview"""
+        item = self.item(self.grid_obj(4))
+        variants = {variant.kind: variant for variant in ModelVariant.objects.filter(source=item.model_3d.name)}
+        self.assertEqual(variants['preview'].file.name, variants['full'].file.name)
+        self.assertEqual(variants['full'].vertex_count, 25)
+
+
+class TranslationTest(APITestCase):
+    """Test menu content is served in the requested language"""
+    
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Pizzas", description="Wood-fired", order=1)
+        self.menu_item = MenuItem.objects.create(
+            name="Margherita", description="Tomato, mozzarella, basil",
+            category=self.category, price=Decimal('9.50')
+        )
+        self.ingredient = Ingredient.objects.create(name="Mozzarella", is_allergen=True)
+        MenuItemIngredient.objects.create(menu_item=self.menu_item, ingredient=self.ingredient)
+        for obj, text in [(self.category, "بيتزا"), (self.menu_item, "مارغريتا"), (self.ingredient, "موزاريلا")]:
+            Translation.objects.create(content_object=obj, field='name', language='ar', text=text)
+        cache.clear()
+    
+    def test_list_translated_with_one_query(self):
+        """Test a translated list costs one query more than the original and falls back per field"""
+        with CaptureQueriesContext(connection) as english:
+            response = self.client.get('/api/menu-items/')
+        self.assertEqual(response.data['results'][0]['name'], "Margherita")
+        with CaptureQueriesContext(connection) as arabic:
+            response = self.client.get('/api/menu-items/', HTTP_ACCEPT_LANGUAGE='ar')
+        self.assertEqual(len(arabic), len(english) + 1)
+        item = response.data['results'][0]
+        self.assertEqual(item['name'], "مارغريتا")
+        self.assertEqual(item['category_name'], "بيتزا")
+        self.assertEqual(item['description'], "Tomato, mozzarella, basil")
+    
+    def test_cached_per_language(self):
+        """Test cached lists are kept per language and then cost no queries"""
+        english = self.client.get('/api/categories/')
+        arabic = self.client.get('/api/categories/', HTTP_ACCEPT_LANGUAGE='ar')
+        self.assertEqual(arabic['X-Cache'], 'MISS')
+        self.assertEqual(arabic.data['results'][0]['name'], "بيتزا")
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/categories/', HTTP_ACCEPT_LANGUAGE='ar')
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.content, arabic.content)
+        self.assertEqual(self.client.get('/api/categories/').content, english.content)
+    
+    def test_detail_and_async(self):
+        """Test nested rows are translated, by the sync and async views alike"""
+        response = self.client.get(f'/api/menu-items/{self.menu_item.pk}/', HTTP_ACCEPT_LANGUAGE='ar')
+        self.assertEqual(response.data['category']['name'], "بيتزا")
+        self.assertEqual(response.data['ingredients'][0]['ingredient']['name'], "موزاريلا")
+        for path in ['categories/', 'menu-items/', f'menu-items/{self.menu_item.pk}/']:
+            with self.subTest(path=path):
+                expected = self.client.get(f'/api/{path}', HTTP_ACCEPT_LANGUAGE='ar')
+                response = self.client.get(f'/api/async/{path}', HTTP_ACCEPT_LANGUAGE='ar')
+                self.assertEqual(
+                    json.loads(response.content.replace(b'/api/async/', b'/api/')),
+                    json.loads(expected.content)
+                )
+    
+    def test_snapshot_per_language(self):
+        """Test the snapshot is built per language"""
+        english = self.client.get('/api/menu/snapshot/')
+        arabic = self.client.get('/api/menu/snapshot/', HTTP_ACCEPT_LANGUAGE='ar')
+        self.assertNotEqual(english['ETag'], arabic['ETag'])
+        self.assertIn('Accept-Language', arabic['Vary'])
+        category = json.loads(arabic.content)['categories'][0]
+        self.assertEqual(category['name'], "بيتزا")
+        self.assertEqual(category['items'][0]['allergens'], ["موزاريلا"])
+        self.assertEqual(json.loads(english.content)['categories'][0]['name'], "Pizzas")
+    
+    @mock.patch('menu.sync.COMMIT_LAG', timedelta(0))
+    def test_sync_feed_translated(self):
+        """Test the change feed is translated and re-sends a row whose translation changed"""
+        response = self.client.get('/api/sync/changes/', HTTP_ACCEPT_LANGUAGE='ar')
+        names = {change['type']: change['data']['name'] for change in response.data['changes']}
+        self.assertEqual(names['category'], "بيتزا")
+        self.assertEqual(names['menu_item'], "مارغريتا")
+        
+        cursor = response.data['cursor']
+        self.menu_item.translations.get(field='name', language='ar').delete()
+        Translation.objects.create(content_object=self.category, field='description', language='ar', text="على الحطب")
+        response = self.client.get('/api/sync/changes/', {'since': cursor}, HTTP_ACCEPT_LANGUAGE='ar')
+        changes = {change['type']: change['data'] for change in response.data['changes']}
+        self.assertEqual(changes['category']['description'], "على الحطب")
+        self.assertEqual(changes['menu_item']['name'], "Margherita")
+    
+    def test_translation_change_invalidates_cache(self):
+        """Test saving or deleting a translation refreshes the cached responses"""
+        self.client.get('/api/categories/', HTTP_ACCEPT_LANGUAGE='ar')
+        translation = self.category.translations.get(field='name', language='ar')
+        translation.text = "بيتزا نابوليتانا"
+        with self.captureOnCommitCallbacks(execute=True):
+            translation.save()
+        response = self.client.get('/api/categories/', HTTP_ACCEPT_LANGUAGE='ar')
+        self.assertEqual(response.data['results'][0]['name'], "بيتزا نابوليتانا")
+        with self.captureOnCommitCallbacks(execute=True):
+            translation.delete()
+        response = self.client.get('/api/categories/', HTTP_ACCEPT_LANGUAGE='ar')
+        self.assertEqual(response.data['results'][0]['name'], "Pizzas")
+    
+    def test_validation(self):
+        """Test translations must target a translated field in another language"""
+        with self.assertRaises(ValidationError) as raised:
+            Translation(content_object=self.menu_item, field='price', language='en', text="9").full_clean()
+        self.assertEqual(set(raised.exception.message_dict), {'field', 'language'})
@@ -0,0 +1,127 @@
+"""
+Translations of menu content.
+
+Category, menu item and ingredient names and descriptions are written in
+settings.LANGUAGE_CODE on the rows themselves; Translation rows hold the
+other LANGUAGES, keyed by (object, field, language), and a field without
+one falls back to its own text.
+
+A TranslationRegistry resolves the translations of everything a response
+shows, the listed rows and the related rows loaded with them, in one
+query for the active language, and none for LANGUAGE_CODE. The response
+cache and the menu snapshot are keyed by language, so a translated list
+is serialized once per menu version and language and then costs the same
+as the original.
+"""
+from django.conf import settings
+from django.db.models import Q
+from django.utils.translation import get_language, get_supported_language_variant
+
+from .models import Translation
+
+
+def content_language():
+    """The active language when translations are looked up for it, None for LANGUAGE_CODE"""
+    try:
+        language = get_supported_language_variant(get_language() or settings.LANGUAGE_CODE)
+    except LookupError:
+        return None
+    return None if language == settings.LANGUAGE_CODE else language
+
+
+def object_key(obj):
+    return (obj._meta.app_label, obj._meta.model_name, obj.pk)
+
+
+def translatable_objects(objects, depth=2):
+    """
+    `objects` with the rows already loaded with them (select_related and
+    prefetch_related, `depth` levels down) whose model has translated_fields
+    """
+    for obj in objects:
+        if obj is None:
+            continue
+        if getattr(obj, 'translated_fields', None):
+            yield obj
+        if not depth:
+            continue
+        related = [
+            getattr(obj, field.name) for field in obj._meta.concrete_fields
+            if field.is_relation and field.many_to_one and field.is_cached(obj)
+        ]
+        for prefetched in getattr(obj, '_prefetched_objects_cache', {}).values():
+            related.extend(prefetched)
+        yield from translatable_objects(related, depth - 1)
+
+
+class TranslationRegistry:
+    """The translations into one language of a set of rows, looked up together"""
+
+    def __init__(self, language):
+        self.language = language
+        self.texts = {}
+        self.loaded = set()
+
+    @classmethod
+    def load(cls, objects, language):
+        registry = cls(language)
+        registry.ensure(objects)
+        return registry
+
+    @classmethod
+    async def aload(cls, objects, language):
+        registry = cls(language)
+        query = registry.query(objects)
+        if query is not None:
+            registry.add([row async for row in query])
+        return registry
+
+    def query(self, objects):
+        """Translations of the `objects` not looked up yet, or None if there are none"""
+        wanted = {}
+        for obj in objects:
+            key = object_key(obj)
+            if obj.pk is not None and key not in self.loaded:
+                self.loaded.add(key)
+                wanted.setdefault(key[:2], set()).add(obj.pk)
+        if not wanted:
+            return None
+        condition = Q()
+        for (app_label, model_name), ids in wanted.items():
+            condition |= Q(content_type__app_label=app_label, content_type__model=model_name, object_id__in=ids)
+        return Translation.objects.filter(condition, language=self.language).order_by().values_list(
+            'content_type__app_label', 'content_type__model', 'object_id', 'field', 'text'
+        )
+
+    def add(self, rows):
+        for app_label, model_name, object_id, field, text in rows:
+            self.texts[(app_label, model_name, object_id, field)] = text
+
+    def ensure(self, objects):
+        """Look up the translations of the `objects` missing from the registry, in one query"""
+        query = self.query(objects)
+        if query is not None:
+            self.add(query)
+
+    def get(self, obj, field):
+        """The translation of a field of `obj`, or None to keep its own text"""
+        return self.texts.get(object_key(obj) + (field,))
+
+    def text(self, obj, field):
+        """The field of `obj` in the registry's language"""
+        return self.get(obj, field) or getattr(obj, field)
+
+
+def context_translations(context, objects):
+    """
+    The serializer context's registry for the active language, with the
+    `objects` and the rows loaded with them looked up; None for LANGUAGE_CODE
+    """
+    language = content_language()
+    if language is None:
+        return None
+    registry = context.get('translations')
+    if registry is None or registry.language != language:
+        registry = context['translations'] = TranslationRegistry(language)
+    registry.ensure(translatable_objects(objects))
+    return registry
@@ -3,10 +3,12 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     CategoryViewSet, MenuItemViewSet, IngredientViewSet,
     CustomizationViewSet, ReviewViewSet, RestaurantInfoViewSet,
-    BranchViewSet, login_view, logout_view, current_user_view,
-    register_view, submit_review, ingredient_details
+    BranchViewSet, OrderViewSet, login_view, logout_view, current_user_view,
+    register_view, submit_review, ingredient_details, menu_snapshot,
+    sync_changes, cache_stats, order_events, kitchen_queue
 )
 from .views_upload import upload_image
+from . import views_async
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
@@ -16,6 +18,7 @@ router.register(r'customizations', CustomizationViewSet, basename='customization
 router.register(r'reviews', ReviewViewSet, basename='review')
 router.register(r'branches', BranchViewSet, basename='branch')
 router.register(r'restaurant-info', RestaurantInfoViewSet, basename='restaurantinfo')
+router.register(r'orders', OrderViewSet, basename='order')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -28,4 +31,22 @@ urlpatterns = [
     # Enhanced features endpoints
     path('reviews/submit/', submit_review, name='submit-review'),
     path('ingredients/<int:ingredient_id>/details/', ingredient_details, name='ingredient-details'),
+    # Mobile sync endpoints
+    path('menu/snapshot/', menu_snapshot, name='menu-snapshot'),
+    path('sync/changes/', sync_changes, name='sync-changes'),
+    # Live order tracking (server-sent events)
+    path('orders/<str:order_number>/events/', order_events, name='order-events'),
+    # Kitchen screens
+    path('kitchen/queue/', kitchen_queue, name='kitchen-queue'),
+    # Async read endpoints (native under the ASGI worker)
+    path('async/categories/', views_async.category_list, name='async-category-list'),
+    path('async/menu-items/', views_async.menu_item_list, name='async-menuitem-list'),
+    path('async/menu-items/featured/', views_async.menu_item_featured, name='async-menuitem-featured'),
+    path('async/menu-items/search/', views_async.menu_item_search, name='async-menuitem-search'),
+    path('async/menu-items/<int:pk>/', views_async.menu_item_detail, name='async-menuitem-detail'),
+    path('async/branches/', views_async.branch_list, name='async-branch-list'),
+    path('async/restaurant-info/current/', views_async.restaurant_info_current,
+         name='async-restaurantinfo-current'),
+    # Monitoring
+    path('cache/stats/', cache_stats, name='cache-stats'),
 ]
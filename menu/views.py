@@ -1,19 +1,41 @@
-from rest_framework import viewsets, filters, status
+import asyncio
+import json
+
+from rest_framework import viewsets, mixins, filters, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser, BasePermission
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Avg
+from django.conf import settings
+from django.db.models import Q, Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404, JsonResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified,
+    StreamingHttpResponse
+)
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+from django.utils.translation import get_language
 from .models import (
-    Category, MenuItem, Ingredient, Customization, Review, RestaurantInfo, MenuItemIngredient, Branch
+    Category, MenuItem, Ingredient, Customization, Review, RestaurantInfo, MenuItemIngredient, Branch,
+    Order
 )
+from . import autocomplete, events, kitchen
+from .bulk import BulkWriteMixin
+from .cache import CachedResponseMixin, response_cache_stats
+from .pagination import PageNumberOrKeysetPagination, paginate_optional_keyset
+from .reorder import MoveMixin, ReorderSerializer, reorder
+from .search import search_menu_items
+from .snapshot import get_menu_snapshot
+from .sync import get_changes, DEFAULT_LIMIT as SYNC_DEFAULT_LIMIT, MAX_LIMIT as SYNC_MAX_LIMIT
 from .serializers import (
     CategorySerializer, MenuItemListSerializer, MenuItemDetailSerializer,
     IngredientSerializer, CustomizationSerializer, ReviewSerializer,
-    RestaurantInfoSerializer, BranchSerializer
+    RestaurantInfoSerializer, BranchSerializer, OrderSerializer, OrderCreateSerializer
 )
 
 
@@ -30,7 +52,7 @@ class IsAdminOrReadOnly(BasePermission):
         return True  # Change to: request.user and request.user.is_staff for production
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedResponseMixin, BulkWriteMixin, MoveMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing menu categories.
     
@@ -39,25 +61,54 @@ class CategoryViewSet(viewsets.ModelViewSet):
     create: Create a new category (admin only)
     update: Update a category (admin only)
     destroy: Delete a category (admin only)
+    bulk: Create, update and delete categories in one request (admin only)
+    reorder / move: Change the display order of categories or their items (admin only)
     """
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
+    cache_resources = ('categories',)
     permission_classes = [IsAdminOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
     ordering_fields = ['order', 'name', 'created_at']
     ordering = ['order', 'name']
 
+    def get_queryset(self):
+        # Item counts come from the same query instead of one COUNT per category
+        return super().get_queryset().annotate(
+            available_item_count=Count('items', filter=Q(items__is_available=True))
+        )
+
     @action(detail=True, methods=['get'])
     def items(self, request, pk=None):
         """Get all menu items in this category"""
         category = self.get_object()
-        items = category.items.filter(is_available=True)
+        items = category.items.filter(is_available=True).select_related('category')
         serializer = MenuItemListSerializer(items, many=True, context={'request': request})
         return Response(serializer.data)
 
+    def get_order_scope(self, instance):
+        return Category.objects.all()
+
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        """Set the order of all categories from the list of their ids"""
+        serializer = ReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = reorder(Category.objects.all(), serializer.validated_data['ids'])
+        return Response({'updated': len(changed)})
 
-class MenuItemViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'], url_path='items/reorder')
+    def reorder_items(self, request, pk=None):
+        """Set the order of the items in this category from the list of their ids"""
+        category = self.get_object()
+        serializer = ReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = reorder(category.items.all(), serializer.validated_data['ids'])
+        return Response({'updated': len(changed)})
+
+
+class MenuItemViewSet(BulkWriteMixin, MoveMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing menu items.
     
@@ -66,9 +117,12 @@ class MenuItemViewSet(viewsets.ModelViewSet):
     create: Create a new menu item (admin only)
     update: Update a menu item (admin only)
     destroy: Delete a menu item (admin only)
+    bulk: Create, update and delete menu items in one request (admin only)
+    move: Move an item before or after another one of its category (admin only)
     """
     queryset = MenuItem.objects.all().select_related('category')  # Changed to show all items for admin
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = PageNumberOrKeysetPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = {
         'category': ['exact'],
@@ -88,6 +142,34 @@ class MenuItemViewSet(viewsets.ModelViewSet):
             return MenuItemDetailSerializer
         return MenuItemListSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = self.with_detail_relations(queryset)
+        return queryset
+
+    @staticmethod
+    def with_detail_relations(queryset):
+        """Load everything MenuItemDetailSerializer reads in a fixed number of queries"""
+        category_items = (
+            MenuItem.objects.filter(category=OuterRef('category'), is_available=True)
+            .order_by().values('category').annotate(total=Count('pk')).values('total')
+        )
+        return queryset.annotate(
+            category_item_count=Coalesce(Subquery(category_items), 0)
+        ).prefetch_related(
+            Prefetch('ingredients', queryset=MenuItemIngredient.objects.select_related('ingredient')),
+            'customizations',
+            Prefetch(
+                'reviews',
+                queryset=Review.objects.filter(is_approved=True).select_related('menu_item', 'branch')[:5],
+                to_attr='latest_reviews'
+            ),
+        )
+
+    def get_order_scope(self, instance):
+        return MenuItem.objects.filter(category_id=instance.category_id)
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Get featured menu items"""
@@ -97,36 +179,60 @@ class MenuItemViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Advanced search for menu items"""
+        """
+        Full-text search for menu items, most relevant first
+        
+        Every word is prefix-matched (type-ahead friendly) and stemmed with
+        the request language, or ?lang= when given.
+        """
         query = request.query_params.get('q', '')
         
         if not query:
             return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        items = self.queryset.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query)
-        )
+        language_code = request.query_params.get('lang') or get_language()
+        items = search_menu_items(self.queryset, query, language_code)
         
         serializer = self.get_serializer(items, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Typo-tolerant suggestions for menu items, ingredients and categories
+        
+        Served from an in-memory trigram index, without database queries
+        once the index is built.
+        """
+        query = request.query_params.get('q', '').strip()
+        
+        if not query:
+            return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            limit = int(request.query_params.get('limit', autocomplete.DEFAULT_LIMIT))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, autocomplete.MAX_LIMIT))
+        
+        return Response(autocomplete.autocomplete(query, limit))
+
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
-        """Get all approved reviews for a menu item"""
+        """Get all approved reviews for a menu item (send ?cursor= for keyset pages)"""
         menu_item = self.get_object()
-        reviews = menu_item.reviews.filter(is_approved=True)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        reviews = menu_item.reviews.filter(is_approved=True).select_related('menu_item', 'branch')
+        return paginate_optional_keyset(request, reviews, ReviewSerializer)
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CachedResponseMixin, BulkWriteMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing ingredients.
     """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    cache_resources = ('ingredients',)
+    cached_actions = ('list', 'retrieve', 'allergens')
     permission_classes = [IsAdminOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
@@ -141,12 +247,14 @@ class IngredientViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class CustomizationViewSet(viewsets.ModelViewSet):
+class CustomizationViewSet(CachedResponseMixin, BulkWriteMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing menu item customizations.
     """
     queryset = Customization.objects.filter(is_active=True)
     serializer_class = CustomizationSerializer
+    cache_resources = ('customizations',)
+    cached_actions = ('list', 'retrieve', 'by_type')
     filter_backends = [filters.OrderingFilter]
     filterset_fields = ['customization_type']
     ordering_fields = ['name', 'price_modifier']
@@ -174,13 +282,14 @@ class ReviewViewSet(viewsets.ModelViewSet):
     """
     queryset = Review.objects.filter(is_approved=True)
     serializer_class = ReviewSerializer
+    pagination_class = PageNumberOrKeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['menu_item', 'branch', 'category', 'rating']
     ordering_fields = ['created_at', 'rating']
     ordering = ['-created_at']
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('menu_item', 'branch')
         # Only show approved reviews to public
         if not self.request.user.is_staff:
             queryset = queryset.filter(is_approved=True)
@@ -205,19 +314,20 @@ class ReviewViewSet(viewsets.ModelViewSet):
         """Get reviews grouped by category"""
         category = request.query_params.get('type')
         if category and category in ['branch', 'service', 'product', 'other']:
-            reviews = self.queryset.filter(category=category, is_approved=True)
+            reviews = self.queryset.select_related('menu_item', 'branch').filter(category=category, is_approved=True)
         else:
-            reviews = self.queryset.filter(is_approved=True)
+            reviews = self.queryset.select_related('menu_item', 'branch').filter(is_approved=True)
         serializer = self.get_serializer(reviews, many=True)
         return Response(serializer.data)
 
 
-class BranchViewSet(viewsets.ModelViewSet):
+class BranchViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing restaurant branches.
     """
     queryset = Branch.objects.filter(is_active=True)
     serializer_class = BranchSerializer
+    cache_resources = ('branches', 'ratings')
     permission_classes = [IsAdminOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'city', 'address']
@@ -226,25 +336,26 @@ class BranchViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
-        """Get all approved reviews for this branch"""
+        """Get all approved reviews for this branch (send ?cursor= for keyset pages)"""
         branch = self.get_object()
-        reviews = branch.reviews.filter(is_approved=True)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        reviews = branch.reviews.filter(is_approved=True).select_related('menu_item', 'branch')
+        return paginate_optional_keyset(request, reviews, ReviewSerializer)
 
 
-class RestaurantInfoViewSet(viewsets.ReadOnlyModelViewSet):
+class RestaurantInfoViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for restaurant information (read-only for API).
     """
     queryset = RestaurantInfo.objects.all()
     serializer_class = RestaurantInfoSerializer
+    cache_resources = ('restaurant_info',)
+    cached_actions = ('list', 'retrieve', 'current')
 
     @action(detail=False, methods=['get'])
     def current(self, request):
         """Get current restaurant information"""
         try:
-            restaurant_info = RestaurantInfo.objects.first()
+            restaurant_info = RestaurantInfo.get_solo()
             if restaurant_info:
                 serializer = self.get_serializer(restaurant_info)
                 return Response(serializer.data)
@@ -259,6 +370,36 @@ class RestaurantInfoViewSet(viewsets.ReadOnlyModelViewSet):
             )
 
 
+class OrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                   mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    ViewSet for customer orders.
+
+    create: Place an order (prices come from the menu, not the client)
+    retrieve: Look up an order by its order number
+    list: All orders (staff only)
+    """
+    queryset = Order.objects.prefetch_related('lines')
+    serializer_class = OrderSerializer
+    lookup_field = 'order_number'
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['status', 'order_type']
+
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return OrderCreateSerializer
+        return OrderSerializer
+
+    def get_permissions(self):
+        if self.action == 'list':
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def perform_create(self, serializer):
+        serializer.save()
+        self.request.session.pop('cart', None)
+
+
 # Authentication API Views
 
 @api_view(['POST'])
@@ -521,3 +662,190 @@ def ingredient_details(request, ingredient_id):
             {'error': 'Ingredient not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+
+
+def accepts_gzip(request):
+    """Whether Accept-Encoding allows gzip, by name or as *, with a q-value above 0"""
+    qualities = {}
+    for coding in request.headers.get('Accept-Encoding', '').split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+@require_safe
+def menu_snapshot(request):
+    """
+    Entire active menu as one pre-serialized JSON document
+    
+    GET /api/menu/snapshot/
+    Send the previous ETag in If-None-Match to get 304 Not Modified
+    when the menu has not changed since.
+    """
+    snapshot = get_menu_snapshot()
+    gzipped = accepts_gzip(request)
+    # Each encoding is its own representation, with its own strong validator
+    etag = snapshot['etag'][:-1] + '-gzip"' if gzipped else snapshot['etag']
+    
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(
+            snapshot['gzip_body'] if gzipped else snapshot['body'],
+            content_type='application/json; charset=utf-8'
+        )
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ['Accept-Encoding', 'Accept-Language'])
+    return response
+
+
+# Seconds between keep-alive comments on an idle order event stream
+ORDER_EVENTS_KEEPALIVE = 15
+
+# EventSource reconnect delay (ms) when the server cannot stream (WSGI)
+ORDER_EVENTS_POLL_RETRY = 30000
+
+# EventSource reconnect delay (ms) after a stream reached ORDER_EVENTS_MAX_AGE
+ORDER_EVENTS_RECONNECT_RETRY = 1000
+
+FINAL_ORDER_STATUSES = ('delivered', 'cancelled')
+
+
+def sse_event(data, event='status'):
+    return f'event: {event}\ndata: {data}\n\n'
+
+
+async def order_events(request, order_number):
+    """
+    Server-sent events stream of an order's status
+    
+    GET /api/orders/<order_number>/events/
+    Sends the current status, then every transition until the order is
+    delivered or cancelled, or until settings.ORDER_EVENTS_MAX_AGE has
+    passed: the stream then ends with a short retry hint and EventSource
+    reconnects, so streams to closed tabs don't live on. Without an ASGI
+    server the current status is sent once with a retry hint, so
+    EventSource degrades to slow polling.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    order = await Order.objects.filter(order_number=order_number).afirst()
+    if order is None:
+        raise Http404
+    
+    if not isinstance(request, ASGIRequest):
+        response = HttpResponse(
+            f'retry: {ORDER_EVENTS_POLL_RETRY}\n' + sse_event(events.order_status_message(order)),
+            content_type='text/event-stream'
+        )
+    else:
+        async def stream():
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.ORDER_EVENTS_MAX_AGE
+            subscription = await events.subscribe_order_status(order_number)
+            try:
+                # Re-read after subscribing so no transition falls in between
+                current = await Order.objects.aget(pk=order.pk)
+                yield sse_event(events.order_status_message(current))
+                order_status = current.status
+                while order_status not in FINAL_ORDER_STATUSES:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        yield f'retry: {ORDER_EVENTS_RECONNECT_RETRY}\n\n'
+                        break
+                    try:
+                        message = await asyncio.wait_for(
+                            subscription.get(), min(ORDER_EVENTS_KEEPALIVE, remaining)
+                        )
+                    except asyncio.TimeoutError:
+                        yield ': keep-alive\n\n'
+                        continue
+                    order_status = json.loads(message)['status']
+                    yield sse_event(message)
+            finally:
+                await subscription.close()
+        
+        response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def kitchen_queue(request):
+    """
+    Kitchen display queue (staff only)
+    
+    GET /api/kitchen/queue/
+    Open orders with the time each will be ready, and per station the
+    dishes to prepare in the order to start them. Dishes of one order are
+    planned to finish together.
+    """
+    schedule = kitchen.get_schedule()
+    return Response({
+        'generated_at': schedule['generated_at'],
+        'orders': list(schedule['orders'].values()),
+        'stations': schedule['stations'],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def sync_changes(request):
+    """
+    Incremental change feed for mobile clients
+    
+    GET /api/sync/changes/?since=<cursor>&limit=200
+    Returns created/updated objects and deletions after the cursor, oldest
+    first. Keep calling with the returned cursor while has_more is true;
+    omit since for a full initial download.
+    """
+    try:
+        limit = int(request.query_params.get('limit', SYNC_DEFAULT_LIMIT))
+    except ValueError:
+        return Response(
+            {'error': 'limit must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    limit = max(1, min(limit, SYNC_MAX_LIMIT))
+    
+    try:
+        data = get_changes(
+            request.query_params.get('since') or None,
+            limit,
+            context={'request': request}
+        )
+    except ValueError:
+        return Response(
+            {'error': 'Invalid sync cursor'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """
+    Response cache hit/miss counters (staff only)
+    
+    GET /api/cache/stats/
+    """
+    return Response(response_cache_stats())
@@ -0,0 +1,157 @@
+"""
+Async variants of the hot public read endpoints, under /api/async/.
+
+DRF views are sync, so under the ASGI worker each of their requests runs
+start to finish on a thread. These views answer the same GETs with the
+same JSON as the viewsets, but rows are fetched with the async ORM and the
+response cache is read with the async cache API, so a request only
+occupies a thread while one of its queries runs.
+
+Filtering, pagination and serialization reuse the viewsets' configuration
+and serializers, on rows that are fully loaded before serializing.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed
+from django.utils.translation import get_language
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .cache import acached_response
+from .images import RenditionRegistry
+from .model_variants import avariants_for
+from .models import MenuItem, RestaurantInfo
+from .pagination import apaginate_queryset
+from .search import search_menu_items
+from .serializers import ImageRenditionsSerializer
+from .translations import TranslationRegistry, content_language, translatable_objects
+from .views import BranchViewSet, CategoryViewSet, MenuItemViewSet, RestaurantInfoViewSet
+
+
+def json_response(data, status=200):
+    # Rendered with DRF's JSON renderer, so bodies match the sync endpoints
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def async_read_view(view_func):
+    """Allow GET/HEAD only and turn API exceptions into DRF-style JSON errors"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        try:
+            return await view_func(request, *args, **kwargs)
+        except Http404:
+            return json_response({'detail': 'Not found.'}, status=404)
+        except APIException as exc:
+            return json_response(exc.detail, status=exc.status_code)
+    return wrapper
+
+
+def get_view(viewset_class, request, action, **kwargs):
+    """A viewset set up as the router would for `action`, to reuse its queryset, filters and serializers"""
+    view = viewset_class(action=action, format_kwarg=None, args=(), kwargs=kwargs)
+    view.request = Request(request)
+    return view
+
+
+async def filtered_queryset(view):
+    # Lazy, except for filter backends validating choices such as ?category= with a query
+    return await sync_to_async(view.filter_queryset)(view.get_queryset())
+
+
+async def serialize(view, instance, many=False):
+    """The view's serializer data, with the translations and image renditions loaded beforehand"""
+    serializer_class = view.get_serializer_class()
+    rows = instance if many else [instance]
+    context = view.get_serializer_context()
+    language = content_language()
+    if language is not None and getattr(serializer_class, 'translated_fields', None):
+        context['translations'] = await TranslationRegistry.aload(translatable_objects(rows), language)
+    if not issubclass(serializer_class, ImageRenditionsSerializer):
+        return view.get_serializer(instance, many=many, context=context).data
+    context['renditions'] = await RenditionRegistry.aload(row.image for row in rows)
+    data = view.get_serializer(instance, many=many, context=context).data
+    await sync_to_async(context['renditions'].queue_missing)()
+    return data
+
+
+async def paginated_list(view):
+    queryset = await filtered_queryset(view)
+    paginator = view.paginator
+    page = await apaginate_queryset(paginator, queryset, view.request)
+    if page is None:
+        return json_response(await serialize(view, [row async for row in queryset], many=True))
+    return json_response(paginator.get_paginated_response(await serialize(view, page, many=True)).data)
+
+
+@async_read_view
+async def category_list(request):
+    """GET /api/async/categories/ - async CategoryViewSet.list"""
+    view = get_view(CategoryViewSet, request, 'list')
+    return await acached_response(request, CategoryViewSet.cache_resources, lambda: paginated_list(view))
+
+
+@async_read_view
+async def menu_item_list(request):
+    """GET /api/async/menu-items/ - async MenuItemViewSet.list (send ?cursor= for keyset pages)"""
+    return await paginated_list(get_view(MenuItemViewSet, request, 'list'))
+
+
+@async_read_view
+async def menu_item_detail(request, pk):
+    """GET /api/async/menu-items/<id>/ - async MenuItemViewSet.retrieve"""
+    view = get_view(MenuItemViewSet, request, 'retrieve', pk=pk)
+    queryset = await filtered_queryset(view)
+    try:
+        menu_item = await queryset.aget(pk=pk)
+    except MenuItem.DoesNotExist:
+        raise Http404
+    if menu_item.model_3d:
+        menu_item.model_variants = await avariants_for(menu_item.model_3d.name)
+    return json_response(await serialize(view, menu_item))
+
+
+@async_read_view
+async def menu_item_featured(request):
+    """GET /api/async/menu-items/featured/ - async MenuItemViewSet.featured"""
+    view = get_view(MenuItemViewSet, request, 'featured')
+    items = [item async for item in view.queryset.filter(is_featured=True)]
+    return json_response(await serialize(view, items, many=True))
+
+
+@async_read_view
+async def menu_item_search(request):
+    """GET /api/async/menu-items/search/?q= - async MenuItemViewSet.search"""
+    query = request.GET.get('q', '')
+    if not query:
+        return json_response({'error': 'Search query is required'}, status=400)
+
+    view = get_view(MenuItemViewSet, request, 'search')
+    language_code = request.GET.get('lang') or get_language()
+    # The SQLite backend ranks through its FTS table before returning a queryset
+    queryset = await sync_to_async(search_menu_items)(view.queryset, query, language_code)
+    items = [item async for item in queryset]
+    return json_response(await serialize(view, items, many=True))
+
+
+@async_read_view
+async def branch_list(request):
+    """GET /api/async/branches/ - async BranchViewSet.list"""
+    view = get_view(BranchViewSet, request, 'list')
+    return await acached_response(request, BranchViewSet.cache_resources, lambda: paginated_list(view))
+
+
+@async_read_view
+async def restaurant_info_current(request):
+    """GET /api/async/restaurant-info/current/ - async RestaurantInfoViewSet.current"""
+    async def get_response():
+        restaurant_info = await sync_to_async(RestaurantInfo.get_solo)()
+        if restaurant_info is None:
+            return json_response({'message': 'Restaurant information not configured'}, status=404)
+        view = get_view(RestaurantInfoViewSet, request, 'current')
+        return json_response(view.get_serializer(restaurant_info).data)
+
+    return await acached_response(request, RestaurantInfoViewSet.cache_resources, get_response)
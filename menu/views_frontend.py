@@ -1,42 +1,65 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Prefetch
 from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 import json
 from django.utils.translation import gettext as _
-from .models import MenuItem, Category, RestaurantInfo, Review, Ingredient
+from .cache import cached_response, get_versions
+from .homepage import HOMEPAGE_RESOURCES, get_homepage_context
+from .images import RenditionRegistry
+from .models import MenuItem, Category, Review, Ingredient, Order
+from .kitchen import estimated_time
+from .orders import tracking_steps
 
 def home(request):
     """Display the homepage with featured items and restaurant information"""
-    featured_items = MenuItem.objects.filter(is_featured=True, is_available=True)[:3]
-    restaurant_info = RestaurantInfo.objects.first()
-    reviews = Review.objects.filter(is_approved=True).order_by('-created_at')[:6]
-    
-    context = {
-        'featured_items': featured_items,
-        'restaurant_info': restaurant_info,
-        'reviews': reviews,
-    }
-    return render(request, 'home.html', context)
+    def render_home():
+        return render(request, 'home.html', get_homepage_context())
+
+    # The page only embeds per-user data for signed-in users and flash messages
+    if settings.HOMEPAGE_PAGE_CACHE and not request.user.is_authenticated and not get_messages(request):
+        return cached_response(request, HOMEPAGE_RESOURCES, render_home, content_types=('text/html',))
+    return render_home()
 
 def menu_page(request):
     """Display the full menu page"""
-    categories = Category.objects.prefetch_related('items').filter(is_active=True)
-    return render(request, 'menu/list.html', {'categories': categories})
+    # Evaluated lazily, so a fragment cache hit in the template runs no queries
+    categories = Category.objects.filter(is_active=True).prefetch_related(
+        Prefetch(
+            'items',
+            queryset=MenuItem.objects.filter(is_available=True).order_by('order', 'name'),
+            to_attr='available_items'
+        )
+    )
+    context = {
+        'categories': categories,
+        # Loaded on the first picture, after the template fetched the items
+        'renditions': SimpleLazyObject(lambda: RenditionRegistry.load(
+            item.image for category in categories for item in category.available_items
+        )),
+        'menu_cache_version': '.'.join(str(version) for version in get_versions(('menu', 'ratings', 'renditions'))),
+        'menu_cache_timeout': settings.RESPONSE_CACHE_TIMEOUT,
+    }
+    return render(request, 'menu/list.html', context)
 
 def menu_item_detail(request, pk):
     """Display details for a specific menu item"""
     menu_item = get_object_or_404(MenuItem.objects.prefetch_related('ingredients__ingredient', 'reviews'), pk=pk, is_available=True)
     
     # Get related items from same category
-    related_items = MenuItem.objects.filter(
+    related_items = list(MenuItem.objects.filter(
         category=menu_item.category,
         is_available=True
-    ).exclude(pk=menu_item.pk)[:3]
+    ).exclude(pk=menu_item.pk)[:3])
     
     context = {
         'menu_item': menu_item,
         'related_items': related_items,
+        'renditions': RenditionRegistry.load([menu_item.image] + [item.image for item in related_items]),
     }
     return render(request, 'menu/detail.html', context)
 
@@ -58,38 +81,34 @@ def checkout(request):
 
 def order_confirmation(request, order_number):
     """Display order confirmation page"""
-    # In a real app, you'd fetch the order from database
-    order_data = {
-        'order_number': order_number,
-        'status': 'confirmed',
-        'estimated_time': '25-35 minutes',
-        'total': '0.00 €'
+    order = get_object_or_404(Order.objects.prefetch_related('lines'), order_number=order_number)
+    context = {
+        'order': order,
+        'order_number': order.order_number,
+        'status': order.status,
+        'estimated_time': estimated_time(order),
+        'total': f'{order.total} {order.currency_symbol}',
     }
-    
-    return render(request, 'orders/order_confirmation.html', order_data)
+    return render(request, 'orders/order_confirmation.html', context)
 
 def order_tracking(request, order_number):
     """Display order tracking page"""
-    # In a real app, you'd fetch the order from database
-    order_data = {
-        'order_number': order_number,
-        'status': 'preparing',
-        'estimated_time': '25-35 minutes',
-        'current_step': 2,
-        'steps': [
-            {'name': 'Order Confirmed', 'completed': True, 'time': '12:30 PM'},
-            {'name': 'Preparing', 'completed': True, 'time': '12:32 PM'},
-            {'name': 'On the way', 'completed': False, 'time': 'Est. 12:45 PM'},
-            {'name': 'Delivered', 'completed': False, 'time': 'Est. 12:50 PM'}
-        ]
+    order = get_object_or_404(Order.objects.prefetch_related('lines'), order_number=order_number)
+    steps, current_step = tracking_steps(order)
+    context = {
+        'order': order,
+        'order_number': order.order_number,
+        'status': order.status,
+        'estimated_time': estimated_time(order),
+        'current_step': current_step,
+        'progress': (current_step - 1) * 100 // (len(steps) - 1),
+        'steps': steps,
     }
-    
-    return render(request, 'orders/order_tracking.html', order_data)
+    return render(request, 'orders/order_tracking.html', context)
 
 def contact(request):
     """Display the contact page"""
-    restaurant_info = RestaurantInfo.objects.first()
-    return render(request, 'contact.html', {'restaurant_info': restaurant_info})
+    return render(request, 'contact.html')
 
 
 @csrf_exempt
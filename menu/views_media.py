@@ -0,0 +1,185 @@
+"""
+Serving of uploaded media, with byte ranges.
+
+Video players seek by asking for a byte range of the file, and resume
+interrupted downloads the same way; without Range support every seek
+restarts the download from the first byte. serve_media answers single
+ranges with 206, sends ETag and Last-Modified for revalidation, and marks
+content-addressed files (whose URL changes with their content) immutable.
+
+Under a WSGI server with a file wrapper, such as gunicorn, files are
+handed over open: the body goes out with sendfile() without passing
+through Python, ranges included, as only Content-Length bytes are sent
+from the position the file is left at. Django's ASGI handler would read
+such a file into memory before sending it, so under ASGI the bytes are
+streamed from an async iterator of BLOCK_SIZE blocks read off the event
+loop. SERVE_MEDIA defaults to DEBUG; in production a proxy or CDN is
+expected to serve MEDIA_ROOT.
+"""
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .media import UPLOAD_PREFIX
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Content-addressed files never change under the same name
+IMMUTABLE_PREFIXES = (f'{UPLOAD_PREFIX}/', f'renditions/{UPLOAD_PREFIX}/')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CACHE_CONTROL = 'public, max-age=3600'
+
+# Bytes read at a time when streaming to an ASGI server
+BLOCK_SIZE = 64 * 1024
+
+
+class FileRange:
+    """The next `length` bytes of an open file, for FileResponse"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # For sendfile(), which starts at the file's position and stops at Content-Length
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+async def aread_blocks(file, length):
+    """The next `length` bytes of an open file, read in a thread one block at a time, then close it"""
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while length > 0:
+            data = await read(min(BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def async_file_response(file, length, path, status=200):
+    content_type, encoding = mimetypes.guess_type(path)
+    response = StreamingHttpResponse(
+        aread_blocks(file, length), status=status,
+        # As FileResponse types compressed files
+        content_type={'gzip': 'application/gzip', 'br': 'application/x-brotli'}.get(
+            encoding, content_type or 'application/octet-stream'
+        ),
+    )
+    response.headers['Content-Length'] = length
+    return response
+
+
+def parse_range(header, size):
+    """
+    (start, end) of the bytes asked for by a single-range Range header; None
+    to send the whole file (no, malformed or multiple ranges), or 'invalid'
+    when the range lies past the end of the file
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or (not first and int(last) == 0):
+        return 'invalid'
+    return start, end
+
+
+def range_applies(request, etag, mtime):
+    """Whether If-Range, when sent, still matches the file"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def is_not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+@require_safe
+def serve_media(request, path):
+    """GET /media/<path> - a file of MEDIA_ROOT, whole or a byte range of it"""
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    if not fullpath.is_file():
+        raise Http404('Not found')
+
+    stat = fullpath.stat()
+    size, mtime = stat.st_size, stat.st_mtime
+    etag = f'"{int(mtime):x}-{size:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if path.startswith(IMMUTABLE_PREFIXES) else CACHE_CONTROL,
+    }
+    if is_not_modified(request, etag, mtime):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response.headers[header] = value
+        return response
+
+    byte_range = parse_range(request.headers.get('Range'), size) if range_applies(request, etag, mtime) else None
+    if byte_range == 'invalid':
+        response = HttpResponse(status=416, headers=headers)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = fullpath.open('rb')
+    start, end = byte_range or (0, size - 1)
+    status = 200 if byte_range is None else 206
+    if isinstance(request, ASGIRequest):
+        file.seek(start)
+        response = async_file_response(file, end - start + 1, path, status)
+    elif byte_range is None:
+        # FileResponse sets the content type from the file name
+        response = FileResponse(file)
+    else:
+        file.seek(start)
+        response = FileResponse(FileRange(file, end - start + 1), status=206)
+        response.headers['Content-Length'] = end - start + 1
+    if byte_range is not None:
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    for header, value in headers.items():
+        response.headers[header] = value
+    return response
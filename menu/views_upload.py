@@ -4,9 +4,10 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-import os
-from datetime import datetime
+from django.db import transaction
+from PIL import Image
+
+from . import images, media
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -14,7 +15,10 @@ from datetime import datetime
 def upload_image(request):
     """
     Upload image from Flutter app
-    Category can be: 'menu_item', 'ingredient', 'category', 'profile'
+
+    Images are stored once under their content hash, whatever their category
+    ('menu_item', 'ingredient', 'category', 'profile'): uploading the same
+    image again returns the stored copy with 200 instead of 201.
     """
     try:
         if 'image' not in request.FILES:
@@ -24,16 +28,23 @@ def upload_image(request):
             )
         
         image_file = request.FILES['image']
-        category = request.data.get('category', 'general')
-        
-        # Generate unique filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        file_extension = os.path.splitext(image_file.name)[1]
-        filename = f"{category}_{timestamp}{file_extension}"
+        try:
+            # Checks the file without decoding its pixels; the rendition pipeline does that
+            image = Image.open(image_file)
+            image.verify()
+        except images.UNREADABLE_IMAGE_ERRORS:
+            return Response(
+                {'error': 'The file is not a supported image'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        image_file.seek(0)
         
-        # Save file
-        file_path = f'{category}s/{filename}'  # e.g., 'menu_items/menu_item_20241113_123456.jpg'
-        path = default_storage.save(file_path, ContentFile(image_file.read()))
+        # Hashed and saved chunk by chunk (or moved, once Django spooled it to disk),
+        # e.g. 'uploads/3f/3f9c...e1.jpg'
+        media_file, created = media.store_file(image_file, media.extension_for(image.format, image_file.name))
+        path = media_file.file.name
+        if created:
+            transaction.on_commit(lambda: images.schedule_renditions(path))
         
         # Return the URL
         image_url = request.build_absolute_uri(default_storage.url(path))
@@ -41,8 +52,9 @@ def upload_image(request):
         return Response({
             'success': True,
             'image_url': image_url,
-            'file_path': path
-        }, status=status.HTTP_201_CREATED)
+            'file_path': path,
+            'duplicate': not created
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
         
     except Exception as e:
         return Response(
@@ -3,6 +3,16 @@ ASGI config for restaurant_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The Procfile serves the WSGI application, where every sync view has a
+thread of its own. Deployments that want the order status event stream to
+stay open can serve this instead, through gunicorn's uvicorn worker:
+
+    gunicorn restaurant_api.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+The stream then waits on the event loop instead of holding a worker, but
+the sync views all run on one thread per worker (sync_to_async), so give
+it as many workers as the WSGI deployment has threads for them.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
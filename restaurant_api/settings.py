@@ -67,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'menu.context_processors.restaurant_info',
             ],
         },
     },
@@ -87,6 +88,69 @@ DATABASES = {
 }
 
 
+# Cache
+# Local memory by default; set REDIS_URL to share the cache between workers
+# in production, or CACHE_DIR for a file-based cache on a single host
+
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_DIR = config('CACHE_DIR', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'restaurant-api',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Seconds a cached API response is kept (model signals invalidate it earlier)
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=600, cast=int)
+
+# Serve whole homepage renders to anonymous visitors from the response cache
+HOMEPAGE_PAGE_CACHE = config('HOMEPAGE_PAGE_CACHE', default=False, cast=bool)
+
+# Order status pub/sub behind the tracking page's event stream; the in-memory
+# backend only reaches clients connected to the worker that saved the order
+ORDER_EVENTS_BACKEND = config(
+    'ORDER_EVENTS_BACKEND',
+    default='menu.events.RedisBackend' if REDIS_URL else 'menu.events.InMemoryBackend'
+)
+
+# Seconds an order event stream stays open before the client is told to
+# reconnect; servers don't notice a closed tab while the stream is idle
+ORDER_EVENTS_MAX_AGE = config('ORDER_EVENTS_MAX_AGE', default=300, cast=int)
+
+# Dishes each kitchen station prepares at the same time, for the kitchen
+# queue and the ready times shown to customers
+KITCHEN_STATION_CAPACITY = {
+    'oven': config('KITCHEN_OVEN_CAPACITY', default=4, cast=int),
+    'pasta': config('KITCHEN_PASTA_CAPACITY', default=3, cast=int),
+    'cold': config('KITCHEN_COLD_CAPACITY', default=2, cast=int),
+}
+
+# Minutes from the kitchen to the customer's door
+DELIVERY_MINUTES = config('DELIVERY_MINUTES', default=15, cast=int)
+
+# Threads resizing uploaded images in the background; 0 resizes them
+# inline, before the upload request returns
+IMAGE_PIPELINE_WORKERS = config('IMAGE_PIPELINE_WORKERS', default=2, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -150,6 +214,13 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Serve MEDIA_ROOT from Django (with byte ranges); by default only in development,
+# as static() did, a proxy or CDN serving it in production
+SERVE_MEDIA = config('SERVE_MEDIA', default=DEBUG, cast=bool)
+
+# Binary used by the generate_video_previews command
+FFMPEG_BINARY = config('FFMPEG_BINARY', default='ffmpeg')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
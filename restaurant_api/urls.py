@@ -1,8 +1,10 @@
 """
 URL configuration for restaurant_api project.
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
@@ -14,6 +16,7 @@ from menu.views_frontend import (
     checkout, order_confirmation, order_tracking,
     submit_review_frontend, ingredient_details_frontend
 )
+from menu.views_media import serve_media
 from menu.views_auth import (
     login_page, register_page, logout_page, account_page,
     update_profile, change_password
@@ -44,9 +47,13 @@ urlpatterns = [
     
     # Language switching
     path('i18n/', include('django.conf.urls.i18n')),
-    
-    # Static and media files
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+# Media files, with byte ranges for video seeking
+if settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+    ]
 
 # Internationalized URL patterns
 urlpatterns += i18n_patterns(
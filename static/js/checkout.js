@@ -254,12 +254,12 @@ class CheckoutManager {
             // Delivery information
             const orderType = document.querySelector('input[name="order_type"]:checked')?.value || 'delivery';
             formData.order_type = orderType;
+            formData.first_name = document.getElementById('first_name')?.value;
+            formData.last_name = document.getElementById('last_name')?.value;
+            formData.email = document.getElementById('email')?.value;
+            formData.phone = document.getElementById('phone')?.value;
             
             if (orderType === 'delivery') {
-                formData.first_name = document.getElementById('first_name')?.value;
-                formData.last_name = document.getElementById('last_name')?.value;
-                formData.email = document.getElementById('email')?.value;
-                formData.phone = document.getElementById('phone')?.value;
                 formData.address = document.getElementById('address')?.value;
                 formData.city = document.getElementById('city')?.value;
                 formData.postal_code = document.getElementById('postal_code')?.value;
@@ -447,33 +447,67 @@ class CheckoutManager {
         placeOrderBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Placing Order...';
         placeOrderBtn.disabled = true;
 
-        // Simulate order processing
-        setTimeout(() => {
-            // Generate order number
-            const orderNumber = 'ORD' + Date.now();
-            
-            // Save order to localStorage (in real app, this would be sent to server)
-            const order = {
-                ...this.orderData,
-                orderNumber: orderNumber,
-                status: 'confirmed',
-                createdAt: new Date().toISOString()
-            };
-            
-            localStorage.setItem(`order_${orderNumber}`, JSON.stringify(order));
-            
-            // Clear cart
-            localStorage.removeItem('cart');
-            sessionStorage.removeItem('checkoutCart');
-            
-            // Show success message
-            this.showOrderConfirmation(order);
-            
-            // Redirect to order confirmation page
-            setTimeout(() => {
-                window.location.href = `/order-confirmation/${orderNumber}/`;
-            }, 3000);
-        }, 2000);
+        const delivery = this.orderData.delivery;
+        const payload = {
+            order_type: delivery.order_type,
+            customer_name: `${delivery.first_name || ''} ${delivery.last_name || ''}`.trim(),
+            email: delivery.email,
+            phone: delivery.phone,
+            address: delivery.order_type === 'delivery'
+                ? [delivery.address, `${delivery.postal_code} ${delivery.city}`, delivery.country].join('\n')
+                : '',
+            delivery_instructions: delivery.delivery_instructions || '',
+            delivery_time: delivery.delivery_time || '',
+            payment_method: this.orderData.payment.payment_method,
+            // Prices are checked and recalculated by the server
+            items: this.orderData.items.map(item => ({
+                id: parseInt(item.id, 10),
+                quantity: item.quantity,
+                price: item.price,
+                customizations: Array.isArray(item.customizations) ? item.customizations : []
+            }))
+        };
+
+        fetch(`${Napoli.config.apiBaseUrl}/orders/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': Napoli.utils.getCsrfToken()
+            },
+            body: JSON.stringify(payload)
+        })
+            .then(response => response.json().then(data => ({ ok: response.ok, data })))
+            .then(({ ok, data }) => {
+                if (!ok) {
+                    throw new Error(this.formatOrderErrors(data));
+                }
+
+                // Clear cart
+                localStorage.removeItem('cart');
+                sessionStorage.removeItem('checkoutCart');
+
+                this.showOrderConfirmation(data);
+
+                setTimeout(() => {
+                    window.location.href = `/order-confirmation/${data.order_number}/`;
+                }, 3000);
+            })
+            .catch(error => {
+                this.showNotification(error.message || 'Could not place your order. Please try again.', 'error');
+                placeOrderBtn.innerHTML = originalText;
+                placeOrderBtn.disabled = false;
+            });
+    }
+
+    formatOrderErrors(data) {
+        // Per-line errors come back as a list aligned with the submitted items
+        if (Array.isArray(data.items)) {
+            return data.items
+                .map((error, index) => Object.values(error).flat().map(message => `${this.orderData.items[index]?.name}: ${message}`))
+                .flat()
+                .join(' ') || 'Please review your cart.';
+        }
+        return Object.values(data).flat().join(' ');
     }
 
     showOrderConfirmation(order) {
@@ -487,13 +521,13 @@ class CheckoutManager {
                         <h3>Order Confirmed!</h3>
                         <p class="text-muted">Your order has been placed successfully.</p>
                         <div class="order-number mb-3">
-                            <strong>Order Number:</strong> ${order.orderNumber}
+                            <strong>Order Number:</strong> ${order.order_number}
                         </div>
                         <div class="estimated-time mb-3">
                             <i class="fas fa-clock me-2"></i>
-                            Estimated delivery: 25-35 minutes
+                            Estimated time: ${order.estimated_time}
                         </div>
-                        <button class="btn btn-primary" onclick="window.location.href='/order-tracking/${order.orderNumber}/'">
+                        <button class="btn btn-primary" onclick="window.location.href='/order-tracking/${order.order_number}/'">
                             Track Order
                         </button>
                     </div>
@@ -551,6 +585,10 @@ function goToStep(step) {
     window.scrollTo({ top: 0, behavior: 'smooth' });
 }
 
+function placeOrder() {
+    checkoutManager.placeOrder();
+}
+
 function goBack() {
     window.history.back();
 }
@@ -5,6 +5,7 @@ class OrderTracker {
         this.orderNumber = this.getOrderNumberFromURL();
         this.orderData = null;
         this.updateInterval = null;
+        this.eventSource = null;
         this.init();
     }
 
@@ -20,15 +21,46 @@ class OrderTracker {
     }
 
     loadOrderData() {
-        // Load order data from localStorage or API
-        const storedOrder = localStorage.getItem(`order_${this.orderNumber}`);
-        if (storedOrder) {
-            this.orderData = JSON.parse(storedOrder);
-            this.updateUI();
-        } else {
-            // Fallback to template data
-            this.loadTemplateData();
-        }
+        // Start from the server-rendered page, then keep it in sync with the API
+        this.loadTemplateData();
+        this.fetchOrder().catch(() => {});
+    }
+
+    fetchOrder() {
+        return fetch(`${Napoli.config.apiBaseUrl}/orders/${this.orderNumber}/`)
+            .then(response => response.ok ? response.json() : Promise.reject(response))
+            .then(order => this.applyOrder(order));
+    }
+
+    applyOrder(order) {
+        this.orderData = {
+            ...this.orderData,
+            orderNumber: order.order_number,
+            estimatedTime: order.estimated_time,
+            items: order.lines
+                .filter(line => line.menu_item)
+                .map(line => ({
+                    id: String(line.menu_item),
+                    quantity: line.quantity,
+                    customizations: line.customizations.map(customization => customization.id)
+                }))
+        };
+        return this.applyStatus(order);
+    }
+
+    applyStatus(update) {
+        // Returns whether the status changed since the last update
+        const previousStatus = this.orderData?.statusCode;
+        const stepStatuses = Array.from(document.querySelectorAll('.tracker-step')).map(step => step.dataset.status);
+
+        this.orderData = {
+            ...this.orderData,
+            statusCode: update.status,
+            status: update.status_display,
+            currentStep: Math.max(stepStatuses.indexOf(update.status), 0) + 1
+        };
+        this.updateUI();
+        return Boolean(previousStatus) && previousStatus !== update.status;
     }
 
     loadTemplateData() {
@@ -74,6 +106,23 @@ class OrderTracker {
     }
 
     startRealTimeUpdates() {
+        // Status transitions are pushed by the server; only poll without EventSource
+        if (window.EventSource) {
+            this.eventSource = new EventSource(`${Napoli.config.apiBaseUrl}/orders/${this.orderNumber}/events/`);
+            this.eventSource.addEventListener('status', (event) => {
+                const update = JSON.parse(event.data);
+                if (this.applyStatus(update)) {
+                    this.showNotification('Order status updated!', 'info');
+                    // Events only carry the status; the estimate changes with it
+                    this.fetchOrder().catch(() => {});
+                }
+                if (['delivered', 'cancelled'].includes(update.status)) {
+                    this.eventSource.close();
+                }
+            });
+            return;
+        }
+
         // Update order status every 30 seconds
         this.updateInterval = setInterval(() => {
             this.updateOrderStatus();
@@ -81,16 +130,13 @@ class OrderTracker {
     }
 
     updateOrderStatus() {
-        // Simulate real-time updates (in production, this would be an API call)
-        if (this.orderData && this.orderData.currentStep < 4) {
-            // Simulate progress
-            const random = Math.random();
-            if (random > 0.7) {
-                this.orderData.currentStep++;
-                this.updateUI();
-                this.showNotification('Order status updated!', 'info');
-            }
-        }
+        return this.fetchOrder()
+            .then(changed => {
+                if (changed) {
+                    this.showNotification('Order status updated!', 'info');
+                }
+            })
+            .catch(() => {});
     }
 
     updateUI() {
@@ -99,7 +145,7 @@ class OrderTracker {
         // Update status badge
         const statusBadge = document.querySelector('.status-badge');
         if (statusBadge) {
-            statusBadge.className = `status-badge status-${this.orderData.status.toLowerCase().replace(' ', '-')}`;
+            statusBadge.className = `status-badge status-${this.orderData.statusCode}`;
             statusBadge.innerHTML = `
                 <i class="fas fa-circle me-2"></i>
                 ${this.orderData.status}
@@ -111,9 +157,6 @@ class OrderTracker {
 
         // Update estimated time
         this.updateEstimatedTime();
-
-        // Save to localStorage
-        localStorage.setItem(`order_${this.orderNumber}`, JSON.stringify(this.orderData));
     }
 
     updateProgressTracker() {
@@ -144,6 +187,10 @@ class OrderTracker {
 
     updateEstimatedTime() {
         const estimatedTimeElement = document.querySelector('.estimated-time');
+        if (estimatedTimeElement) {
+            // No estimate once the order is delivered or cancelled
+            estimatedTimeElement.hidden = !this.orderData.estimatedTime;
+        }
         if (estimatedTimeElement && this.orderData.estimatedTime) {
             estimatedTimeElement.innerHTML = `
                 <i class="fas fa-clock me-2"></i>
@@ -241,17 +288,14 @@ class OrderTracker {
             refreshBtn.disabled = true;
         }
 
-        // Simulate API call
-        setTimeout(() => {
-            this.updateOrderStatus();
-            
+        this.updateOrderStatus().then(() => {
             if (refreshBtn) {
                 refreshBtn.innerHTML = '<i class="fas fa-sync"></i>';
                 refreshBtn.disabled = false;
             }
             
             this.showNotification('Order status refreshed!', 'success');
-        }, 1500);
+        });
     }
 
     showNotification(message, type = 'info') {
@@ -307,6 +351,9 @@ class OrderTracker {
         if (this.updateInterval) {
             clearInterval(this.updateInterval);
         }
+        if (this.eventSource) {
+            this.eventSource.close();
+        }
     }
 }
 